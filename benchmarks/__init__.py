@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Microbenchmarks of fivalid.
+
+    How to run benchmarks:
+        Run ``python -m benchmarks`` command in the top directory.
+
+    usage::
+
+        $ python -m benchmarks -o before.json
+        $ (modify fivalid)
+        $ python -m benchmarks -o after.json --compare before.json
+        $ python -m benchmarks --filter structures.
+        $ python -m benchmarks --filter package.import \\
+              --compare before.json --fail-above 1.2
+
+    Regression check:
+        The results are compared with ``benchmarks/baseline.json``
+        by default, and the command exits with status 1
+        if a case is slower than the baseline by more than
+        ``--fail-above`` (default: 1.5).
+        Use ``--no-compare`` to only print the results.
+
+        The baseline is measured on one machine, so refresh it
+        on the machine that checks regressions,
+        and after an intended change of the speed::
+
+            $ python -m benchmarks --update-baseline
+            $ python -m benchmarks --update-baseline --filter structures.
+
+        ``--update-baseline`` replaces the results of the cases that are run,
+        and keeps the others.
+"""
+
+import gc
+import math
+import platform
+import subprocess
+import time
+import timeit
+
+
+class Stats(object):
+    """Statistical summary of timings.
+
+    :param timings: Seconds per call of each repeat.
+    """
+
+    def __init__(self, timings):
+        timings = sorted(timings)
+        self.timings = timings
+        self.min = timings[0]
+        self.max = timings[-1]
+        self.mean = sum(timings) / len(timings)
+        middle = len(timings) // 2
+        if len(timings) % 2:
+            self.median = timings[middle]
+        else:
+            self.median = (timings[middle - 1] + timings[middle]) / 2.0
+        if len(timings) > 1:
+            self.stdev = math.sqrt(
+                sum([(t - self.mean) ** 2 for t in timings]) /
+                (len(timings) - 1))
+        else:
+            self.stdev = 0.0
+
+    def as_dict(self):
+        return {'min': self.min,
+                'max': self.max,
+                'mean': self.mean,
+                'median': self.median,
+                'stdev': self.stdev,
+                'ops': 1.0 / self.median if self.median else None,
+                'repeat': len(self.timings)}
+
+
+def measure(func, repeat=7, warmup=0.05, min_time=0.02):
+    """Measure time per call of the function.
+
+    The function is called for `warmup` seconds before measurement,
+    and the number of calls in one repeat is calibrated
+    to take `min_time` seconds at least.
+
+    :param func: Function that takes no argument.
+    :param repeat: Number of repeats.
+    :param warmup: Seconds of warm-up.
+    :param min_time: Min seconds of one repeat.
+    :rtype: :class:`Stats`
+    """
+    timer = timeit.default_timer
+    # warm-up
+    deadline = timer() + warmup
+    while timer() < deadline:
+        func()
+    # calibrate
+    number = 1
+    while True:
+        elapsed = _run(func, number)
+        if elapsed >= min_time:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+    timings = [_run(func, number) / number for i in range(repeat)]
+    return Stats(timings)
+
+
+def _run(func, number):
+    timer = timeit.default_timer
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        started = timer()
+        for i in xrange(number):
+            func()
+        return timer() - started
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def environment():
+    """Info of the environment that benchmarks are run."""
+    info = {'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    try:
+        import fivalid
+        info['fivalid'] = fivalid.__version__
+    except ImportError:
+        pass
+    try:
+        process = subprocess.Popen(['git', 'rev-parse', 'HEAD'],
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        commit = process.communicate()[0].strip()
+        if process.returncode == 0:
+            info['commit'] = commit
+    except OSError:
+        pass
+    return info
+
+
+def run(cases, repeat=7, warmup=0.05, min_time=0.02, report=None):
+    """Run benchmark cases.
+
+    :param cases: Iterable of ``(name, function)``.
+    :param report: Callback function that takes name and
+                   :class:`Stats` after each case.
+    :return: :class:`dict` of name and :meth:`Stats.as_dict`.
+    """
+    results = {}
+    for name, func in cases:
+        stats = measure(func, repeat=repeat, warmup=warmup,
+                        min_time=min_time)
+        results[name] = stats.as_dict()
+        if report is not None:
+            report(name, stats)
+    return results
+
+
+def compare(results, baseline):
+    """Compare results with baseline results.
+
+    :return: List of ``(name, baseline median, median, ratio)``
+             in order of the name.
+             Ratio is ``median / baseline median``
+             (less than 1.0 is faster).
+    """
+    comparison = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        before = baseline[name]['median']
+        after = results[name]['median']
+        comparison.append((name, before, after,
+                           after / before if before else None))
+    return comparison
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Command line interface of benchmarks.
+"""
+
+import json
+import os
+import sys
+from optparse import OptionParser
+
+from benchmarks import run, compare, environment
+from benchmarks.cases import all_cases, uncovered
+
+
+#: Reference results that are compared by default.
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'baseline.json')
+
+
+def load(filename):
+    """Load JSON file of results."""
+    input = open(filename)
+    try:
+        return json.load(input)
+    finally:
+        input.close()
+
+
+def dump(filename, environment, results):
+    """Write results to JSON file."""
+    output = open(filename, 'w')
+    try:
+        json.dump({'environment': environment, 'results': results},
+                  output, indent=2, sort_keys=True,
+                  separators=(',', ': '))
+        output.write('\n')
+    finally:
+        output.close()
+
+
+def format_time(seconds):
+    for unit, scale in (('s', 1.0), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return '%.3f %s' % (seconds / scale, unit)
+    return '%.1f ns' % (seconds / 1e-9)
+
+
+def main(argv=None):
+    parser = OptionParser(usage='python -m benchmarks [options]')
+    parser.add_option('-o', '--output', metavar='FILE',
+                      help='write results to FILE as JSON')
+    parser.add_option('-c', '--compare', metavar='FILE', default=BASELINE,
+                      help='compare results with JSON FILE '
+                           '(default: benchmarks/baseline.json)')
+    parser.add_option('--no-compare', action='store_const', const=None,
+                      dest='compare', help='do not compare results')
+    parser.add_option('--fail-above', type='float', metavar='RATIO',
+                      default=1.5,
+                      help='exit with status 1 if a case is slower than '
+                           'the baseline by more than RATIO (default: 1.5)')
+    parser.add_option('--retry', type='int', default=2,
+                      help='number of times the slower cases are '
+                           'measured again before failing (default: 2)')
+    parser.add_option('--update-baseline', action='store_true',
+                      help='write results of the cases to the baseline '
+                           'file instead of comparing')
+    parser.add_option('-f', '--filter', metavar='PREFIX', action='append',
+                      help='run only cases that name starts with PREFIX')
+    parser.add_option('-r', '--repeat', type='int', default=7,
+                      help='number of repeats (default: 7)')
+    parser.add_option('-w', '--warmup', type='float', default=0.05,
+                      help='seconds of warm-up (default: 0.05)')
+    options, args = parser.parse_args(argv)
+
+    # loaded before the output may overwrite it
+    baseline_file = options.compare or BASELINE
+    saved = None
+    if not (options.compare or options.update_baseline):
+        pass
+    elif os.path.exists(baseline_file):
+        saved = load(baseline_file)
+    elif options.update_baseline:
+        pass
+    elif baseline_file == BASELINE:
+        sys.stderr.write('warning: no baseline, run with '
+                         '--update-baseline to create it\n')
+    else:
+        parser.error('no such file: %s' % baseline_file)
+
+    cases = list(all_cases())
+    missing = uncovered([name for name, func in cases])
+    if missing:
+        sys.stderr.write('warning: no case for %s\n' % ', '.join(missing))
+    if options.filter:
+        cases = [(name, func) for name, func in cases
+                 if any([name.startswith(prefix)
+                         for prefix in options.filter])]
+
+    def report(name, stats):
+        print '%-56s %12s +- %s' % (name, format_time(stats.median),
+                                    format_time(stats.stdev))
+        sys.stdout.flush()
+    results = run(cases, repeat=options.repeat, warmup=options.warmup,
+                  report=report)
+
+    if options.output:
+        dump(options.output, environment(), results)
+
+    if options.update_baseline:
+        # results of the other cases are kept
+        baseline = (saved or {'results': {}})['results']
+        baseline.update(results)
+        dump(baseline_file, environment(), baseline)
+        return
+
+    if saved is not None:
+        current = environment()
+        for key in ('python', 'implementation', 'machine'):
+            if saved['environment'].get(key) != current[key]:
+                sys.stderr.write('warning: baseline is measured on '
+                                 'another environment (%s: %s)\n'
+                                 % (key, saved['environment'].get(key)))
+        def regressed():
+            if options.fail_above is None:
+                return []
+            return [name for name, before, after, ratio
+                    in compare(results, saved['results'])
+                    if ratio is not None and ratio > options.fail_above]
+        regressions = regressed()
+        # timings are noisy, the slower cases are measured again
+        functions = dict(cases)
+        for attempt in range(options.retry):
+            if not regressions:
+                break
+            sys.stderr.write('measuring again: %s\n' % ', '.join(regressions))
+            again = run([(name, functions[name]) for name in regressions],
+                        repeat=options.repeat, warmup=options.warmup)
+            for name, stats in again.iteritems():
+                if stats['median'] < results[name]['median']:
+                    results[name] = stats
+            regressions = regressed()
+        print
+        print '%-56s %12s %12s %8s' % ('case', 'baseline', 'current', 'ratio')
+        for name, before, after, ratio in compare(results,
+                                                  saved['results']):
+            print '%-56s %12s %12s %7.2fx' % (name, format_time(before),
+                                              format_time(after), ratio)
+        if regressions:
+            sys.stderr.write('regression: %s\n' % ', '.join(regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
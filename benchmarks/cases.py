@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Benchmark cases.
+
+    Name of case is ``<module>.<class or function>[.<variation>]``.
+"""
+
+import sys
+import csv
+from StringIO import StringIO
+from functools import partial
+
+from fivalid import validators, converters
+from fivalid.validators import (
+    ValidationError,
+    All, Any, ValueAdapter, Not, Blocking, Failure, Pass,
+    Number, FreeText, Equal, OneOf, Regex, AllowType, Prefix, Type, Length, Split,
+    OnelinerText, String, Int, SortOrder, Flag
+)
+from fivalid.fields import BaseField
+from fivalid.structures import StructuredFields, ResultCache, Dict, Seq
+from fivalid.csvfields import CSVFields
+
+
+class StrAdapter(ValueAdapter):
+    def on_adapt(self, value):
+        return str(value)
+
+
+def calling(func, value):
+    """Case that calls the function with the value."""
+    return lambda: func(value)
+
+
+def failing(func, value):
+    """Case that calls the function with the invalid value."""
+    def case():
+        try:
+            func(value)
+        except ValidationError:
+            pass
+        else:
+            raise AssertionError('%r is valid' % (value,))
+    return case
+
+
+def exhausting(func, value):
+    """Case that exhausts the iterator that the function returns."""
+    def case():
+        for item in func(value):
+            pass
+    return case
+
+
+def ban_phrases(number):
+    return ['phrase%05d' % i for i in range(number)]
+
+
+COMMENT = u'This is a fairly ordinary comment without bad words. ' * 10
+
+
+def validator_cases():
+    """Cases of all validators, with valid and invalid value."""
+    cases = [
+        ('All', All(String(), Length(max=20)), 'hello', 42),
+        ('Any', Any(Int(), String()), 'hello', 1.5),
+        ('ValueAdapter', StrAdapter(Number(max=100)), 42, 420),
+        ('All.adaptive', All(FreeText(ban_phrases=ban_phrases(10)),
+                             Length(max=100), adaptive=True),
+         u'comment', COMMENT),
+        ('Any.adaptive', Any(Equal('a'), Equal('b'), Equal('c'), Equal('d'),
+                             adaptive=True), 'd', 'x'),
+        ('Not', Not(Equal('x')), 'y', 'x'),
+        ('Blocking', Blocking(Number()), 1, 'x'),
+        ('Failure', Failure(), None, 'x'),
+        ('Pass', Pass(), 'x', None),
+        ('Number', Number(min=0, max=100), '42', '200'),
+        ('FreeText', FreeText(ban_phrases=ban_phrases(10)),
+         COMMENT, COMMENT + u'phrase00003'),
+        ('FreeText.large', FreeText(ban_phrases=ban_phrases(8000)),
+         COMMENT, COMMENT + u'phrase07999'),
+        ('Equal', Equal(u'寿限無'), u'寿限無'.encode('utf-8'), u'寿限'),
+        ('OneOf', OneOf(['red', 'green', 'blue'], ignore_case=True),
+         u'Blue', 'yellow'),
+        ('Regex', Regex(r'^[\w.+-]+@[\w-]+\.[\w.-]+$'),
+         'john.doe@example.com', 'john.doe@example'),
+        ('AllowType', AllowType(int), '123', 'x'),
+        ('Prefix', Prefix('ab'), 'abc', 'xbc'),
+        ('Type', Type(int), 1, '1'),
+        ('Length', Length(max=10), 'hello', 'hello world'),
+        ('Split', Split(Equal('HVC'), Any(Equal('001'), Equal('101'))),
+         'HVC-101', 'HVC-002'),
+        ('OnelinerText', OnelinerText(), COMMENT, COMMENT + u'\n'),
+        ('String', String(), 'x', 1),
+        ('Int', Int(), 1, 'x'),
+        ('SortOrder', SortOrder(), 'desc', 'x'),
+        ('Flag', Flag(), 'F', 'x'),
+    ]
+    for name, validator, valid, invalid in cases:
+        if name != 'Failure':
+            yield ('validators.%s' % name, calling(validator, valid))
+        if name != 'Pass':
+            yield ('validators.%s.invalid' % name,
+                   failing(validator, invalid))
+        if '.' not in name:
+            yield ('validators.%s.is_valid' % name,
+                   calling(validator.is_valid, invalid))
+    validator = All(String(), Length(max=10))
+    def trace_info():
+        try:
+            validator('hello world')
+        except ValidationError, e:
+            list(e.trace_info())
+    yield ('validators.ValidationError.trace_info', trace_info)
+    # batch
+    numbers = [str(i % 200) for i in range(10000)]
+    strings = ['x' * (i % 20) for i in range(10000)]
+    for name, validator, values in [
+            ('Number', Number(min=0, max=100), numbers),
+            ('Length', Length(max=10), strings),
+            ('All', All(String(), Length(max=10)), strings),
+            ('Any', Any(Length(max=5), Length(min=15)), strings)]:
+        yield ('validators.%s.validate_many' % name,
+               calling(validator.validate_many, values))
+
+
+def converter_cases():
+    cases = [
+        ('unicode_converter', u'寿限無'.encode('utf-8')),
+        ('float_converter', '3.14'),
+        ('int_converter', '42'),
+        ('truthvalue_converter', 'True'),
+        ('colon_separated_converter', 'key:value'),
+    ]
+    for name, value in cases:
+        converter = getattr(converters, name)
+        yield ('converters.%s' % name,
+               lambda converter=converter, value=value:
+                   converter(None, value))
+
+
+def field_cases():
+    field = BaseField(validator=All(String(), Length(max=20)))
+    yield ('fields.BaseField', calling(field, 'John Doe'))
+    yield ('fields.BaseField.invalid', failing(field, 'John Doe' * 10))
+    field = BaseField(validator=Number(), converter=converters.int_converter,
+                      default='0', empty_value='')
+    yield ('fields.BaseField.default', calling(field, ''))
+    field = BaseField(validator=Flag(),
+                      converter=converters.truthvalue_converter)
+    yield ('fields.BaseField.flag', calling(field, 'true'))
+
+
+class IDField(BaseField):
+    validator = Number(min=0)
+    converter = converters.int_converter
+
+
+class NameField(BaseField):
+    validator = All(String(), Length(max=50))
+
+
+def shallow():
+    rule = Dict(id=IDField(required=True),
+                name=NameField(required=True),
+                email=Regex(r'^[\w.+-]+@[\w-]+\.[\w.-]+$'),
+                order=SortOrder(),
+                remember=Flag())
+    data = {'id': '42', 'name': 'John Doe', 'email': 'john@example.com',
+            'order': 'asc', 'remember': 't'}
+    return rule, data
+
+
+def deep(depth=20):
+    rule = Dict(value=IDField())
+    data = {'value': '0'}
+    for i in range(depth):
+        rule = Dict(value=IDField(), child=rule)
+        data = {'value': str(i), 'child': data}
+    return rule, data
+
+
+def wide(width=200):
+    rule = Dict(dict([('key%03d' % i, NameField()) for i in range(width)]))
+    data = dict([('key%03d' % i, 'value%d' % i) for i in range(width)])
+    return rule, data
+
+
+def long_numbers(length=10000):
+    return Seq(Number(min=0)), range(length)
+
+
+def long_records(length=1000):
+    rule, record = shallow()
+    return Seq(rule), [dict(record) for i in range(length)]
+
+
+def structure_cases():
+    for name, payload in [('shallow', shallow), ('deep', deep),
+                          ('wide', wide), ('long', long_numbers),
+                          ('long_records', long_records)]:
+        rule, data = payload()
+        yield ('structures.StructuredFields.%s' % name,
+               calling(StructuredFields(rule), data))
+        compiled = StructuredFields(rule).compile()
+        yield ('structures.StructuredFields.%s.compiled' % name,
+               calling(compiled, data))
+        yield ('structures.StructuredFields.%s.check' % name,
+               calling(partial(StructuredFields.check, rule=rule), data))
+    rule, data = long_numbers()
+    data = [-1] * len(data)
+    yield ('structures.StructuredFields.long.invalid',
+           failing(StructuredFields(rule), data))
+    yield ('structures.StructuredFields.long.invalid.compiled',
+           failing(StructuredFields(rule).compile(), data))
+    rule, data = wide()
+    data = dict(data, extra='x')
+    yield ('structures.StructuredFields.wide.extra.compiled',
+           failing(StructuredFields(rule).compile(), data))
+    for name, payload in [('shallow', shallow),
+                          ('long_records', long_records)]:
+        rule, data = payload()
+        yield ('structures.StructuredFields.%s.cached' % name,
+               calling(StructuredFields(rule, cache=ResultCache()), data))
+    rule, data = shallow()
+    instrumented = StructuredFields(rule)
+    instrumented.instrument()
+    yield ('structures.StructuredFields.shallow.instrumented',
+           calling(instrumented, data))
+    yield ('structures.StructuredFields.shallow.validate_all',
+           calling(StructuredFields(rule, collect_errors=True), data))
+    rule, records = long_records()
+    stfields = StructuredFields(rule)
+    result = stfields(records)
+    updated = list(records)
+    updated[500] = dict(updated[500], name='Jane Doe')
+    yield ('structures.StructuredFields.long_records.revalidate',
+           partial(stfields.revalidate, updated, result, [(500, 'name')]))
+    patch = [{'op': 'replace', 'path': '/500/name', 'value': 'Jane Doe'}]
+    yield ('structures.StructuredFields.long_records.apply_patch',
+           partial(stfields.apply_patch, records, result, patch))
+    rule, records = long_records(100)
+    yield ('structures.StructuredFields.iter_validate',
+           exhausting(StructuredFields(rule[0]).iter_validate, records))
+
+
+def csv_records(length=10000):
+    rule, record = shallow()
+    header = sorted(record)
+    lines = [','.join(header)]
+    lines.extend([','.join([record[key] for key in header])] * length)
+    return rule, '\r\n'.join(lines) + '\r\n'
+
+
+def csv_cases():
+    rule, content = csv_records()
+    compiled = StructuredFields(rule).compile()
+    def dict_reader():
+        for row in csv.DictReader(StringIO(content)):
+            compiled(row)
+    yield ('csvfields.DictReader', dict_reader)
+    csvfields = CSVFields(rule)
+    yield ('csvfields.CSVFields.iter_validate',
+           lambda: exhausting(csvfields.iter_validate, StringIO(content))())
+    yield ('csvfields.CSVFields.partition',
+           lambda: csvfields.partition(StringIO(content),
+                                       StringIO(), StringIO()))
+
+
+def importing(attribute=None):
+    """Case that imports the package (and gets the attribute)
+    as the first time, the imported stdlib modules are not reset."""
+    def case():
+        for name in list(sys.modules):
+            if name == 'fivalid' or name.startswith('fivalid.'):
+                del sys.modules[name]
+        package = __import__('fivalid')
+        if attribute is not None:
+            getattr(package, attribute)
+    return case
+
+
+def import_cases():
+    """Cases of the import, run after the other cases
+    because the modules are imported again."""
+    yield ('package.import', importing())
+    yield ('package.import.int_converter', importing('int_converter'))
+    yield ('package.import.StructuredFields', importing('StructuredFields'))
+
+
+def all_cases():
+    """All benchmark cases.
+
+    :return: Generator of ``(name, function)``.
+    """
+    for cases in (validator_cases, converter_cases,
+                  field_cases, structure_cases, csv_cases, import_cases):
+        for case in cases():
+            yield case
+
+
+def uncovered(names):
+    """Validator classes that have no case.
+
+    :param names: Names of cases.
+    """
+    covered = set([name.split('.')[1] for name in names
+                   if name.startswith('validators.')])
+    classes = []
+    for name in dir(validators):
+        obj = getattr(validators, name)
+        if isinstance(obj, type) and \
+                issubclass(obj, validators.ValidatorBaseInterface) and \
+                obj.__module__ == validators.__name__ and \
+                obj not in (validators.ValidatorBaseInterface,
+                            validators.Validator) and \
+                name not in covered:
+            classes.append(name)
+    return classes
@@ -105,30 +105,76 @@
 __version__ = '0.3.0'
 
 
-from validators import (
-    ValidationError, InvalidValueError, InvalidTypeError,
-    All, Any, ValueAdapter,
-    Validator,
-    Number, FreeText, Equal, Regex, AllowType, Prefix, Type, Length, Split,
-    OnelinerText, String, Int, SortOrder, Flag
-)
-
-from converters import (
-    ConversionError,
-    unicode_converter,
-    float_converter,
-    int_converter,
-    truthvalue_converter,
-    colon_separated_converter
-)
-
-from fields import (
-    RequiredError,
-    BaseField
-)
-
-from structures import (
-    StructuredFields,
-    Seq, Dict
-)
+import sys
+from types import ModuleType
 
+
+#: Module of each public name of the package.
+_exports = {}
+for _module, _names in [
+        ('validators', ('ValidationError', 'InvalidValueError',
+                        'InvalidTypeError',
+                        'All', 'Any', 'ValueAdapter',
+                        'Validator', 'Blocking',
+                        'Number', 'FreeText', 'Equal', 'OneOf', 'Regex',
+                        'AllowType', 'Prefix', 'Type', 'Length',
+                        'Split', 'OnelinerText', 'String', 'Int',
+                        'SortOrder', 'Flag')),
+        ('converters', ('ConversionError',
+                        'unicode_converter',
+                        'float_converter',
+                        'int_converter',
+                        'truthvalue_converter',
+                        'colon_separated_converter')),
+        ('fields', ('RequiredError',
+                    'BaseField')),
+        ('structures', ('StructureError',
+                        'StructuredFields', 'ResultCache',
+                        'Seq', 'Dict'))]:
+    for _name in _names:
+        _exports[_name] = _module
+del _module, _names, _name
+
+#: Submodules that are imported by the attribute access.
+_submodules = frozenset(['validators', 'converters', 'fields', 'structures',
+                         'instrumentation', 'schemacache', 'csvfields'])
+
+__all__ = sorted(_exports)
+
+
+class _LazyModule(ModuleType):
+    """The package that imports the submodules at the first access 
+    of the public names.
+    
+    ``import fivalid`` does not import the submodules, 
+    and ``fivalid.int_converter`` imports only :mod:`converters`.
+    """
+
+    def __init__(self, module):
+        ModuleType.__init__(self, module.__name__, module.__doc__)
+        self.__dict__.update(module.__dict__)
+        # functions of the package refer to the globals of the module
+        self.__module = module
+
+    def __getattr__(self, name):
+        if name in _exports:
+            module = self.__import(_exports[name])
+            value = getattr(module, name)
+        elif name in _submodules:
+            value = self.__import(name)
+        else:
+            raise AttributeError(
+                "'module' object has no attribute '%s'" % name)
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(_exports) | _submodules)
+
+    def __import(self, name):
+        name = '%s.%s' % (self.__name__, name)
+        __import__(name)
+        return sys.modules[name]
+
+
+sys.modules[__name__] = _LazyModule(sys.modules[__name__])
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+
+"""
+    Validation and conversion of CSV rows by :class:`~structures.Dict` rule.
+"""
+
+import csv
+import validators
+from structures import (
+    Dict, COLLECTABLE_ERRORS, compile_rule, _untraced, _locate
+)
+
+
+#: Columns that are appended to the header of rejected rows
+#: by :meth:`CSVFields.partition`.
+REJECT_COLUMNS = ('line', 'column', 'error')
+
+
+class HeaderError(validators.InvalidValueError):
+    """Header of CSV does not match the rule.
+
+    Raised when a column is duplicated, a column of required Field
+    is missing, or an unknown column is found
+    (unless the rule ignores extra data).
+    """
+    pass
+
+
+def describe_error(error):
+    """Text of the error for the rejected rows.
+
+    :param error: Exception.
+    :return: ``'<class name>: <message>'``, or the class name
+             if the error has no message.
+    """
+    try:
+        message = unicode(error)
+    except UnicodeDecodeError:
+        # message is encoded str
+        message = str(error).decode('utf-8', 'replace')
+    if not message:
+        return error.__class__.__name__
+    return u'%s: %s' % (error.__class__.__name__, message)
+
+
+class CSVFields(object):
+    """Validation of CSV rows by :class:`~structures.Dict` rule.
+
+    The columns of the header are bound to the rules of the Dict once,
+    and the rows are validated and converted one by one
+    without building the dict of each row.
+    The rows are read lazily, so memory usage does not depend
+    on the size of the file.
+
+    usage::
+
+        >>> rule = Dict(id=IDField(required=True, empty_value=''),
+        ...             name=NameField(empty_value=''))
+        >>> csvfields = CSVFields(rule)
+        >>> for line, converted, error in csvfields.iter_validate(
+        ...         open('users.csv', 'rb')):
+        ...   print line, converted, repr(error)
+        2 {'id': 1, 'name': u'John Doe'} None
+        3 None InvalidValueError(...)
+        >>> error.column, error.path
+        (1, ('id',))
+
+    valid and rejected rows to separate files::
+
+        >>> csvfields.partition(open('users.csv', 'rb'),
+        ...                     valid=open('valid.csv', 'wb'),
+        ...                     rejected=open('rejected.csv', 'wb'))
+        {'valid': 9998, 'rejected': 2}
+
+    Cells of CSV are strings, and empty cell is ``''``.
+    So to treat empty cells as empty,
+    set ``empty_value=''`` to the Fields of the rule.
+
+    The errors have attribute ``column``, that is the column number
+    (starting at 1) of the invalid cell, or :obj:`None` if the rule's
+    column is not in the header.
+    :attr:`~validators.ValidationError.path` of
+    :exc:`~validators.ValidationError` starts with the key of the rule.
+
+    :param rule: :class:`~structures.Dict` that keys are column names.
+    :param empty_value: Value of the column that is not in the header,
+                        and of the missing cells of short rows.
+    :param encoding: If it is given, cells are decoded
+                     by the encoding before validation.
+    :param dialect: Dialect of :mod:`csv`.
+    :param \*\*fmtparams: Formatting parameters of :mod:`csv`.
+    """
+
+    def __init__(self, rule, empty_value='', encoding=None,
+                 dialect='excel', **fmtparams):
+        if not isinstance(rule, Dict):
+            raise TypeError('rule must be Dict, not %s'
+                            % rule.__class__.__name__)
+        self.rule = rule
+        self.empty_value = empty_value
+        self.encoding = encoding
+        self.dialect = dialect
+        self.fmtparams = fmtparams
+
+    def bind(self, header):
+        """Bind the columns of the header to the rules.
+
+        usage::
+
+            >>> validate_row = csvfields.bind(['id', 'name'])
+            >>> validate_row(['1', 'John Doe'])
+            {'id': 1, 'name': u'John Doe'}
+
+        :param header: List of column names.
+        :exception HeaderError: Header does not match the rule.
+        :return: Function that takes a row (list of cells) and
+                 returns the converted :class:`dict`,
+                 same as :meth:`~structures.StructuredFields.validate`
+                 of the dict of the row.
+        """
+        rule = self.rule
+        empty_value = self.empty_value
+        encoding = self.encoding
+        header = list(header)
+        if len(set(header)) != len(header):
+            duplicated = sorted(set([name for name in header
+                                     if header.count(name) > 1]))
+            raise HeaderError('Duplicated columns: %s' % duplicated)
+        columns = dict([(name, index) for index, name in enumerate(header)])
+        missing = [key for key in rule.iteridents()
+                   if key in rule.required_keys and key not in columns]
+        if missing:
+            raise HeaderError('Missing columns: %s' % missing)
+        extra = [name for name in header if name not in rule.rule_keys]
+        if extra and not rule.is_ignore_extra:
+            raise HeaderError('Found extra columns: %s' % extra)
+        # container validation of the custom data_validator
+        check = None if rule._is_default_check() else rule
+        width = len(header)
+        ignore_extra = rule.is_ignore_extra
+        present = []
+        absent = []
+        for key, inner_rule in rule.rules.iteritems():
+            item = (key, compile_rule(inner_rule, empty_value),
+                    _untraced(inner_rule))
+            if key in columns:
+                present.append((columns[key],) + item)
+            else:
+                absent.append(item)
+
+        def validate_row(row):
+            if len(row) != width:
+                if len(row) > width and not ignore_extra:
+                    e = validators.InvalidValueError(
+                        'Found extra cells: %d' % (len(row) - width))
+                    e.column = width + 1
+                    raise e
+                row = (list(row[:width]) +
+                       [empty_value] * (width - len(row)))
+            if check is not None:
+                try:
+                    check(dict(zip(header, row)))
+                except COLLECTABLE_ERRORS, e:
+                    e.column = None
+                    raise
+            obj = {}
+            value = None
+            try:
+                for index, key, function, leaf in present:
+                    value = row[index]
+                    if encoding is not None and value.__class__ is str:
+                        try:
+                            value = value.decode(encoding)
+                        except UnicodeDecodeError, error:
+                            raise validators.InvalidValueError(
+                                'Undecodable cell: %s' % error)
+                    obj[key] = function(value)
+            except COLLECTABLE_ERRORS, e:
+                if isinstance(e, validators.ValidationError):
+                    _locate(e, key, leaf, value)
+                e.column = index + 1
+                raise
+            try:
+                for key, function, leaf in absent:
+                    obj[key] = function(empty_value)
+            except COLLECTABLE_ERRORS, e:
+                if isinstance(e, validators.ValidationError):
+                    _locate(e, key, leaf, empty_value)
+                e.column = None
+                raise
+            return obj
+        return validate_row
+
+    def reader(self, csvfile):
+        """:func:`csv.reader` of the file by the dialect."""
+        return csv.reader(csvfile, self.dialect, **self.fmtparams)
+
+    def writer(self, csvfile):
+        """:func:`csv.writer` of the file by the dialect."""
+        return csv.writer(csvfile, self.dialect, **self.fmtparams)
+
+    def iter_validate(self, csvfile):
+        """Validate the rows one by one.
+
+        The first row is the header. Blank lines are skipped.
+
+        :param csvfile: File object or iterable of lines.
+        :exception HeaderError: Header does not match the rule,
+                                or the file is empty.
+        :return: Generator of ``(line, converted, error)``,
+                 same as :meth:`~structures.StructuredFields.iter_validate`
+                 but `line` is the line number in the file where
+                 the row starts (the header is line 1).
+        """
+        reader, header, validate_row = self._start(csvfile)
+        for line, row, converted, error in \
+                self._iter_rows(reader, validate_row):
+            yield (line, converted, error)
+
+    def _start(self, csvfile):
+        """Read the header and bind it.
+
+        :return: ``(reader, header, function of bind)``.
+        """
+        reader = self.reader(csvfile)
+        for header in reader:
+            if header:
+                return (reader, header, self.bind(header))
+        raise HeaderError('Missing header')
+
+    def _iter_rows(self, reader, validate_row):
+        """Generator of ``(line, row, converted, error)``."""
+        line_num = reader.line_num
+        for row in reader:
+            line = line_num + 1
+            line_num = reader.line_num
+            if not row:
+                continue
+            try:
+                converted = validate_row(row)
+            except COLLECTABLE_ERRORS, e:
+                yield (line, row, None, e)
+            else:
+                yield (line, row, converted, None)
+
+    def partition(self, csvfile, valid=None, rejected=None):
+        """Write valid rows and rejected rows to separate files.
+
+        Rows are written as they are read (not converted),
+        with the header.
+        Rejected rows are padded with empty cells or truncated 
+        to the width of the header, and have the additional columns
+        :data:`REJECT_COLUMNS`: the line number, the column name of
+        the invalid cell (empty if it is unknown) and
+        the error (see :func:`describe_error`).
+
+        :param csvfile: File object or iterable of lines to read.
+        :param valid: File object to write valid rows, or :obj:`None`.
+        :param rejected: File object to write rejected rows,
+                         or :obj:`None`.
+        :exception HeaderError: Header does not match the rule.
+        :return: :class:`dict` of the number of valid and rejected rows.
+        """
+        reader, header, validate_row = self._start(csvfile)
+        counts = {'valid': 0, 'rejected': 0}
+        valid_writer = rejected_writer = None
+        if valid is not None:
+            valid_writer = self.writer(valid)
+            valid_writer.writerow(header)
+        if rejected is not None:
+            rejected_writer = self.writer(rejected)
+            rejected_writer.writerow(header + list(REJECT_COLUMNS))
+        encoding = self.encoding or 'utf-8'
+        width = len(header)
+        for line, row, converted, error in \
+                self._iter_rows(reader, validate_row):
+            if error is None:
+                counts['valid'] += 1
+                if valid_writer is not None:
+                    valid_writer.writerow(row)
+            else:
+                counts['rejected'] += 1
+                if rejected_writer is not None:
+                    column = getattr(error, 'column', None)
+                    if column is None or column > width:
+                        column = ''
+                    else:
+                        column = header[column - 1]
+                    rejected_writer.writerow(
+                        row[:width] + [''] * (width - len(row)) +
+                        [line, column,
+                         describe_error(error).encode(encoding)])
+        return counts
+
@@ -4,9 +4,11 @@
 from validators import (
     ValidationError,
     InvalidValueError,
-    InvalidTypeError
+    InvalidTypeError,
+    _fingerprint
 )
 from converters import ConversionError, unicode_converter
+from instrumentation import RuleStats
 
 from functools import partial
 
@@ -66,6 +68,8 @@ class BaseField(object):
 
     validator = None
     converter = unicode_converter
+    stats = None
+    stats_path = ''
     
     def __init__(self,
                  default=None,
@@ -94,6 +98,8 @@ class BaseField(object):
     def __call__(self, value):
         """validate the value.
         
+        If instrumented, the call is recorded.
+        
         :param value: validatee value.
         :raise ValidationError: value is invalid.
         :raise RequiredError: value and default-value are missing,
@@ -102,6 +108,15 @@ class BaseField(object):
         :return: If value and default-value are missing, return None.
                  otherwise, return a converted value.
         """
+        if self.stats is not None:
+            return self.stats.call(self.stats_path, self.process, value)
+        return self.process(value)
+
+    def process(self, value):
+        """validate and convert the value without instrumentation.
+        
+        Same as :meth:`__call__`.
+        """
         try:
             self.apply_validator(value)
         except MissingDefault:
@@ -113,6 +128,43 @@ class BaseField(object):
             return self.converter(self.default)
         return self.converter(value)
     
+    @property
+    def ident(self):
+        """Identifier of the field.
+        
+        Fields that have the same class, validator, converter 
+        and options have the same identifier.
+        """
+        converter = self.converter
+        # function of bound method or partial
+        converter = getattr(converter, 'im_func',
+                            getattr(converter, 'func', converter))
+        return (self.__class__.__name__,
+                _fingerprint(self.validator),
+                _fingerprint(converter),
+                self.required,
+                _fingerprint(getattr(self, 'default', None)),
+                _fingerprint(self.empty_value))
+
+    def instrument(self, stats=None, path=None):
+        """Record calls of the field.
+        
+        :param stats: :class:`~instrumentation.RuleStats` that records calls.
+                      If :obj:`None`, new one is created.
+        :param path: Name of the field in the statistics. 
+                     Default is the class name.
+        :return: :class:`~instrumentation.RuleStats`.
+        """
+        if stats is None:
+            stats = RuleStats()
+        self.stats = stats
+        self.stats_path = self.__class__.__name__ if path is None else path
+        return stats
+
+    def uninstrument(self):
+        """Stop recording calls of the field."""
+        self.stats = None
+
     def apply_validator(self, value):
         """apply validator to the value.
         
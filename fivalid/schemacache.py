@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+"""
+    On-disk cache of prepared rules.
+"""
+
+import os
+import sys
+import tempfile
+import cPickle as pickle
+from hashlib import sha1
+
+
+#: Version of the cache file format.
+FORMAT_VERSION = 1
+
+#: Exceptions that mean the cache file is broken or incompatible.
+LOAD_ERRORS = (EOFError, pickle.UnpicklingError, ValueError, TypeError,
+               AttributeError, ImportError, IndexError, KeyError)
+
+
+def fivalid_version():
+    """Version of fivalid, or :obj:`None` if it is not imported
+    as the package."""
+    try:
+        from fivalid import __version__
+    except ImportError:
+        # the modules are imported directly
+        return None
+    return __version__
+
+
+def fingerprint(source):
+    """Fingerprint of the rule source.
+
+    :param source: :class:`str` or :class:`unicode` that the rule
+                   is built from, e.g. the content of the schema file.
+    :return: Hex digest.
+    """
+    if isinstance(source, unicode):
+        source = source.encode('utf-8')
+    return sha1(source).hexdigest()
+
+
+class SchemaCache(object):
+    """Cache of prepared :class:`~structures.StructuredFields` in files.
+
+    Building the rules (validators, Fields, :class:`~structures.Dict`
+    key indexes, phrase matchers of :class:`~validators.FreeText`)
+    is done once, and the other processes load the pickled result.
+    A cache file is keyed by :func:`fingerprint` of the rule source,
+    and is built again when the source, the fivalid version,
+    the Python version or :data:`FORMAT_VERSION` is changed.
+
+    usage::
+
+        >>> cache = SchemaCache('/var/cache/myapp')
+        >>> def build():
+        ...     rule = intern_rule(build_rule(schema_source), InternPool())
+        ...     return StructuredFields(rule)
+        >>> stfields = cache.load(schema_source, build)
+        >>> stfields(data)
+
+    The shared validators of :func:`~structures.intern_rule`
+    are stored once, so the interned rule is loaded much faster
+    than the rule that has many identical validators.
+
+    .. note::
+        The cached objects are unpickled,
+        so do not use a directory that others can write.
+        Compiled function of :class:`~structures.StructuredFields`
+        is not pickled, but it is compiled again after loading.
+
+    :param directory: Directory of cache files.
+                      It is created if it does not exist.
+    :param version: Version of the application that is a part of the key.
+    """
+
+    def __init__(self, directory, version=None):
+        self.directory = directory
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+
+    def header(self, source):
+        """Header that the cache file of the source must have."""
+        return (FORMAT_VERSION, fivalid_version(), self.version,
+                tuple(sys.version_info[:2]), fingerprint(source))
+
+    def path(self, source):
+        """Path of the cache file of the source."""
+        return os.path.join(self.directory,
+                            '%s.fivalid' % fingerprint(source))
+
+    def load(self, source, build):
+        """Load the prepared object, or build and store it.
+
+        :param source: Rule source (see :func:`fingerprint`).
+        :param build: Function that takes no argument and
+                      returns picklable object,
+                      e.g. :class:`~structures.StructuredFields`.
+        :return: The loaded or built object.
+        """
+        obj = self.fetch(source)
+        if obj is not None:
+            return obj
+        obj = build()
+        self.store(source, obj)
+        return obj
+
+    def fetch(self, source):
+        """Load the prepared object.
+
+        :param source: Rule source.
+        :return: The object, or :obj:`None` if the cache file
+                 does not exist, is stale or is broken.
+        """
+        try:
+            cache_file = open(self.path(source), 'rb')
+        except IOError:
+            self.misses += 1
+            return None
+        try:
+            try:
+                unpickler = pickle.Unpickler(cache_file)
+                if unpickler.load() != self.header(source):
+                    self.misses += 1
+                    return None
+                obj = unpickler.load()
+            except LOAD_ERRORS:
+                self.misses += 1
+                return None
+        finally:
+            cache_file.close()
+        self.hits += 1
+        return obj
+
+    def store(self, source, obj):
+        """Store the prepared object.
+
+        The file is replaced atomically, so the processes that
+        load it at the same time do not see a partial file.
+
+        :param source: Rule source.
+        :param obj: Picklable object.
+        """
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                # created by other process
+                if not os.path.isdir(self.directory):
+                    raise
+        path = self.path(source)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory,
+                                         suffix='.tmp')
+        try:
+            cache_file = os.fdopen(fd, 'wb')
+            try:
+                pickler = pickle.Pickler(cache_file,
+                                         pickle.HIGHEST_PROTOCOL)
+                pickler.dump(self.header(source))
+                pickler.dump(obj)
+            finally:
+                cache_file.close()
+            if os.name == 'nt' and os.path.exists(path):
+                os.remove(path)
+            os.rename(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def info(self):
+        """Statistics of the cache.
+
+        :return: :class:`dict` of hits and misses.
+        """
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def clear(self):
+        """Remove all cache files, and reset statistics."""
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith('.fivalid'):
+                    os.remove(os.path.join(self.directory, name))
+        self.hits = 0
+        self.misses = 0
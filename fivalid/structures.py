@@ -5,7 +5,282 @@
 """
 
 
+import marshal
+import time
 import validators
+from fields import RequiredError, BaseField
+from instrumentation import RuleStats, join_path
+from converters import ConversionError
+from itertools import cycle, count, izip, islice
+from collections import OrderedDict, deque
+from functools import partial
+from thread import allocate_lock as Lock
+
+
+#: Exceptions that are collected by :meth:`StructuredFields.validate_all`.
+COLLECTABLE_ERRORS = (validators.ValidationError,
+                      RequiredError,
+                      ConversionError)
+
+
+class StructureError(validators.ValidationError):
+    """Errors occurred while validation of structured data.
+    
+    Raised by :meth:`StructuredFields.validate_all`.
+    
+    .. attribute:: errors
+        
+        :class:`~collections.OrderedDict` of the errors 
+        in order of occurrence. 
+        Key is the path of the data (:class:`tuple` of the 
+        identifiers, e.g. ``('users', 0, 'name')``), 
+        and value is the exception.
+    
+    .. attribute:: truncated
+        
+        :obj:`True` if the validation was stopped 
+        because the number of errors has reached the max.
+    """
+    
+    def __init__(self, errors, truncated=False):
+        super(StructureError, self).__init__(
+            '%d error(s) found%s' % (len(errors),
+                                     ' (truncated)' if truncated else ''))
+        self.errors = errors
+        self.truncated = truncated
+
+    def __reduce__(self):
+        return (self.__class__, (self.errors, self.truncated))
+
+    def tree(self):
+        """Errors as nested :class:`dict` that follows the data structure.
+        
+        usage::
+            
+            >>> e.errors
+            OrderedDict([(('a', 0), InvalidTypeError(...)), 
+                         (('a', 2), InvalidValueError(...))])
+            >>> e.tree()
+            {'a': {0: InvalidTypeError(...), 2: InvalidValueError(...)}}
+        
+        The error of the root data itself is set to key :obj:`None`.
+        """
+        tree = {}
+        for path, error in self.errors.iteritems():
+            if not path:
+                tree[None] = error
+                continue
+            node = tree
+            for ident in path[:-1]:
+                node = node.setdefault(ident, {})
+            node[path[-1]] = error
+        return tree
+
+
+class ResultCache(object):
+    """Bounded cache of results of validation by :class:`StructuredFields`.
+    
+    Results and errors are cached by the input data and the rule. 
+    When the cache is full, the least recently used result is discarded.
+    
+    usage::
+        
+        >>> cache = ResultCache(maxsize=1000, ttl=60)
+        >>> stfields = StructuredFields(rule, cache=cache)
+        >>> stfields(data)
+        >>> stfields(data)  # from the cache
+        >>> cache.info()
+        {'hits': 1, 'misses': 1, 'uncacheable': 0, 'evictions': 0, 
+         'expirations': 0, 'size': 1, 'maxsize': 1000, 'hit_rate': 0.5}
+    
+    :param maxsize: Max number of cached results.
+    :param ttl: Seconds that a result is valid. 
+                If :obj:`None`, results do not expire.
+    :param timer: Timer function.
+    """
+    
+    def __init__(self, maxsize=1024, ttl=None, timer=time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self._reset_stats()
+
+    def __getstate__(self):
+        # entries are not shared with the other processes
+        state = self.__dict__.copy()
+        del state['lock']
+        state['entries'] = OrderedDict()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = Lock()
+
+    def _reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Get the cached entry.
+        
+        :param key: Key of the entry.
+        :return: Tuple of ``(error, result)``, 
+                 or :obj:`None` if not cached.
+        """
+        self.lock.acquire()
+        try:
+            try:
+                expires, error, result = self.entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            if expires is not None and expires <= self.timer():
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries[key] = (expires, error, result)
+            return (error, result)
+        finally:
+            self.lock.release()
+
+    def put(self, key, error, result):
+        """Cache the result or the error.
+        
+        :param key: Key of the entry.
+        :param error: Raised error, or :obj:`None`.
+        :param result: Result of validation.
+        """
+        if self.ttl is None:
+            expires = None
+        else:
+            expires = self.timer() + self.ttl
+        self.lock.acquire()
+        try:
+            self.entries.pop(key, None)
+            while self.entries and len(self.entries) >= self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            if self.maxsize > 0:
+                self.entries[key] = (expires, error, result)
+        finally:
+            self.lock.release()
+
+    def info(self):
+        """Statistics of the cache.
+        
+        :return: :class:`dict` that keys are ``hits``, ``misses``, 
+                 ``uncacheable`` (data that can not be a key), 
+                 ``evictions``, ``expirations``, ``size``, ``maxsize`` 
+                 and ``hit_rate``.
+        """
+        lookups = self.hits + self.misses
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'uncacheable': self.uncacheable,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+                'hit_rate': float(self.hits) / lookups if lookups else 0.0}
+
+    def clear(self):
+        """Discard all results and reset the statistics."""
+        self.lock.acquire()
+        try:
+            self.entries.clear()
+            self._reset_stats()
+        finally:
+            self.lock.release()
+
+
+def _data_key(data):
+    """Hashable key of the data.
+    
+    Types of the values are distinguished (e.g. ``1`` and ``1.0``).
+    
+    :raises TypeError: The data contains unhashable value.
+    """
+    try:
+        # fast, for data of built-in types
+        return marshal.dumps(data, 2)
+    except ValueError:
+        return _freeze(data)
+
+
+def _freeze(data):
+    cls = data.__class__
+    if isinstance(data, dict):
+        return (cls, frozenset([(_freeze(key), _freeze(value))
+                                for key, value in data.iteritems()]))
+    if isinstance(data, (list, tuple)):
+        return (cls, tuple([_freeze(value) for value in data]))
+    hash(data)
+    return (cls, data)
+
+
+def _pack_result(result):
+    """Private copy of the result for the cache."""
+    try:
+        return (True, marshal.dumps(result, 2))
+    except ValueError:
+        return (False, _copy_result(result))
+
+
+def _unpack_result(packed):
+    """Copy of the result that is packed by :func:`_pack_result`."""
+    marshaled, result = packed
+    if marshaled:
+        return marshal.loads(result)
+    return _copy_result(result)
+
+
+def _pack_error(error):
+    """Immutable form of the error for the cache.
+    
+    Only the class, the arguments and the path are kept, 
+    the trace and the attributes that are set by the caller are not.
+    """
+    if isinstance(error, StructureError):
+        args = (tuple([(path, _pack_error(inner))
+                       for path, inner in error.errors.iteritems()]),
+                error.truncated)
+    else:
+        args = error.args
+    return (error.__class__, args, getattr(error, 'path', ()))
+
+
+def _unpack_error(packed):
+    """New exception from the error that is packed by :func:`_pack_error`."""
+    cls, args, path = packed
+    if issubclass(cls, StructureError):
+        errors, truncated = args
+        error = cls(OrderedDict([(inner_path, _unpack_error(inner))
+                                 for inner_path, inner in errors]),
+                    truncated)
+    else:
+        # __init__ of the subclass may take other arguments
+        error = cls.__new__(cls, *args)
+        BaseException.__init__(error, *args)
+    if path:
+        error.path = path
+    return error
+
+
+def _copy_result(result):
+    """Copy the containers of the result. The leaf values are shared."""
+    if isinstance(result, dict):
+        return result.__class__([(key, _copy_result(value))
+                                 for key, value in result.iteritems()])
+    if isinstance(result, (list, tuple)):
+        return result.__class__([_copy_result(value) for value in result])
+    return result
+
 
 class StructuredFields(object):
     """Structured Field set.
@@ -56,15 +331,391 @@ class StructuredFields(object):
         {'binary': (u'0', u'1'), 'quaternary': [u'0', u'1', u'2', u'3']}
         >>> StructuredFields.validate(data, rule)
         {'binary': (u'0', u'1'), 'quaternary': [u'0', u'1', u'2', u'3']}
+    
+    compiled validation::
+        
+        >>> stfields = StructuredFields(rule)
+        >>> validate = stfields.compile()
+        >>> validate(data)
+        {'binary': (u'0', u'1'), 'quaternary': [u'0', u'1', u'2', u'3']}
+        >>> stfields(data)  # use the compiled function
+        {'binary': (u'0', u'1'), 'quaternary': [u'0', u'1', u'2', u'3']}
+    
+    cached validation::
+        
+        >>> stfields = StructuredFields(rule, cache=ResultCache(ttl=60))
+        >>> stfields(data)
+        {'binary': (u'0', u'1'), 'quaternary': [u'0', u'1', u'2', u'3']}
+        >>> stfields(data)  # copy of the cached result
+        {'binary': (u'0', u'1'), 'quaternary': [u'0', u'1', u'2', u'3']}
+        
+        The results (containers are copied) and the errors 
+        (:exc:`~validators.ValidationError`, :exc:`~fields.RequiredError` 
+        and :exc:`~converters.ConversionError`, a new exception that has 
+        the same class, arguments and path is raised) are cached 
+        by the input data and :func:`rule_ident` of the rule. 
+        Data that contains unhashable leaf values is not cached.
+    
+    validate only::
+        
+        >>> stfields = StructuredFields(
+        ...   Dict(binary=Seq(validators.Number(min=0, max=1), type=tuple)),
+        ...   passthrough=True)
+        >>> stfields(data) is data
+        True
+        
+        If the leaves of the rule are only Validators, 
+        the data is validated by :meth:`check`, 
+        and the data itself is returned instead of 
+        the data filled with :obj:`None` 
+        (also when the result is cached). 
+        The rule that has Fields returns the converted data as usual.
     """
     
-    def __init__(self, rule, empty_value=None):
+    def __init__(self, rule, empty_value=None,
+                 collect_errors=False, max_errors=100,
+                 max_workers=None, cache=None, passthrough=False):
         self.rule = rule
+        self.cache = cache
+        self.passthrough = passthrough
         self.empty_value = empty_value
+        self.collect_errors = collect_errors
+        self.max_errors = max_errors
+        self.max_workers = max_workers
+        self.pool = None
+        self.stats = None
+        self.compiled = None
 
     def __call__(self, data):
+        if self.cache is not None:
+            return self._call_cached(data)
+        return self._call(data)
+
+    def _call_cached(self, data):
+        cache = self.cache
+        passes = self._passes_through()
+        try:
+            # computed at each call, the rule may be modified in place
+            key = (rule_ident(self.rule), _data_key(self.empty_value),
+                   self.collect_errors, self.passthrough, _data_key(data))
+        except TypeError:
+            # unhashable
+            cache.uncacheable += 1
+            return self._call(data)
+        entry = cache.get(key)
+        if entry is not None:
+            error, result = entry
+            if error is not None:
+                raise _unpack_error(error)
+            if passes:
+                return data
+            return _unpack_result(result)
+        try:
+            result = self._call(data)
+        except COLLECTABLE_ERRORS, e:
+            cache.put(key, _pack_error(e), None)
+            raise
+        if passes:
+            # only the data is valid, it is returned itself
+            cache.put(key, None, None)
+        else:
+            cache.put(key, None, _pack_result(result))
+        return result
+
+    def _call(self, data):
+        if self._passes_through():
+            if self.max_workers is None and not self.collect_errors \
+                    and self.compiled is None:
+                self.check(data, self.rule, empty_value=self.empty_value)
+            else:
+                self._validate(data)
+            return data
+        return self._validate(data)
+
+    def _passes_through(self):
+        """Whether the data itself is returned (see `passthrough`)."""
+        # computed at each call, the rule may be modified in place
+        return self.passthrough and not _converts(self.rule)
+
+    def _validate(self, data):
+        if self.max_workers is not None:
+            if self.pool is None:
+                from multiprocessing.pool import ThreadPool
+                self.pool = ThreadPool(self.max_workers)
+            return self.validate_concurrently(data, self.rule,
+                    empty_value=self.empty_value, pool=self.pool)
+        if self.collect_errors:
+            return self.validate_all(data, self.rule,
+                    empty_value=self.empty_value,
+                    max_errors=self.max_errors)
+        if self.compiled is not None:
+            return self.compiled(data)
         return self.validate(data, self.rule,
                 empty_value=self.empty_value)
+
+    def close(self):
+        """Shut down the pool of threads that is created 
+        for `max_workers`.
+        
+        The pool is created again if this object is called after closing. 
+        This object is also a context manager that closes at exit.
+        
+        usage::
+            
+            >>> with StructuredFields(rule, max_workers=10) as stfields:
+            ...   stfields(data)
+        """
+        pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # compiled function is not picklable, will compile again
+        state['compiled'] = self.compiled is not None
+        state['pool'] = None
+        return state
+
+    def __setstate__(self, state):
+        # saved by the older version
+        state.pop('converting', None)
+        self.__dict__.update(state)
+        if self.compiled:
+            self.compile()
+        else:
+            self.compiled = None
+
+    def compile(self):
+        """Compile the rule into specialized validation function.
+        
+        Each node of the rule tree is turned into one function 
+        that the container type check, the key lookups and 
+        the calls of inner rules are inlined. 
+        After compilation, :meth:`__call__` uses the compiled function.
+        
+        .. note::
+            The compiled function does not follow modification 
+            of the rule. Compile again after the rule was modified.
+        
+        :return: Compiled validation function. 
+                 It takes data and returns the same as :meth:`validate`.
+        """
+        self.compiled = compile_rule(self.rule, self.empty_value,
+                                     stats=self.stats)
+        return self.compiled
+
+    def instrument(self, stats=None):
+        """Record calls of each rule by rule path.
+        
+        The number of calls, cumulative and max seconds of the calls, 
+        and the number of failures by exception class are recorded 
+        for each node of the rule tree. 
+        The rule is compiled with instrumentation (see :meth:`compile`), 
+        and the rule without instrumentation is not affected.
+        
+        usage::
+            
+            >>> stfields = StructuredFields(rule)
+            >>> stats = stfields.instrument()
+            >>> stfields(data)
+            >>> stats.snapshot()
+            {'': {...}, 'orders': {...}, 'orders[]': {...}, 
+             'orders[].items[].sku': {...}, ...}
+        
+        :param stats: :class:`~instrumentation.RuleStats` that records calls.
+                      If :obj:`None`, new one is created.
+        :return: :class:`~instrumentation.RuleStats`.
+        """
+        if stats is None:
+            stats = RuleStats()
+        self.stats = stats
+        self.compile()
+        return stats
+
+    def uninstrument(self):
+        """Stop recording calls, and compile the rule without it."""
+        self.stats = None
+        self.compile()
+
+    def optimize(self):
+        """Replace the rule with the optimized rule (see :func:`optimize_rule`).
+        
+        If the rule is compiled, it is compiled again.
+        
+        usage::
+            
+            >>> stfields = StructuredFields(rule)
+            >>> print stfields.optimize()
+            name: flatten: All into All
+            tags[]: hoist: Regex, String -> String, Regex
+        
+        :return: :class:`~validators.OptimizationReport`.
+        """
+        report = validators.OptimizationReport()
+        self.rule = optimize_rule(self.rule, report)
+        if self.compiled is not None:
+            self.compile()
+        return report
+
+    def revalidate(self, data, result, paths):
+        """Validate the changed parts of the data.
+        
+        Only the subtrees at the paths are validated again, 
+        and the containers on the way are checked again 
+        (container type, extra and required keys of :class:`Dict`, 
+        empty sequence of :class:`Seq`). 
+        The other branches of `result` are shared by the new result.
+        
+        usage::
+            
+            >>> result = stfields(data)
+            >>> data['users'][3]['name'] = 'Jane'
+            >>> result = stfields.revalidate(data, result, 
+            ...                              [('users', 3, 'name')])
+        
+        :param data: Changed data.
+        :param result: Result of the data before the change 
+                       by the same rule, e.g. result of :meth:`__call__`.
+        :param paths: Iterable of the paths of the changes. 
+                      The path is :class:`tuple` of the identifiers 
+                      (same as :attr:`~validators.ValidationError.path`). 
+                      Add or removal of the item of sequence 
+                      is the change of the sequence.
+        :return: Same as :meth:`validate` of the changed data, 
+                 or the data itself in the passthrough mode 
+                 (same as :meth:`__call__`).
+        """
+        result = self._revalidate(data, result, self.rule,
+                                  [tuple(path) for path in paths],
+                                  self.empty_value)
+        if self._passes_through():
+            return data
+        return result
+
+    def apply_patch(self, data, result, patch):
+        """Apply the patch to the data, and validate the changed parts.
+        
+        The operations of JSON Patch (:rfc:`6902`) ``add``, ``remove`` 
+        and ``replace`` are supported, and the path is JSON Pointer. 
+        The given data is not modified, the containers on the way 
+        of the changes are copied.
+        
+        usage::
+            
+            >>> data, result = stfields.apply_patch(data, result, [
+            ...     {'op': 'replace', 'path': '/users/3/name', 
+            ...      'value': 'Jane'},
+            ...     {'op': 'add', 'path': '/users/-', 'value': {...}}])
+        
+        :param data: Data before the change.
+        :param result: Result of the data (see :meth:`revalidate`).
+        :param patch: Iterable of the operations.
+        :raises ValueError: Unsupported operation, or invalid path.
+        :return: ``(changed data, result of the changed data)``.
+        """
+        paths = []
+        for operation in patch:
+            data, path = _patched(data, _parse_pointer(operation['path']),
+                                  operation['op'], operation.get('value'))
+            paths.append(path)
+        return (data, self.revalidate(data, result, paths))
+
+    def iter_validate(self, iterable):
+        """Validate records one by one.
+        
+        Records are taken from the iterable lazily, 
+        so memory usage does not depend on the number of records. 
+        The rule is compiled once (unless compiled already) 
+        and used for all records.
+        
+        usage::
+            
+            >>> stfields = StructuredFields(Dict(id=IDField()))
+            >>> for index, converted, error in stfields.iter_validate(
+            ...         [{'id': '1'}, {'id': 'x'}]):
+            ...   print index, converted, repr(error)
+            0 {'id': 1} None
+            1 None InvalidValueError(...)
+        
+        :param iterable: Iterable of records.
+        :return: Generator of ``(index, converted, error)``. 
+                 If the record is valid, `error` is :obj:`None`, 
+                 and `converted` is the record itself 
+                 in the passthrough mode (same as :meth:`__call__`). 
+                 Otherwise, `converted` is :obj:`None` and `error` is 
+                 the exception (one of :data:`COLLECTABLE_ERRORS`).
+        """
+        if self.collect_errors:
+            validate = self
+            passes = False
+        else:
+            validate = self.compiled or \
+                    compile_rule(self.rule, self.empty_value)
+            passes = self._passes_through()
+        for index, record in enumerate(iterable):
+            try:
+                converted = validate(record)
+            except COLLECTABLE_ERRORS, e:
+                yield (index, None, e)
+            else:
+                if passes:
+                    converted = record
+                yield (index, converted, None)
+
+    def bulk_validate(self, iterable, processes=None, chunksize=1000):
+        """Validate records by multiple processes.
+        
+        The records are split into chunks, and the chunks are validated 
+        by a pool of worker processes (:mod:`multiprocessing`). 
+        This object (rule set) is sent to each worker once 
+        at the start, not for each chunk.
+        
+        Chunks are taken from the iterable lazily, and the number of 
+        chunks in process is limited, so memory usage does not depend 
+        on the number of records.
+        
+        .. note::
+            The rule set, records and results have to be picklable.
+        
+        :param iterable: Iterable of records.
+        :param processes: Number of worker processes. 
+                          Default is the number of CPUs.
+        :param chunksize: Number of records in one chunk.
+        :return: Generator of ``(index, converted, error)`` 
+                 in order of the records, 
+                 same as :meth:`iter_validate`.
+        """
+        import multiprocessing
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        pool = multiprocessing.Pool(processes,
+                                    initializer=_init_bulk_worker,
+                                    initargs=(self,))
+        max_pending = processes * 2
+        pending = deque()
+        offset = 0
+        try:
+            for chunk in _chunks(iterable, chunksize):
+                pending.append(pool.apply_async(_validate_chunk, (chunk,)))
+                if len(pending) < max_pending:
+                    continue
+                for index, converted, error in pending.popleft().get():
+                    yield (offset + index, converted, error)
+                offset += chunksize
+            while pending:
+                for index, converted, error in pending.popleft().get():
+                    yield (offset + index, converted, error)
+                offset += chunksize
+        finally:
+            pool.terminate()
+            pool.join()
     
     @classmethod
     def validate(cls, data, rule, empty_value=None):
@@ -85,6 +736,11 @@ class StructuredFields(object):
         """
         if hasattr(data, '__iter__'):
             rule(data)  # container type validation
+            if isinstance(rule, Dict) and isinstance(data, dict):
+                cls._validate_missing(data, rule, empty_value)
+            if isinstance(rule, Seq) and not isinstance(data, dict):
+                return data.__class__(
+                    cls._validate_items(data, rule, empty_value))
             if isinstance(data, dict):
                 obj = dict()
                 add_to_obj = obj.__setitem__
@@ -108,9 +764,13 @@ class StructuredFields(object):
                             cls.validate(empty_value, inner_rule,
                                          empty_value=empty_value)
                     break
-                add_to_obj(ident,
-                           cls.validate(inner_data, rule.get(ident),
-                                empty_value=empty_value))
+                try:
+                    add_to_obj(ident,
+                               cls.validate(inner_data, rule.get(ident),
+                                    empty_value=empty_value))
+                except validators.ValidationError, e:
+                    e.path = (ident,) + e.path
+                    raise
             # create same type object of the input data
             return data.__class__(obj)
         else:
@@ -118,21 +778,766 @@ class StructuredFields(object):
             # in this case, "rule" is Field or Validator
             return rule(data)
 
+    @classmethod
+    def check(cls, data, rule, empty_value=None):
+        """Validate data by rule, without building the converted data.
+        
+        The errors are the same as :meth:`validate`, 
+        but the result of Fields and Validators is discarded.
+        
+        usage::
+            
+            >>> rule = Dict(a=Seq(Number(max=3)), b=String())
+            >>> StructuredFields.check({'a': [1, 2], 'b': 'x'}, rule)
+            >>> StructuredFields.check({'a': [1, 5], 'b': 'x'}, rule)
+            validators.InvalidValueError: over max
+        
+        :param data: Data structure.
+        :param rule: A rule set.
+        :param empty_value: Validator or Field's empty case value.
+        :return: :obj:`None`.
+        """
+        if not hasattr(data, '__iter__'):
+            # leaf of container tree validation
+            rule(data)
+            return None
+        if isinstance(rule, Seq) and not isinstance(data, dict):
+            rule(data)  # container type validation
+            cls._validate_items(data, rule, empty_value, check=True)
+            return None
+        if not (isinstance(rule, Dict) and isinstance(data, dict)):
+            cls.validate(data, rule, empty_value=empty_value)
+            return None
+        rule(data)  # container type validation
+        cls._validate_missing(data, rule, empty_value)
+        check = cls.check
+        for ident, inner_rule in rule.rules.iteritems():
+            try:
+                inner_data = data[ident]
+            except KeyError:
+                # data is missing key
+                inner_data = empty_value
+            try:
+                check(inner_data, inner_rule, empty_value=empty_value)
+            except validators.ValidationError, e:
+                e.path = (ident,) + e.path
+                raise
+        return None
+
+    @classmethod
+    def _validate_missing(cls, data, rule, empty_value):
+        """Validate the missing required keys of :class:`Dict` 
+        before the values."""
+        for ident in rule.missing_keys(data):
+            try:
+                cls.validate(empty_value, rule.get(ident),
+                             empty_value=empty_value)
+            except validators.ValidationError, e:
+                e.path = (ident,) + e.path
+                raise
+
+    @classmethod
+    def _revalidate(cls, data, result, rule, paths, empty_value):
+        """Validate the changed parts of the data (see :meth:`revalidate`).
+        
+        :param paths: List of the paths from this node.
+        """
+        if () in paths or not hasattr(data, '__iter__'):
+            return cls.validate(data, rule, empty_value=empty_value)
+        if isinstance(rule, Dict) and isinstance(data, dict) and \
+                isinstance(result, dict):
+            rule(data)  # container type validation
+            cls._validate_missing(data, rule, empty_value)
+            obj = dict(result)
+            for ident, inner_paths in _group_paths(paths):
+                if ident not in rule.rule_keys:
+                    # extra data that is ignored
+                    continue
+                try:
+                    inner_data = data[ident]
+                except KeyError:
+                    # data is missing key
+                    inner_data = empty_value
+                try:
+                    obj[ident] = cls._revalidate(
+                        inner_data, result.get(ident), rule.rules[ident],
+                        inner_paths, empty_value)
+                except validators.ValidationError, e:
+                    e.path = (ident,) + e.path
+                    raise
+            return data.__class__(obj)
+        if isinstance(rule, Seq) and rule.rules and \
+                not isinstance(data, dict) and \
+                isinstance(result, (list, tuple)) and \
+                len(result) == len(data):
+            rule(data)  # container type validation
+            items = validators._sequence(data)
+            obj = list(result)
+            for index, inner_paths in _group_paths(paths):
+                index = int(index)
+                if not 0 <= index < len(obj):
+                    return cls.validate(data, rule, empty_value=empty_value)
+                try:
+                    obj[index] = cls._revalidate(
+                        items[index], obj[index],
+                        rule.rules[index % len(rule.rules)],
+                        inner_paths, empty_value)
+                except validators.ValidationError, e:
+                    e.path = (index,) + e.path
+                    raise
+            return data.__class__(obj)
+        return cls.validate(data, rule, empty_value=empty_value)
+
+    @classmethod
+    def _validate_items(cls, data, rule, empty_value, check=False):
+        """Validate items of the sequence by :class:`Seq`.
+        
+        The data is iterated directly, and the rules are cycled 
+        only when there are two or more. 
+        Items of a single leaf Validator are validated together 
+        by :meth:`~validators.ValidatorBaseInterface.validate_many` 
+        in chunks (see :func:`_first_failure`).
+        
+        :param check: If :obj:`True`, the items are validated 
+                      by :meth:`check`, and return :obj:`None`.
+        :return: List of the converted items.
+        """
+        rules = rule.rules
+        if not data:
+            # empty container
+            if rules and getattr(rules[0], 'required', False):
+                # will be check Field's "required" flag
+                cls.validate(empty_value, rules[0], empty_value=empty_value)
+            return None if check else []
+        if len(rules) == 1 and _untraced(rules[0]) is not None:
+            items = validators._sequence(data)
+            failure = _first_failure(rules[0], items)
+            if failure is not None:
+                index, error = failure
+                try:
+                    rules[0](items[index])  # raise with the trace
+                    raise error
+                except validators.ValidationError, e:
+                    e.path = (index,) + e.path
+                    raise
+            return None if check else [None] * len(items)
+        if check:
+            index = 0
+            try:
+                for index, (inner_rule, item) in \
+                        enumerate(izip(cycle(rules), data)):
+                    cls.check(item, inner_rule, empty_value=empty_value)
+            except validators.ValidationError, e:
+                e.path = (index,) + e.path
+                raise
+            return None
+        obj = []
+        append = obj.append
+        validate = cls.validate
+        try:
+            if len(rules) == 1:
+                inner_rule = rules[0]
+                for item in data:
+                    append(validate(item, inner_rule,
+                                    empty_value=empty_value))
+            else:
+                for inner_rule, item in izip(cycle(rules), data):
+                    append(validate(item, inner_rule,
+                                    empty_value=empty_value))
+        except validators.ValidationError, e:
+            e.path = (len(obj),) + e.path
+            raise
+        return obj
+
+    @classmethod
+    def validate_all(cls, data, rule, empty_value=None, max_errors=100):
+        """Validate data by rule, and collect all errors.
+        
+        Unlike :meth:`validate`, validation does not stop 
+        at the first error, but the rest of the data is validated. 
+        The errors are raised together by :exc:`StructureError`.
+        
+        usage::
+            
+            >>> rule = Dict(a=Seq(Number(max=3)), b=String())
+            >>> StructuredFields.validate_all({'a': [1, 5, 'x'], 'b': 0}, rule)
+            structures.StructureError: 3 error(s) found
+        
+        :param data: Data structure.
+        :param rule: A rule set.
+        :param empty_value: Validator or Field's empty case value.
+        :param max_errors: Validation is stopped when the number of errors 
+                           has reached this value. 
+                           If :obj:`None`, no limit.
+        :exception StructureError: Errors occurred while validation.
+        :return: Same as :meth:`validate`.
+        """
+        errors = OrderedDict()
+        result = cls._collect(data, rule, empty_value, (),
+                              errors, max_errors)
+        if errors:
+            raise StructureError(errors)
+        return result
+
+    @classmethod
+    def validate_concurrently(cls, data, rule, empty_value=None,
+                              pool=None, max_workers=10):
+        """Validate data by rule, and run blocking leaves concurrently.
+        
+        The leaves (Validator or Field) that contain 
+        :class:`~validators.Blocking` validator are run by a pool of 
+        threads, concurrently across keys of :class:`~structures.Dict` 
+        and items of :class:`~structures.Seq`. The other leaves 
+        and container type validations are run in the calling thread.
+        
+        If errors occurred, the error that :meth:`validate` would raise 
+        (the first in order of the data) is raised.
+        
+        usage::
+            
+            >>> unique = Blocking(AllowType(check_name_in_service))
+            >>> rule = Seq(Dict(name=All(String(), unique)))
+            >>> StructuredFields.validate_concurrently(data, rule,
+            ...                                       max_workers=30)
+        
+        :param data: Data structure.
+        :param rule: A rule set.
+        :param empty_value: Validator or Field's empty case value.
+        :param pool: Pool of threads 
+                     (:class:`multiprocessing.pool.ThreadPool`). 
+                     If :obj:`None`, a pool is created for this call.
+        :param max_workers: Number of threads of the pool 
+                            that is created for this call.
+        :return: Same as :meth:`validate`.
+        """
+        if pool is None:
+            from multiprocessing.pool import ThreadPool
+            own_pool = pool = ThreadPool(max_workers)
+        else:
+            own_pool = None
+        jobs = []
+        try:
+            try:
+                result = cls._submit(data, rule, empty_value,
+                                     pool, jobs, {})
+            except COLLECTABLE_ERRORS:
+                # error of a job has priority if it occurred before
+                _check_jobs(jobs)
+                raise
+            _check_jobs(jobs)
+        finally:
+            if own_pool is not None:
+                own_pool.terminate()
+        return _resolve(result)
+
+    @classmethod
+    def _submit(cls, data, rule, empty_value, pool, jobs, blocking,
+                path=()):
+        if not (isinstance(rule, StructureRule) and
+                hasattr(data, '__iter__')):
+            if id(rule) not in blocking:
+                blocking[id(rule)] = _is_blocking(rule)
+            if blocking[id(rule)]:
+                job = _Job(pool.apply_async(_call_leaf, (rule, data)), path)
+                jobs.append(job)
+                return job
+            return rule(data)
+        rule(data)  # container type validation
+        if isinstance(rule, Dict) and isinstance(data, dict):
+            # same order as validate()
+            try:
+                cls._validate_missing(data, rule, empty_value)
+            except validators.ValidationError, e:
+                e.path = path + e.path
+                raise
+        pending = False
+        if isinstance(data, dict):
+            obj = dict()
+            add_to_obj = obj.__setitem__
+        else:
+            obj = list()
+            add_to_obj = lambda index, value: obj.append(value)
+        # rule based scan
+        for ident in rule.iteridents():
+            try:
+                inner_data = data[ident]
+            except KeyError:
+                # data is missing key, for dict
+                inner_data = empty_value
+            except IndexError:
+                # end of data, for other sequence
+                if len(data) == 0:
+                    # empty container
+                    inner_rule = rule.get(ident)
+                    if getattr(inner_rule, 'required', False):
+                        # will be check Field's "required" flag
+                        cls._submit(empty_value, inner_rule, empty_value,
+                                    pool, jobs, blocking, path + (ident,))
+                break
+            try:
+                inner = cls._submit(inner_data, rule.get(ident), empty_value,
+                                    pool, jobs, blocking, path + (ident,))
+            except validators.ValidationError, e:
+                if not e.path:
+                    e.path = path + (ident,)
+                raise
+            pending = pending or isinstance(inner, _Pending)
+            add_to_obj(ident, inner)
+        if pending:
+            return _PendingContainer(data.__class__, obj)
+        # create same type object of the input data
+        return data.__class__(obj)
+
+    @classmethod
+    def _collect(cls, data, rule, empty_value, path, errors, max_errors):
+        try:
+            if not (isinstance(rule, StructureRule) and
+                    hasattr(data, '__iter__')):
+                return rule(data)
+            rule(data)  # container type validation
+        except COLLECTABLE_ERRORS, e:
+            if isinstance(e, validators.ValidationError):
+                e.path = path + e.path
+            errors[path] = e
+            if max_errors is not None and len(errors) >= max_errors:
+                raise StructureError(errors, truncated=True)
+            return None
+        if isinstance(data, dict):
+            obj = dict()
+            add_to_obj = obj.__setitem__
+        else:
+            obj = list()
+            add_to_obj = lambda index, value: obj.append(value)
+        # rule based scan
+        for ident in rule.iteridents():
+            try:
+                inner_data = data[ident]
+            except KeyError:
+                # data is missing key, for dict
+                inner_data = empty_value
+            except IndexError:
+                # end of data, for other sequence
+                if len(data) == 0:
+                    # empty container
+                    inner_rule = rule.get(ident)
+                    if getattr(inner_rule, 'required', False):
+                        # will be check Field's "required" flag
+                        cls._collect(empty_value, inner_rule, empty_value,
+                                     path + (ident,), errors, max_errors)
+                break
+            add_to_obj(ident,
+                       cls._collect(inner_data, rule.get(ident), empty_value,
+                                    path + (ident,), errors, max_errors))
+        # create same type object of the input data
+        return data.__class__(obj)
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# StructuredFields in worker process of bulk validation
+_bulk_fields = None
+
+def _init_bulk_worker(stfields):
+    global _bulk_fields
+    _bulk_fields = stfields
+    if not stfields.collect_errors and stfields.compiled is None:
+        stfields.compile()
+
+def _validate_chunk(chunk):
+    return list(_bulk_fields.iter_validate(chunk))
+
+
+def _is_blocking(rule):
+    """Does the leaf rule contain :class:`~validators.Blocking`?"""
+    if isinstance(rule, validators.Blocking):
+        return True
+    for validator in getattr(rule, 'validators', ()):
+        if _is_blocking(validator):
+            return True
+    validator = getattr(rule, 'validator', None)
+    if validator is not None and validator is not rule:
+        return _is_blocking(validator)
+    return False
+
+def _call_leaf(rule, data):
+    # exceptions are returned, because thread pool does not 
+    # catch BaseException
+    try:
+        return (None, rule(data))
+    except COLLECTABLE_ERRORS, e:
+        return (e, None)
+
+def _group_paths(paths):
+    """Group the paths by the first identifier.
+    
+    :return: List of ``(identifier, the rest of paths)``.
+    """
+    groups = OrderedDict()
+    for path in paths:
+        groups.setdefault(path[0], []).append(path[1:])
+    return groups.items()
+
+def _parse_pointer(pointer):
+    """List of the reference tokens of JSON Pointer."""
+    if not pointer:
+        return []
+    if not pointer.startswith('/'):
+        raise ValueError('invalid path: %r' % (pointer,))
+    return [token.replace('~1', '/').replace('~0', '~')
+            for token in pointer[1:].split('/')]
+
+def _patched(node, tokens, op, value):
+    """Apply an operation to the node.
+    
+    :return: ``(new node, path of the change from the node)``.
+    """
+    if op not in ('add', 'remove', 'replace'):
+        raise ValueError('unsupported operation: %r' % (op,))
+    if not tokens:
+        if op == 'remove':
+            raise ValueError('can not remove the root')
+        return (value, ())
+    token = tokens[0]
+    if isinstance(node, dict):
+        ident = token
+        if (len(tokens) > 1 or op != 'add') and ident not in node:
+            raise ValueError('no such key: %r' % (ident,))
+        items = dict(node)
+    elif isinstance(node, (list, tuple)):
+        if token == '-' and len(tokens) == 1 and op == 'add':
+            ident = len(node)
+        else:
+            try:
+                ident = int(token)
+            except ValueError:
+                raise ValueError('invalid index: %r' % (token,))
+            if len(tokens) == 1 and op == 'add':
+                limit = len(node) + 1
+            else:
+                limit = len(node)
+            if not 0 <= ident < limit:
+                raise ValueError('index out of range: %r' % (token,))
+        items = list(node)
+    else:
+        raise ValueError('not container: %r' % (token,))
+    if len(tokens) > 1:
+        items[ident], path = _patched(node[ident], tokens[1:], op, value)
+        path = (ident,) + path
+    elif isinstance(items, dict):
+        if op == 'remove':
+            del items[ident]
+        else:
+            items[ident] = value
+        path = (ident,)
+    elif op == 'replace':
+        items[ident] = value
+        path = (ident,)
+    else:
+        # length of the sequence is changed
+        if op == 'add':
+            items.insert(ident, value)
+        else:
+            del items[ident]
+        path = ()
+    if node.__class__ is not items.__class__:
+        items = node.__class__(items)
+    return (items, path)
+
+def _check_jobs(jobs):
+    """Raise the first error of the jobs."""
+    for job in jobs:
+        job.check()
+
+
+class _Pending(object):
+    """Result that is fixed after the jobs are done."""
+
+    def resolve(self):
+        raise NotImplementedError
+
+class _Job(_Pending):
+
+    def __init__(self, async_result, path=()):
+        self.async_result = async_result
+        self.path = path
+
+    def check(self):
+        error, self.result = self.async_result.get()
+        if error is not None:
+            if isinstance(error, validators.ValidationError):
+                error.path = self.path + error.path
+            raise error
+
+    def resolve(self):
+        return self.result
+
+class _PendingContainer(_Pending):
+
+    def __init__(self, container_type, obj):
+        self.container_type = container_type
+        self.obj = obj
+
+    def resolve(self):
+        if isinstance(self.obj, dict):
+            obj = dict([(key, _resolve(value))
+                        for key, value in self.obj.iteritems()])
+        else:
+            obj = [_resolve(value) for value in self.obj]
+        return self.container_type(obj)
+
+def _resolve(value):
+    if isinstance(value, _Pending):
+        return value.resolve()
+    return value
+
+
+def compile_rule(rule, empty_value=None, stats=None, path=''):
+    """Compile a rule into validation function.
+    
+    :param rule: A rule set, Validator or Field.
+    :param empty_value: Validator or Field's empty case value.
+    :param stats: If :class:`~instrumentation.RuleStats` is given, 
+                  calls of each node are recorded to it.
+    :param path: Rule path of the rule.
+    :return: Function that takes data and returns the same as 
+             :meth:`StructuredFields.validate`.
+    """
+    if isinstance(rule, StructureRule):
+        function = rule.compile(empty_value, stats=stats, path=path)
+    else:
+        function = _leaf_function(rule)
+    if stats is not None:
+        function = stats.timed(path, function)
+    return function
+
+
+def _converts(rule):
+    """Whether the result of the rule can be other than :obj:`None` 
+    for the leaves, i.e. the rule has other than Validators."""
+    if isinstance(rule, StructureRule):
+        return any([_converts(inner) for inner in rule])
+    return _untraced(rule) is None
+
+
+def _leaf_function(rule):
+    """Cheapest callable that is equivalent to call the leaf rule."""
+    # skip the frame of __call__
+    if _untraced(rule) is not None:
+        return rule.validate
+    if isinstance(rule, BaseField) and \
+            type(rule).__call__ == BaseField.__call__:
+        return rule.process
+    return rule
+
+
+def _untraced(rule):
+    """The validator if :func:`_leaf_function` skips its ``__call__``, 
+    that records the trace of errors."""
+    if isinstance(rule, validators.ValidatorBaseInterface) and \
+            type(rule).__call__ == validators.ValidatorBaseInterface.__call__:
+        return rule
+    return None
+
+
+#: Sizes of the chunks of :func:`_first_failure`.
+_FIRST_CHUNK_SIZE = 16
+_MAX_CHUNK_SIZE = 4096
+
+def _first_failure(validator, items):
+    """The first invalid item by 
+    :meth:`~validators.ValidatorBaseInterface.validate_many`.
+    
+    The items are validated in chunks that double in size 
+    up to 4096 items, and stop at the first chunk that has invalid items. 
+    So the exceptions are built only for a few items of invalid data.
+    
+    :return: ``(index, exception)``, or :obj:`None` if all are valid.
+    """
+    validate_many = validator.validate_many
+    length = len(items)
+    start = 0
+    size = _FIRST_CHUNK_SIZE
+    while start < length:
+        if start == 0 and size >= length:
+            failures = validate_many(items)
+        else:
+            failures = validate_many(items[start:start + size])
+        if failures:
+            index, error = failures[0]
+            return (start + index, error)
+        start += size
+        size = min(size * 2, _MAX_CHUNK_SIZE)
+    return None
+
+
+def _trace_check(error, rule, leaf, data):
+    """Record the trace of the error of container type validation, 
+    same as :meth:`StructureRule.__call__`."""
+    if leaf is not None:
+        error.add_trace(leaf, data)
+    error.add_trace(rule, data)
+
+
+def _locate(error, ident, leaf, value):
+    """Record the position of the error that propagates from the inner rule.
+    
+    :param leaf: Result of :func:`_untraced` for the inner rule.
+    """
+    if leaf is not None:
+        error.add_trace(leaf, value)
+    error.path = (ident,) + error.path
+
+
+def rule_ident(rule):
+    """Identifier of the rule.
+    
+    Rule sets, Validators and Fields that have the same structure 
+    have the same identifier. 
+    The other callables are identified by the object itself.
+    
+    :param rule: A rule set, Validator or Field.
+    """
+    ident = getattr(rule, 'ident', None)
+    if ident is not None:
+        return ident
+    return validators._fingerprint(rule)
+
+
+def optimize_rule(rule, report=None, path=''):
+    """Rewrite the rule into equivalent rule.
+    
+    The validators in the rule, and the validators of Fields 
+    are optimized by :func:`~validators.optimize`. 
+    The given rule is not modified, the rule sets and Fields 
+    that contain optimized validators are copied.
+    
+    :param rule: A rule set, Validator or Field.
+    :param report: :class:`~validators.OptimizationReport` 
+                   that the changes are added.
+    :param path: Rule path of the rule.
+    :return: Optimized rule. If nothing is changed, the given rule.
+    """
+    if report is None:
+        report = validators.OptimizationReport()
+    return _rewrite_rule(rule, lambda validator, path:
+                         validators.optimize(validator, report, path), path)
+
+
+def intern_rule(rule, pool=None):
+    """Share the identical validators in the rule.
+    
+    The validators in the rule, and the validators of Fields 
+    are replaced by :meth:`~validators.InternPool.intern`. 
+    The given rule is not modified, the rule sets and Fields 
+    that contain replaced validators are copied.
+    
+    usage::
+        
+        >>> pool = InternPool()
+        >>> rules = [intern_rule(schema, pool) for schema in schemas]
+        >>> pool.info()
+        {'hits': 41230, 'misses': 310, 'size': 310}
+    
+    :param rule: A rule set, Validator or Field.
+    :param pool: :class:`~validators.InternPool`. 
+                 If :obj:`None`, :data:`intern_pool` is used.
+    :return: Rule with interned validators. 
+             If nothing is changed, the given rule.
+    """
+    if pool is None:
+        pool = intern_pool
+    return _rewrite_rule(rule, lambda validator, path:
+                         pool.intern(validator))
+
+
+#: Default :class:`~validators.InternPool` of :func:`intern_rule`.
+intern_pool = validators.InternPool()
+
+
+def _rewrite_rule(rule, rewrite, path=''):
+    """Replace the validators in the rule.
+    
+    :param rewrite: Function that takes a validator and its rule path, 
+                    and returns the validator or the replacement.
+    """
+    import copy
+    if isinstance(rule, Dict):
+        rules = dict([(key, _rewrite_rule(inner, rewrite,
+                                          join_path(path, key)))
+                      for key, inner in rule.rules.iteritems()])
+        if all([rules[key] is inner for key, inner in rule.rules.iteritems()]):
+            return rule
+        optimized = copy.copy(rule)
+        optimized.rules = rules
+        optimized.data_validator = _copy_validator(rule.data_validator)
+        optimized._fix_data_validator()
+        return optimized
+    if isinstance(rule, Seq):
+        rules = [_rewrite_rule(inner, rewrite, join_path(path, None))
+                 for inner in rule.rules]
+        if all([a is b for a, b in zip(rules, rule.rules)]):
+            return rule
+        optimized = copy.copy(rule)
+        optimized.rules = rules
+        return optimized
+    if isinstance(rule, BaseField):
+        if rule.validator is None:
+            return rule
+        validator = rewrite(rule.validator, path)
+        if validator is rule.validator:
+            return rule
+        optimized = copy.copy(rule)
+        optimized.validator = validator
+        converter = rule.__dict__.get('converter')
+        if isinstance(converter, partial) and converter.args[:1] == (rule,):
+            # bound to the field by __init__
+            optimized.converter = partial(converter.func, optimized)
+        return optimized
+    if isinstance(rule, validators.ValidatorBaseInterface):
+        return rewrite(rule, path)
+    return rule
+
+
+def _copy_validator(validator):
+    """Copy the validator and the inner validators."""
+    import copy
+    validator = copy.copy(validator)
+    if isinstance(getattr(validator, 'validators', None), list):
+        validator.validators = [_copy_validator(inner)
+                                for inner in validator.validators]
+    return validator
+
 
 class StructureRule(object):
     """Abstruct data structure validation rule set."""
+
+    __slots__ = ('rules', 'data_validator', '__weakref__')
     
     def __init__(self, *rules, **options):
         self.rules = rules
         self.data_validator = validators.Type(options.pop('type', None))
 
+    def __getstate__(self):
+        return validators._slot_state(self)
+
     def __call__(self, value):
         """Compatible interface for Field and Validator.
         
         :param value: Validatee value.
         :raises InvalidTypeError: Unexpected type (of the value) was given.
         """
-        self.data_validator(value)
+        try:
+            self.data_validator(value)
+        except validators.ValidationError, e:
+            e.add_trace(self, value)
+            raise
 
     def __len__(self):
         return len(self.rules)
@@ -168,11 +1573,34 @@ class StructureRule(object):
         """Rule getter."""
         raise NotImplementedError
 
+    @property
+    def ident(self):
+        """Identifier of the rule set.
+        
+        It is computed from the inner rules at each access.
+        """
+        return (self.__class__.__name__,
+                rule_ident(self.data_validator),
+                self._rules_ident())
+
+    def _rules_ident(self):
+        raise NotImplementedError
+
+    def compile(self, empty_value=None, stats=None, path=''):
+        """Compile into validation function.
+        
+        :param empty_value: Validator or Field's empty case value.
+        :param stats: :class:`~instrumentation.RuleStats` for inner rules.
+        :param path: Rule path of this rule.
+        :return: Function that takes data.
+        """
+        raise NotImplementedError
 
-from itertools import cycle, count
 
 class NotEmptySequence(validators.Length):
 
+    __slots__ = ()
+
     def __init__(self):
         super(NotEmptySequence, self).__init__(min=1)
 
@@ -225,6 +1653,8 @@ class Seq(StructureRule):
                                Otherwise, same as :class:`StructureRule`.
     """
 
+    __slots__ = ('disallow_empty',)
+
     def __init__(self, *rules, **options):
         super(Seq, self).__init__(type=options.pop('type', list),
                                   *rules)
@@ -304,16 +1734,102 @@ class Seq(StructureRule):
             raise
         return self.rules[ident % len(self.rules)]
 
+    def _rules_ident(self):
+        return tuple([rule_ident(rule) for rule in self.rules])
+
+    def compile(self, empty_value=None, stats=None, path=''):
+        """Compile into validation function.
+        
+        The data is iterated directly, 
+        and the rules are cycled only when there are two or more.
+        """
+        check = _leaf_function(self.data_validator)
+        check_leaf = _untraced(self.data_validator)
+        inner_path = join_path(path, None)
+        functions = [compile_rule(rule, empty_value, stats, inner_path)
+                     for rule in self.rules]
+        leaves = [_untraced(rule) for rule in self.rules]
+        if functions and getattr(self.rules[0], 'required', False):
+            # will be check Field's "required" flag for empty sequence
+            check_required = functions[0]
+        else:
+            check_required = None
+        if len(functions) == 1 and stats is None and leaves[0] is not None:
+            # batched validation of leaf Validator
+            leaf = leaves[0]
+            def validate_items(data):
+                items = validators._sequence(data)
+                failure = _first_failure(leaf, items)
+                if failure is not None:
+                    index, error = failure
+                    try:
+                        leaf.validate(items[index])
+                        raise error
+                    except validators.ValidationError, e:
+                        _locate(e, index, leaf, items[index])
+                        raise
+                return [None] * len(items)
+        elif len(functions) == 1:
+            function = functions[0]
+            leaf = leaves[0]
+            def validate_items(data):
+                obj = []
+                append = obj.append
+                try:
+                    for item in data:
+                        append(function(item))
+                except validators.ValidationError, e:
+                    _locate(e, len(obj), leaf, item)
+                    raise
+                return obj
+        else:
+            pairs = zip(functions, leaves)
+            def validate_items(data):
+                obj = []
+                append = obj.append
+                try:
+                    for (function, leaf), item in izip(cycle(pairs), data):
+                        append(function(item))
+                except validators.ValidationError, e:
+                    _locate(e, len(obj), leaf, item)
+                    raise
+                return obj
+
+        def validate_seq(data):
+            try:
+                check(data)  # container type validation
+            except validators.ValidationError, e:
+                _trace_check(e, self, check_leaf, data)
+                raise
+            if not hasattr(data, '__iter__'):
+                return None
+            obj = validate_items(data)
+            if not obj and check_required is not None:
+                check_required(empty_value)
+            if data.__class__ is list:
+                return obj
+            return data.__class__(obj)
+        return validate_seq
+
 
 class ExtraDataRejection(validators.Validator):
+
+    __slots__ = ()
+
     def validate(self, value):
         data, rules = value
-        extra_data = set(data.keys()) - set(rules)
-        if extra_data:
-            raise validators.InvalidValueError(
-                'Found extra data: %s' % extra_data)
+        if not isinstance(rules, frozenset):
+            rules = frozenset(rules)
+        if data.viewkeys() <= rules:
+            return
+        extra_data = set(data.viewkeys() - rules)
+        raise validators.InvalidValueError(
+            'Found extra data: %s' % extra_data)
 
 class PackAdapter(validators.ValueAdapter):
+
+    __slots__ = ('rules',)
+
     def __init__(self, rules, *validators):
         super(PackAdapter, self).__init__(*validators)
         self.rules = rules
@@ -321,6 +1837,10 @@ class PackAdapter(validators.ValueAdapter):
     def on_adapt(self, value):
         return (value, self.rules)
 
+#: Rule of the key that is not in :class:`Dict`.
+_missing_rule = validators.Failure()
+
+
 class Dict(StructureRule):
     """Dictionary of rules.
     
@@ -335,17 +1855,26 @@ class Dict(StructureRule):
                                 to ignore extra data 
                                 when find unexpected key 
                                 in validatee structured data.
+    
+    The keys of the rules are indexed in :attr:`rule_keys` 
+    and :attr:`required_keys`. 
+    The index is updated by :meth:`__setitem__`, :meth:`__delitem__` 
+    and :meth:`insert`, but not by the change of the inner Field, 
+    e.g. to set :attr:`fields.BaseField.required` after insertion.
     """
+
+    __slots__ = ('is_ignore_extra', 'rule_keys', 'required_keys')
     
     def __init__(self, *rules, **kwrules):
         self.is_ignore_extra = kwrules.pop('__is_ignore_extra', False)
         rules = dict(*rules, **kwrules)
         super(Dict, self).__init__(rules, type=dict)
         self.rules = self.rules[0]  # unpack tuple
+        self._index_keys()
         if not self.is_ignore_extra:
             self.data_validator = \
                 validators.All(self.data_validator,
-                    PackAdapter(self.rules.keys(),
+                    PackAdapter(self.rule_keys,
                                 ExtraDataRejection()))
     
     def __iter__(self):
@@ -371,7 +1900,18 @@ class Dict(StructureRule):
         super(Dict, self).__delitem__(key)
         self._fix_data_validator()
 
+    def _index_keys(self):
+        #: :class:`frozenset` of all keys of the rules.
+        self.rule_keys = frozenset(self.rules)
+        #: :class:`frozenset` of keys that the data must have, 
+        #: i.e. the rule is required Field without default value.
+        self.required_keys = frozenset(
+            [key for key, rule in self.rules.iteritems()
+             if getattr(rule, 'required', False) and
+                getattr(rule, 'default', None) is None])
+
     def _fix_data_validator(self):
+        self._index_keys()
         if not self.is_ignore_extra:
             def get_pa():
                 for index, validator in \
@@ -382,7 +1922,7 @@ class Dict(StructureRule):
             index, pack_adapter = get_pa()
             assert pack_adapter is not None
             # apply modified rules
-            pack_adapter.rules = self.rules
+            pack_adapter.rules = self.rule_keys
             self.data_validator.validators[index] = pack_adapter
 
     def insert(self, rule, ident):
@@ -403,6 +1943,101 @@ class Dict(StructureRule):
                 Otherwise, return :class:`~structures.Seq` 
                 or :class:`~structures.Dict`.
         """
-        return self.rules.get(ident, validators.Failure())
+        return self.rules.get(ident, _missing_rule)
+
+    def missing_keys(self, data):
+        """Required keys that the data does not have.
+        
+        usage::
+            
+            >>> rule = Dict(a=Field(required=True), b=Field())
+            >>> rule.missing_keys({'b': 1})
+            ['a']
+        
+        :param data: :class:`dict` of validatee data.
+        :return: List of keys in the order of :meth:`iteridents`.
+        """
+        required_keys = self.required_keys
+        if not required_keys or data.viewkeys() >= required_keys:
+            return []
+        return [key for key in self.rules
+                if key in required_keys and key not in data]
+
+    def _is_default_check(self):
+        # data_validator is not replaced or modified since __init__
+        validator = self.data_validator
+        if not self.is_ignore_extra:
+            if validator.__class__ is not validators.All or \
+                    len(validator.validators) != 2:
+                return False
+            validator, pack_adapter = validator.validators
+            if pack_adapter.__class__ is not PackAdapter or \
+                    [inner.__class__ for inner in pack_adapter.validators] \
+                    != [ExtraDataRejection]:
+                return False
+        return validator.__class__ is validators.Type and \
+            validator.value_type is dict
+
+    def _rules_ident(self):
+        return frozenset([(key, rule_ident(rule))
+                          for key, rule in self.rules.iteritems()])
+
+    def compile(self, empty_value=None, stats=None, path=''):
+        """Compile into validation function.
+        
+        The key lookups and the calls of inner rules are inlined.
+        The container validation of the plain :class:`dict` is done 
+        by :attr:`rule_keys`, and missing required keys 
+        are found by :attr:`required_keys` before the values.
+        """
+        check = _leaf_function(self.data_validator)
+        check_leaf = _untraced(self.data_validator)
+        items = [(key, compile_rule(rule, empty_value, stats,
+                                    join_path(path, key)), _untraced(rule))
+                 for key, rule in self.rules.iteritems()]
+        required_keys = self.required_keys
+        required_items = [item for item in items if item[0] in required_keys]
+        if not self._is_default_check():
+            rule_keys = None
+            ignore_extra = False
+        else:
+            rule_keys = self.rule_keys
+            ignore_extra = self.is_ignore_extra
+
+        def validate_dict(data):
+            if rule_keys is None or data.__class__ is not dict or \
+                    not (ignore_extra or data.viewkeys() <= rule_keys):
+                try:
+                    check(data)  # container type validation
+                except validators.ValidationError, e:
+                    _trace_check(e, self, check_leaf, data)
+                    raise
+                if not hasattr(data, '__iter__'):
+                    return None
+            if required_keys and isinstance(data, dict) and \
+                    not data.viewkeys() >= required_keys:
+                for key, function, leaf in required_items:
+                    if key not in data:
+                        try:
+                            function(empty_value)
+                        except validators.ValidationError, e:
+                            _locate(e, key, leaf, empty_value)
+                            raise
+            obj = {}
+            try:
+                for key, function, leaf in items:
+                    try:
+                        value = data[key]
+                    except KeyError:
+                        # data is missing key
+                        value = empty_value
+                    obj[key] = function(value)
+            except validators.ValidationError, e:
+                _locate(e, key, leaf, value)
+                raise
+            if data.__class__ is dict:
+                return obj
+            return data.__class__(obj)
+        return validate_dict
 
 
@@ -1,14 +1,36 @@
 # -*- coding: utf-8 -*-
 
-import pickle
-import hashlib
 import re
 import itertools
-import inspect
+from collections import OrderedDict
+from operator import itemgetter
+from timeit import default_timer
 
 
 class ValidationError(BaseException):
-    """Error occurred while validation."""
+    """Error occurred while validation.
+    
+    While the error propagates, validators and 
+    :class:`~structures.StructuredFields` record where it occurred 
+    (see :meth:`trace_info` and :attr:`path`).
+    """
+    
+    #: Identifiers (key of :class:`dict` or index of sequence) 
+    #: from the root of structured data to the invalid value.
+    path = ()
+    
+    def add_trace(self, validator, value):
+        """Record the validator that the error propagates through.
+        
+        It is called in order from the callee.
+        
+        :param validator: Validator or rule.
+        :param value: Validatee value of the validator.
+        """
+        try:
+            self._trace.append((validator, value))
+        except AttributeError:
+            self._trace = [(validator, value)]
     
     def trace_info(self):
         """Get generator that exception stack trace info of validator.
@@ -23,7 +45,7 @@ class ValidationError(BaseException):
         
         args
             Validator's call arguments info 
-            (format by :func:`inspect.formatargvalues`).
+            (format like :func:`inspect.formatargvalues`).
         
         value
             Validatee value.
@@ -33,37 +55,76 @@ class ValidationError(BaseException):
         
         .. note::
             The info is generated in order from the caller.
+            
+            The info is recorded while the error propagates, 
+            and is not kept by pickling.
         
         :return: Generator object.
         """
-        frame_records = inspect.trace()
         processed = set()
-        for frame_record in frame_records:
-            arginfo = inspect.getargvalues(frame_record[0])
-            local = arginfo[3]
-            if len(arginfo[0]) < 1:
-                continue
-            validator = local[arginfo[0][0]]   # maybe validator's self
-            expected_types = [ValidatorBaseInterface]
-            try:
-                from structures import StructureRule
-            except:
-                pass
-            else:
-                expected_types.append(StructureRule)
-            if not isinstance(validator, tuple(expected_types)):
-                continue
+        for validator, value in reversed(getattr(self, '_trace', ())):
             if id(validator) in processed:
                 continue
-            info_dict = {
+            yield {
                 'classname': validator.__class__.__name__,
-                'args': inspect.formatargvalues(*arginfo),
-                'value': local[arginfo[0][1]],
+                'args': '(self=%r, value=%r)' % (validator, value),
+                'value': value,
                 'validator': validator
             }
-            yield info_dict
             processed.add(id(validator))
 
+    def _render(self):
+        """Replace the :class:`LazyMessage` of the arguments 
+        with the formatted message."""
+        args = _exception_args.__get__(self)
+        if args and isinstance(args[0], LazyMessage):
+            text = args[0].text()
+            _exception_args.__set__(self, (text,) + args[1:])
+            if len(args) == 1:
+                _exception_message.__set__(self, text)
+
+    def _get_args(self):
+        self._render()
+        return _exception_args.__get__(self)
+
+    def _set_args(self, args):
+        _exception_args.__set__(self, args)
+
+    #: Arguments of the exception. 
+    #: :class:`LazyMessage` is formatted when it is read first.
+    args = property(_get_args, _set_args)
+
+    def _get_message(self):
+        self._render()
+        return _exception_message.__get__(self)
+
+    def _set_message(self, message):
+        _exception_message.__set__(self, message)
+
+    message = property(_get_message, _set_message)
+
+    def __str__(self):
+        self._render()
+        return BaseException.__str__(self)
+
+    def __unicode__(self):
+        self._render()
+        return BaseException.__unicode__(self)
+
+    def __repr__(self):
+        self._render()
+        return BaseException.__repr__(self)
+
+    def __reduce__(self):
+        state = self.__dict__.copy()
+        state.pop('_trace', None)
+        return (self.__class__, self.args, state or None)
+
+
+_exception_args = BaseException.__dict__['args']
+_exception_message = BaseException.__dict__['message']
+
+
 class InvalidValueError(ValidationError):
     """Value is invalid."""
     pass
@@ -73,6 +134,136 @@ class InvalidTypeError(ValidationError):
     pass
 
 
+class LazyMessage(object):
+    """Error message that is formatted when it is shown.
+    
+    Formatting is deferred until the message is converted 
+    (e.g. by :func:`str` of the exception), 
+    and the formatted message is cached. 
+    :class:`ValidationError` replaces it with the formatted message 
+    when the arguments or the message are read first.
+    
+    Parameters of immutable scalar types (e.g. :class:`str`, :class:`int`) 
+    and types are kept. The other objects (e.g. validatee containers) 
+    are formatted at once, and the objects themselves are not kept.
+    
+    usage::
+        
+        >>> raise InvalidValueError(LazyMessage('%s is invalid', value))
+    
+    :param format: Format string.
+    :param \*params: Parameters of the format.
+    """
+
+    def __init__(self, format, *params):
+        self.format = format
+        self._text = None
+        self.params = _snapshot(format, params)
+        if self.params is None:
+            self._text = format % params
+            self.params = ()
+
+    def text(self):
+        """Formatted message, :class:`str` or :class:`unicode`."""
+        if self._text is None:
+            self._text = self.format % self.params
+        return self._text
+
+    def __str__(self):
+        return str(self.text())
+
+    def __unicode__(self):
+        return unicode(self.text())
+
+    def __repr__(self):
+        return repr(self.text())
+
+    def __eq__(self, other):
+        if isinstance(other, LazyMessage):
+            other = other.text()
+        return self.text() == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.text())
+
+    def __reduce__(self):
+        # unpickled as the formatted message
+        text = self.text()
+        return (text.__class__, (text,))
+
+
+#: Conversion specifier of the format string.
+_CONVERSION = re.compile(
+    r'%(?:\([^)]*\))?[-#0 +]*(?:\*|\d+)?(?:\.(?:\*|\d+))?[hlL]?(.)')
+
+
+#: Conversion specifiers by format string.
+_conversions = {}
+
+
+class _Rendered(object):
+    """Parameter of :class:`LazyMessage` that is formatted already."""
+
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+    def __str__(self):
+        return str(self.text)
+
+    def __unicode__(self):
+        return unicode(self.text)
+
+    __repr__ = __str__
+
+
+def _snapshot(format, params):
+    """Parameters of :class:`LazyMessage` that are kept until formatting, 
+    or :obj:`None` if the message is formatted at once."""
+    for param in params:
+        if param.__class__ not in _SCALAR_TYPES and \
+                not isinstance(param, (type, _Joined)):
+            break
+    else:
+        # all parameters are kept
+        return params
+    try:
+        conversions = _conversions[format]
+    except KeyError:
+        conversions = [c for c in _CONVERSION.findall(format) if c != '%']
+        if len(_conversions) < 1024:
+            _conversions[format] = conversions
+    if len(conversions) != len(params):
+        # e.g. width by argument
+        return None
+    kept = []
+    for conversion, param in zip(conversions, params):
+        if param.__class__ in _SCALAR_TYPES or \
+                isinstance(param, (type, _Joined)) or \
+                conversion not in 'rs':
+            kept.append(param)
+        else:
+            kept.append(_Rendered((format[:0] + '%' + conversion) % (param,)))
+    return tuple(kept)
+
+
+class _Joined(object):
+    """Parameter of :class:`LazyMessage` that joins the items."""
+
+    def __init__(self, separator, items, convert=str):
+        self.separator = separator
+        self.items = items
+        self.convert = convert
+
+    def __str__(self):
+        return self.separator.join([self.convert(item)
+                                    for item in self.items])
+
+
 
 class ValidatorBaseInterface(object):
     """Abstract validator base interface.
@@ -82,15 +273,27 @@ class ValidatorBaseInterface(object):
         
         This argument is tuple.
     """
+
+    __slots__ = ('validators', '__ident', '__weakref__')
     
     def __init__(self, *validators):
         self.validators = list(validators)
-        self.__hash = hashlib.sha1(
-            self.__class__.__name__ +\
-            pickle.dumps(self.validators, pickle.HIGHEST_PROTOCOL)).digest()
+        self.__ident = None
+
+    def __getstate__(self):
+        state, slots = _slot_state(self)
+        for name in slots:
+            if name.endswith('__ident'):
+                # cached identifier is computed again
+                slots[name] = None
+        return (state, slots)
 
     def __call__(self, value):
-        self.validate(value)
+        try:
+            self.validate(value)
+        except ValidationError, e:
+            e.add_trace(self, value)
+            raise
 
     def __eq__(self, other):
         if self.ident == other.ident:
@@ -102,8 +305,15 @@ class ValidatorBaseInterface(object):
 
     @property
     def ident(self):
-        """Identifier of instance."""
-        return self.__hash
+        """Identifier of instance.
+        
+        It is computed at the first access, and cached 
+        until the validators are modified.
+        """
+        if self.__ident is None:
+            self.__ident = (self.__class__.__name__,
+                            _fingerprint(self.validators))
+        return self.__ident
 
     def validate(self, value):
         """Do validate.
@@ -112,6 +322,45 @@ class ValidatorBaseInterface(object):
         """
         raise NotImplementedError
 
+    def is_valid(self, value):
+        """Is the value valid?
+        
+        Same as :meth:`validate`, but returns the result 
+        instead of raising :exc:`ValidationError`. 
+        Built-in validators check the value without raising internally.
+        
+        :param value: Validatee value.
+        :rtype: :class:`bool`
+        """
+        try:
+            self.validate(value)
+        except ValidationError:
+            return False
+        return True
+
+    def validate_many(self, values):
+        """Validate each of the values.
+        
+        usage::
+            
+            >>> Number(max=10).validate_many([1, 20, 5, 'x'])
+            [(1, InvalidValueError('over max',)), 
+             (3, InvalidValueError(ValueError('could not convert string to float: x',),))]
+        
+        :param values: Sequence of validatee values.
+        :return: List of ``(index, exception)`` of the invalid values 
+                 in order of the index. 
+                 If all values are valid, return empty list.
+        """
+        failures = []
+        validate = self.validate
+        for index, value in enumerate(values):
+            try:
+                validate(value)
+            except ValidationError, e:
+                failures.append((index, e))
+        return failures
+
     def add(self, other):
         """Add new validator.
         :param other: Other validator.
@@ -123,6 +372,7 @@ class ValidatorBaseInterface(object):
                 self.validators.append(other)
             except AttributeError:
                 raise
+            self.__ident = None
         else:
             raise TypeError('Argument is not subclass of %s.'\
                     % ValidatorBaseInterface.__class__.__name__)
@@ -138,38 +388,429 @@ class ValidatorBaseInterface(object):
             raise
         except AttributeError:
             raise
+        self.__ident = None
+
+
+#: Types that :func:`_fingerprint` keys by the value itself.
+_SCALAR_TYPES = frozenset([type(None), bool, int, long, float, str, unicode])
+
+
+def _fingerprint(value):
+    """Structural fingerprint of an argument of validator.
+    
+    Validators are replaced with own identifier, and containers are 
+    fingerprinted by items. Unhashable objects are identified by 
+    the object itself (:func:`id`).
+    """
+    if value.__class__ in _SCALAR_TYPES:
+        return (value.__class__, value)
+    if isinstance(value, ValidatorBaseInterface):
+        return value.ident
+    if isinstance(value, (list, tuple)):
+        return (value.__class__,
+                tuple([_fingerprint(item) for item in value]))
+    if isinstance(value, dict):
+        return (value.__class__,
+                frozenset([(_fingerprint(key), _fingerprint(item))
+                           for key, item in value.iteritems()]))
+    if isinstance(value, (set, frozenset)):
+        return (value.__class__,
+                frozenset([_fingerprint(item) for item in value]))
+    try:
+        hash(value)
+    except TypeError:
+        return (value.__class__, id(value))
+    return (value.__class__, value)
+
+
+def _copy_argument(value):
+    """Copy of list, tuple, dict and set of the argument of validator, 
+    that is fingerprinted later by :func:`_fingerprint`.
+    
+    The items are copied recursively, so modification of the given 
+    argument by the caller does not change the identifier.
+    """
+    cls = value.__class__
+    if cls in _SCALAR_TYPES:
+        return value
+    if cls is list or cls is tuple:
+        return cls([_copy_argument(item) for item in value])
+    if cls is dict:
+        return dict([(key, _copy_argument(item))
+                     for key, item in value.iteritems()])
+    if cls is set or cls is frozenset:
+        return cls([_copy_argument(item) for item in value])
+    return value
+
+
+def _is_valid(validator, value):
+    """:meth:`~ValidatorBaseInterface.is_valid` of validator, 
+    or the other callable."""
+    try:
+        is_valid = validator.is_valid
+    except AttributeError:
+        try:
+            validator(value)
+        except ValidationError:
+            return False
+        return True
+    return is_valid(value)
+
+
+def _validate_many(validator, values):
+    """:meth:`~ValidatorBaseInterface.validate_many` of validator, 
+    or the other callable that validates the values one by one."""
+    try:
+        validate_many = validator.validate_many
+    except AttributeError:
+        failures = []
+        for index, value in enumerate(values):
+            try:
+                validator(value)
+            except ValidationError, e:
+                failures.append((index, e))
+        return failures
+    return validate_many(values)
+
+
+def _overridden(validator, cls):
+    """Is :meth:`validate` of `cls` overridden by class of the validator?"""
+    return type(validator).validate.im_func is not cls.validate.im_func
+
+
+_slot_names_cache = {}
+
+def _slot_names(cls):
+    """Names of the attributes that are in ``__slots__`` of the class 
+    and the base classes (private names are mangled)."""
+    try:
+        return _slot_names_cache[cls]
+    except KeyError:
+        pass
+    names = []
+    for klass in cls.__mro__:
+        for name in klass.__dict__.get('__slots__', ()):
+            if name in ('__dict__', '__weakref__'):
+                continue
+            if name.startswith('__') and not name.endswith('__'):
+                name = '_%s%s' % (klass.__name__.lstrip('_'), name)
+            names.append(name)
+    _slot_names_cache[cls] = names
+    return names
+
+def _slot_state(obj):
+    """State of the object that has ``__slots__`` for pickling and copying.
+    
+    :return: ``(__dict__ or None, dict of the slots)`` 
+             that is restored by :mod:`pickle` and :mod:`copy` 
+             without ``__setstate__``.
+    """
+    slots = {}
+    for name in _slot_names(obj.__class__):
+        try:
+            slots[name] = getattr(obj, name)
+        except AttributeError:
+            # not set
+            pass
+    return (getattr(obj, '__dict__', None) or None, slots)
+
+
+def _sequence(values):
+    if isinstance(values, (list, tuple)):
+        return values
+    return list(values)
+
+
+def _failures(validator, values, indexes):
+    """List of ``(index, exception)`` for :meth:`validate_many`.
+    
+    The exceptions are taken from :meth:`validate` of the validator 
+    for the values that pointed by indexes.
+    """
+    failures = []
+    validate = validator.validate
+    for index in indexes:
+        try:
+            validate(values[index])
+        except ValidationError, e:
+            failures.append((index, e))
+    return failures
+
+
+class Adaptation(object):
+    """Observed outcomes of the validators of :class:`All` or :class:`Any`.
+    
+    The number of calls and failures, and seconds of the calls 
+    are recorded for each validator. 
+    Every `interval` validations, the validators are reordered 
+    by expected cost to decide the result, 
+    and the old statistics are decayed by half.
+    
+    :param size: Number of validators.
+    :param interval: Number of validations between reorders.
+    :param timer: Timer function.
+    """
+    
+    def __init__(self, size, interval=1000, timer=default_timer):
+        self.interval = interval
+        self.timer = timer
+        self.reset(size)
+
+    def reset(self, size):
+        """Discard statistics, and restore declared order.
+        
+        :param size: Number of validators.
+        """
+        #: Indexes of the validators in order of trial.
+        self.order = range(size)
+        #: ``[calls, failures, seconds]`` of each validator.
+        self.stats = [[0, 0, 0.0] for i in range(size)]
+        self.calls = 0
+
+    def record(self, index, failed, elapsed):
+        """Record a call of the validator.
+        
+        :param index: Index of the validator.
+        :param failed: Validator raised error?
+        :param elapsed: Seconds of the call.
+        """
+        stat = self.stats[index]
+        stat[0] += 1
+        stat[1] += failed
+        stat[2] += elapsed
+
+    def count(self, rank):
+        """Count a validation, and reorder at intervals.
+        
+        :param rank: Function that takes ``(cost, failure rate)`` 
+                     and returns sort key.
+        """
+        self.calls += 1
+        if self.calls < self.interval:
+            return
+        keys = []
+        for index, (calls, failures, seconds) in enumerate(self.stats):
+            if calls:
+                cost = seconds / calls
+            else:
+                cost = 0.0
+            # Laplace smoothing, no validator has probability 0 or 1
+            rate = (failures + 1.0) / (calls + 2.0)
+            keys.append((rank(cost, rate), index))
+        keys.sort()
+        self.order = [index for key, index in keys]
+        for stat in self.stats:
+            stat[0] /= 2
+            stat[1] /= 2
+            stat[2] /= 2.0
+        self.calls = 0
+
+
+def _adaptation(options):
+    """Parse `adaptive` keyword argument of :class:`All` and :class:`Any`."""
+    adaptive = options.pop('adaptive', False)
+    if options:
+        raise TypeError('unexpected keyword arguments: %s' %
+                        ', '.join(options))
+    if adaptive is False or adaptive is None:
+        return None
+    if adaptive is True:
+        return Adaptation(0)
+    return Adaptation(0, interval=adaptive)
 
 
 class All(ValidatorBaseInterface):
-    """AND operation for validators."""
+    """AND operation for validators.
+    
+    :keyword adaptive: If :obj:`True` or number of validations 
+                       between reorders, the validators are tried 
+                       in adaptive order; the cheapest and 
+                       the most likely to fail is first 
+                       (see :class:`Adaptation`). 
+                       If the validators are pure, the value is 
+                       valid or invalid the same as declared order, 
+                       but the error is from the first invalid 
+                       in the adaptive order. 
+                       
+                       Default is :obj:`False`.
+    """
+
+    __slots__ = ('adaptation',)
+
+    def __init__(self, *validators, **options):
+        super(All, self).__init__(*validators)
+        self.adaptation = _adaptation(options)
 
     def validate(self, value):
+        if self.adaptation is not None:
+            return self._validate_adaptively(value)
         for validator in self.validators:
             try:
                 validator(value)
             except ValidationError:
                 raise
 
+    def is_valid(self, value):
+        if _overridden(self, All):
+            return super(All, self).is_valid(value)
+        for validator in self.validators:
+            if not _is_valid(validator, value):
+                return False
+        return True
+
+    def _validate_adaptively(self, value):
+        validators = self.validators
+        adaptation = self.adaptation
+        if len(adaptation.order) != len(validators):
+            adaptation.reset(len(validators))
+        timer = adaptation.timer
+        for index in adaptation.order:
+            started = timer()
+            try:
+                validators[index](value)
+            except ValidationError:
+                adaptation.record(index, True, timer() - started)
+                adaptation.count(_rank_all)
+                raise
+            adaptation.record(index, False, timer() - started)
+        adaptation.count(_rank_all)
+
+    def validate_many(self, values):
+        """Validate the values by each validator in turn.
+        
+        Each validator validates only the values that 
+        passed the previous validators.
+        """
+        if _overridden(self, All):
+            return super(All, self).validate_many(values)
+        values = _sequence(values)
+        indexes = range(len(values))
+        failures = []
+        for validator in self.validators:
+            if not indexes:
+                break
+            failed = _validate_many(validator, [values[index]
+                                                for index in indexes])
+            if failed:
+                failures.extend([(indexes[position], e)
+                                 for position, e in failed])
+                failed = set([position for position, e in failed])
+                indexes = [index for position, index in enumerate(indexes)
+                           if position not in failed]
+        failures.sort(key=itemgetter(0))
+        return failures
+
+
+def _rank_all(cost, rate):
+    return cost / rate
+
+def _rank_any(cost, rate):
+    return cost / (1.0 - rate)
+
 
 class Any(ValidatorBaseInterface):
-    """OR operation for validators."""
+    """OR operation for validators.
+    
+    :keyword adaptive: If :obj:`True` or number of validations 
+                       between reorders, the validators are tried 
+                       in adaptive order; the cheapest and 
+                       the most likely to pass is first 
+                       (see :class:`Adaptation`). 
+                       The error is the same as declared order, 
+                       if the validators are pure. 
+                       
+                       Default is :obj:`False`.
+    """
+
+    __slots__ = ('adaptation',)
+
+    def __init__(self, *validators, **options):
+        super(Any, self).__init__(*validators)
+        self.adaptation = _adaptation(options)
 
     def validate(self, value):
-        err_source = None
+        if self.adaptation is not None:
+            return self._validate_adaptively(value)
+        validators = self.validators
+        if not validators:
+            return
+        # the error is from the first validator
+        try:
+            validators[0](value)
+        except ValidationError, e:
+            error = e
+        else:
+            return
+        # the others are tried without exceptions
+        for validator in itertools.islice(validators, 1, None):
+            if _is_valid(validator, value):
+                return
+        raise error
+
+    def is_valid(self, value):
+        if _overridden(self, Any):
+            return super(Any, self).is_valid(value)
+        if not self.validators:
+            return True
         for validator in self.validators:
-            try:
-                validator(value)
-            except ValidationError, e:
-                if err_source is None:
-                    err_source = validator
+            if _is_valid(validator, value):
+                return True
+        return False
+
+    def _validate_adaptively(self, value):
+        validators = self.validators
+        adaptation = self.adaptation
+        if len(adaptation.order) != len(validators):
+            adaptation.reset(len(validators))
+        timer = adaptation.timer
+        error = None
+        for index in adaptation.order:
+            started = timer()
+            if index == 0:
+                # error of the first validator, same as declared order
+                try:
+                    validators[0](value)
+                except ValidationError, e:
+                    error = e
+                    valid = False
+                else:
+                    valid = True
             else:
+                valid = _is_valid(validators[index], value)
+            adaptation.record(index, not valid, timer() - started)
+            if valid:
+                adaptation.count(_rank_any)
                 return
-        if err_source is not None:
-            err_source(value)
+        adaptation.count(_rank_any)
+        if error is not None:
+            raise error
+
+    def validate_many(self, values):
+        """Validate the values by each validator in turn.
+        
+        Each validator validates only the values that 
+        failed the previous validators.
+        """
+        if _overridden(self, Any) or not self.validators:
+            return super(Any, self).validate_many(values)
+        values = _sequence(values)
+        # the exception is from the first validator, same as validate()
+        failures = _validate_many(self.validators[0], values)
+        for validator in self.validators[1:]:
+            if not failures:
+                break
+            failed = _validate_many(validator, [values[index]
+                                                for index, e in failures])
+            failed = set([position for position, e in failed])
+            failures = [failure for position, failure in enumerate(failures)
+                        if position in failed]
+        return failures
 
 
 class ValueAdapter(ValidatorBaseInterface):
     """Adapt value to validators when validate a value."""
+
+    __slots__ = ()
     
     def on_adapt(self, value):
         """Value processor.
@@ -182,6 +823,14 @@ class ValueAdapter(ValidatorBaseInterface):
         for validator in self.validators:
             validator(self.on_adapt(value))
 
+    def is_valid(self, value):
+        if _overridden(self, ValueAdapter):
+            return super(ValueAdapter, self).is_valid(value)
+        for validator in self.validators:
+            if not _is_valid(validator, self.on_adapt(value)):
+                return False
+        return True
+
     def add(self, other):
         pass
 
@@ -201,20 +850,29 @@ class Validator(ValidatorBaseInterface):
         call Validator.__init__() with *ALL arguments*.
     
     .. note::
-        All arguments of validator are must be serializable.
+        Identifier of validator is computed from the structure of 
+        the arguments at the first comparison, and cached. 
+        List, tuple, dict and set of the arguments are copied 
+        at initialization, so later modification of them 
+        does not change the identifier.
         
-        Because identifier of validator was generated by :mod:`pickle`.
+        Unhashable argument (except list, tuple, dict and set) 
+        is identified by the object itself, not by the value.
     """
 
+    __slots__ = ('__arguments', '__ident')
+
     def __init__(self, *args, **kwargs):
-        self.__hash = hashlib.sha1(
-            self.__class__.__name__ +\
-            pickle.dumps(args, pickle.HIGHEST_PROTOCOL) +\
-            pickle.dumps(kwargs, pickle.HIGHEST_PROTOCOL)).digest()
+        self.__arguments = (_copy_argument(args), _copy_argument(kwargs))
+        self.__ident = None
 
     @property
     def ident(self):
-        return self.__hash
+        if self.__ident is None:
+            args, kwargs = self.__arguments
+            self.__ident = (self.__class__.__name__,
+                            _fingerprint(args), _fingerprint(kwargs))
+        return self.__ident
 
     def add(self, other):
         pass
@@ -229,6 +887,8 @@ class Not(Validator):
     :raises ValidationError: Not raised :exc:`ValidationError` from 
                              the validator given at initialization.
     """
+
+    __slots__ = ('validator',)
     
     def __init__(self, validator):
         super(Not, self).__init__(validator)
@@ -242,23 +902,74 @@ class Not(Validator):
         else:
             raise ValidationError('ValidationError is not raised')
 
+    def is_valid(self, value):
+        if _overridden(self, Not):
+            return super(Not, self).is_valid(value)
+        return not _is_valid(self.validator, value)
+
+
+class Blocking(Validator):
+    """Mark of I/O bound validator.
+    
+    Wrap the validator that waits for I/O 
+    (e.g. :class:`~validators.AllowType` with a callback that asks 
+    the other service). When called, it is the same as the wrapped 
+    validator. But :meth:`structures.StructuredFields.validate_concurrently` 
+    runs the leaves that contain blocking validators concurrently.
+    
+    usage::
+        
+        >>> unique_name = Blocking(AllowType(check_name_in_service))
+        >>> rule = Dict(name=All(String(), unique_name), ...)
+    
+    :param validator: I/O bound validator.
+    """
+
+    __slots__ = ('validator',)
+    
+    def __init__(self, validator):
+        super(Blocking, self).__init__(validator)
+        self.validator = validator
+
+    def validate(self, value):
+        self.validator(value)
+
+    def is_valid(self, value):
+        if _overridden(self, Blocking):
+            return super(Blocking, self).is_valid(value)
+        return _is_valid(self.validator, value)
+
 
 class Failure(Validator):
     """Surely fail validator.
     
     :raises ValidationError: Always the exception raises.
     """
+
+    __slots__ = ()
     
     def validate(self, value):
         raise ValidationError('Surely fail')
 
+    def is_valid(self, value):
+        if _overridden(self, Failure):
+            return super(Failure, self).is_valid(value)
+        return False
+
 
 class Pass(Validator):
     """Surely pass validator."""
+
+    __slots__ = ()
     
     def validate(self, value):
         pass
 
+    def is_valid(self, value):
+        if _overridden(self, Pass):
+            return super(Pass, self).is_valid(value)
+        return True
+
 
 class Number(Validator):
     """Number validator.
@@ -267,6 +978,8 @@ class Number(Validator):
     :param max: Max of valid value.
     """
 
+    __slots__ = ('min', 'max')
+
     def __init__(self, min=None, max=None):
         super(Number, self).__init__(min, max)
         self.min = min
@@ -293,10 +1006,358 @@ class Number(Validator):
             if not (value >= self.min):
                 raise InvalidValueError('less than min')
 
+    def is_valid(self, value):
+        if _overridden(self, Number):
+            return super(Number, self).is_valid(value)
+        try:
+            value = float(value)
+        except (ValueError, TypeError):
+            return False
+        if self.max is not None and not (value <= self.max):
+            return False
+        if self.min is not None and not (value >= self.min):
+            return False
+        return True
+
+    def validate_many(self, values):
+        if _overridden(self, Number):
+            return super(Number, self).validate_many(values)
+        values = _sequence(values)
+        try:
+            numbers = map(float, values)
+        except (ValueError, TypeError):
+            return super(Number, self).validate_many(values)
+        low, high = self.min, self.max
+        if low is None and high is None:
+            return []
+        failures = []
+        for index, number in enumerate(numbers):
+            if high is not None and not (number <= high):
+                failures.append((index, InvalidValueError('over max')))
+            elif low is not None and not (number >= low):
+                failures.append((index, InvalidValueError('less than min')))
+        return failures
+
+
+class PatternCache(object):
+    """Bounded cache of compiled regular expression patterns.
+    
+    Equal patterns share one compiled object. 
+    When the cache is full, the least recently used pattern is discarded.
+    
+    usage::
+        
+        >>> cache = PatternCache(maxsize=100)
+        >>> pattern = cache.get('^foo', re.IGNORECASE)
+        >>> pattern is cache.get('^foo', re.IGNORECASE)
+        True
+        >>> cache.info()
+        {'hits': 1, 'misses': 1, 'size': 1, 'maxsize': 100}
+    
+    :param maxsize: Max number of cached patterns.
+    """
+    
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.patterns = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, regexp, flags=0):
+        """Get a compiled pattern.
+        
+        :param regexp: Regular expression.
+        :param flags: Flags of :func:`re.compile`.
+        :raises re.error: `regexp` is invalid.
+        :return: Compiled pattern object.
+        """
+        key = (type(regexp), regexp, flags)
+        try:
+            pattern = self.patterns.pop(key)
+        except KeyError:
+            pattern = re.compile(regexp, flags)
+            self.misses += 1
+            while len(self.patterns) >= self.maxsize:
+                try:
+                    self.patterns.popitem(last=False)
+                except KeyError:
+                    break
+        else:
+            self.hits += 1
+        self.patterns[key] = pattern
+        return pattern
+
+    def info(self):
+        """Statistics of the cache.
+        
+        :return: :class:`dict` that keys are ``hits``, ``misses``, 
+                 ``size`` and ``maxsize``.
+        """
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.patterns),
+                'maxsize': self.maxsize}
+
+    def clear(self):
+        """Discard all patterns and reset the statistics."""
+        self.patterns.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+pattern_cache = PatternCache()
+"""Pattern cache that shared by validators."""
+
+
+class InternPool(object):
+    """Pool of shared validators.
+    
+    Validators that have the same :attr:`~ValidatorBaseInterface.ident` 
+    are replaced with one shared instance. 
+    The inner validators of :class:`All`, :class:`Any`, 
+    :class:`ValueAdapter`, :class:`Split`, :class:`Not` 
+    and :class:`Blocking` are also interned.
+    
+    usage::
+        
+        >>> pool = InternPool()
+        >>> pool.intern(Length(max=255)) is pool.intern(Length(max=255))
+        True
+        >>> pool.info()
+        {'hits': 1, 'misses': 1, 'size': 1}
+    
+    .. note::
+        Interned validators are shared by all rules that use the pool, 
+        so do not modify them (e.g. by :meth:`~ValidatorBaseInterface.add`). 
+        Adaptive :class:`All` and :class:`Any` are not interned, 
+        because they have own statistics.
+    """
+    
+    def __init__(self):
+        self.instances = {}
+        self.hits = 0
+        self.misses = 0
+
+    def intern(self, validator):
+        """Get the shared validator.
+        
+        The given validator is not modified. 
+        
+        :param validator: Validator.
+        :return: The shared validator that is equal to `validator`. 
+                 If there is not, `validator` becomes the shared one, 
+                 or its copy if it has the inner validators 
+                 (the copy has the shared inner validators).
+        """
+        if getattr(validator, 'adaptation', None) is not None:
+            return validator
+        try:
+            key = (validator.__class__, validator.ident)
+            shared = self.instances.get(key)
+        except TypeError:
+            # unhashable ident
+            return validator
+        if shared is not None:
+            self.hits += 1
+            return shared
+        self.misses += 1
+        import copy
+        # the copy is shared, the owner may modify the given one
+        inner = getattr(validator, 'validators', None)
+        if isinstance(inner, (list, tuple)):
+            validator = copy.copy(validator)
+            validator.validators = inner.__class__(
+                [self.intern(item)
+                 if isinstance(item, ValidatorBaseInterface) else item
+                 for item in inner])
+        if isinstance(validator, (Not, Blocking)) and \
+                isinstance(validator.validator, ValidatorBaseInterface):
+            validator = copy.copy(validator)
+            validator.validator = self.intern(validator.validator)
+        self.instances[key] = validator
+        return validator
+
+    def info(self):
+        """Statistics of the pool.
+        
+        :return: :class:`dict` of hits, misses and size.
+        """
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.instances)}
+
+    def clear(self):
+        """Discard all validators and statistics."""
+        self.instances.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+def _as_code_points(text):
+    """Unicode that has the same code points as the string.
+    
+    :mod:`re` compares byte string and unicode by code point, 
+    so byte string is decoded by latin-1 to compare in the same manner.
+    """
+    if isinstance(text, str):
+        return text.decode('latin-1')
+    return text
+
+
+class PhraseMatcher(object):
+    """Finder of any of the phrases by one scan of the text.
+    
+    Phrases are regular expressions, same as :func:`re.search`. 
+    Literal phrases are found by Aho-Corasick automaton 
+    (or by substring test when few), and the others are merged 
+    into alternations.
+    
+    usage::
+        
+        >>> matcher = PhraseMatcher(['foo', 'ba[rz]'])
+        >>> matcher.find('xxbazxx')
+        'ba[rz]'
+        >>> matcher.find('xxbaxx') is None
+        True
+    
+    :param phrases: Sequence of phrases.
+    """
+    
+    #: Literal phrases more than this are found by automaton.
+    automaton_threshold = 16
+    #: Characters that have special meaning in regular expression.
+    special_chars = frozenset('.^$*+?{}[]\\|()')
+    #: Phrase that can not be merged into alternation.
+    unmergeable = re.compile(r'\\[1-9]|\(\?P[=<]|\(\?\(|\(\?[iLmsux]')
+    
+    def __init__(self, phrases):
+        self.phrases = list(phrases)
+        literals = []
+        regexps = []
+        for phrase in self.phrases:
+            if self.special_chars.isdisjoint(phrase):
+                literals.append(phrase)
+            else:
+                regexps.append(phrase)
+        self._build_literals(literals)
+        self._build_regexps(regexps)
+
+    def _build_literals(self, literals):
+        self.literals = [(_as_code_points(phrase), phrase)
+                         for phrase in literals]
+        self.goto = None
+        if len(self.literals) <= self.automaton_threshold:
+            return
+        # Aho-Corasick automaton
+        goto = [{}]
+        output = [None]
+        for text, phrase in self.literals:
+            state = 0
+            for char in text:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    output.append(None)
+                state = next_state
+            if output[state] is None:
+                output[state] = phrase
+        fail = [0] * len(goto)
+        queue = list(goto[0].itervalues())
+        for state in queue:  # breadth first
+            for char, next_state in goto[state].iteritems():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                if output[next_state] is None:
+                    output[next_state] = output[fail[next_state]]
+        self.goto = goto
+        self.fail = fail
+        self.output = output
+
+    def _build_regexps(self, regexps):
+        self.regexps = []
+        self.merged = []
+        chunk = []
+        groups = 0
+        for phrase in regexps:
+            pattern = re.compile(_as_code_points(phrase))
+            self.regexps.append((pattern, phrase))
+            if self.unmergeable.search(phrase) is not None:
+                # named group, reference to group or global flag
+                self.merged.append(pattern)
+                continue
+            if chunk and groups + pattern.groups >= 100:
+                # too many groups in one pattern
+                self.merged.append(self._merge(chunk))
+                chunk = []
+                groups = 0
+            chunk.append(pattern)
+            groups += pattern.groups
+        if chunk:
+            self.merged.append(self._merge(chunk))
+
+    def _merge(self, patterns):
+        if len(patterns) == 1:
+            return patterns[0]
+        return re.compile(u'|'.join([u'(?:%s)' % pattern.pattern
+                                     for pattern in patterns]))
+
+    def find(self, text):
+        """Find a phrase in the text.
+        
+        :param text: String.
+        :return: One of the phrases that found in the text.
+                 If no phrase is found, return :obj:`None`.
+        """
+        text = _as_code_points(text)
+        if self.goto is not None:
+            phrase = self._scan(text)
+            if phrase is not None:
+                return phrase
+        else:
+            for literal, phrase in self.literals:
+                if literal in text:
+                    return phrase
+        for merged in self.merged:
+            if merged.search(text) is not None:
+                # which phrase is found
+                for pattern, phrase in self.regexps:
+                    if pattern.search(text) is not None:
+                        return phrase
+        return None
+
+    def _scan(self, text):
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        if output[0] is not None:
+            # empty phrase
+            return output[0]
+        state = 0
+        for char in text:
+            while True:
+                next_state = goto[state].get(char)
+                if next_state is not None:
+                    state = next_state
+                    break
+                if not state:
+                    break
+                state = fail[state]
+            if output[state] is not None:
+                return output[state]
+        return None
+
 
 class FreeText(Validator):
     """Free text validator.
     
+    Ban phrases are found by one scan of the value 
+    with :class:`~validators.PhraseMatcher`.
+    
     :param ban_phrases: List of ban phrase.
     :type ban_phrases: List of string.
     
@@ -306,21 +1367,44 @@ class FreeText(Validator):
     
     :raises InvalidTypeError: The type of given value is not string.
     :raises InvalidValueError: Ban phrase is found in the value.
+                               The found phrase is set to 
+                               ``phrase`` attribute of the exception.
     """
 
+    __slots__ = ('ban_phrases', 'ignore_chars', 'ignore_patterns', 'matcher')
+
     def __init__(self, ban_phrases=None, ignore_chars=None):
         super(FreeText, self).__init__(ban_phrases, ignore_chars)
         self.ban_phrases = list(ban_phrases) if ban_phrases is not None else []
         self.ignore_chars = list(ignore_chars) if ignore_chars is not None else []
+        self.ignore_patterns = [pattern_cache.get(ignore)
+                                for ignore in self.ignore_chars]
+        self.matcher = PhraseMatcher(self.ban_phrases)
+
+    def find_ban_phrase(self, value):
+        """Find a ban phrase in the value.
+        
+        :param value: String.
+        :return: Found ban phrase, or :obj:`None`.
+        """
+        for pattern in self.ignore_patterns:
+            value = pattern.sub('', value)
+        return self.matcher.find(value)
 
     def validate(self, value):
         if not isinstance(value, basestring):
             raise InvalidTypeError('not string')
-        for ignore in self.ignore_chars:
-            value = re.sub(ignore, '', value)
-        for phrase in self.ban_phrases:
-            if re.search(phrase, value) is not None:
-                raise InvalidValueError('ban phrase found')
+        phrase = self.find_ban_phrase(value)
+        if phrase is not None:
+            error = InvalidValueError('ban phrase found')
+            error.phrase = phrase
+            raise error
+
+    def is_valid(self, value):
+        if _overridden(self, FreeText):
+            return super(FreeText, self).is_valid(value)
+        return isinstance(value, basestring) and \
+            self.find_ban_phrase(value) is None
 
 
 class Equal(Validator):
@@ -337,25 +1421,37 @@ class Equal(Validator):
                                or Failed decode `eq_value` to UTF-8.
     """
 
+    __slots__ = ('eq_value', 'unicode_value', 'bytes_value')
+
     def __init__(self, eq_value):
         super(Equal, self).__init__(eq_value)
         self.eq_value = eq_value
+        # unicode and UTF-8 forms of the string
+        if isinstance(eq_value, unicode):
+            self.unicode_value = eq_value
+            self.bytes_value = eq_value.encode('utf-8')
+        elif isinstance(eq_value, str):
+            try:
+                self.unicode_value = eq_value.decode('utf-8')
+            except UnicodeDecodeError:
+                self.unicode_value = None
+            self.bytes_value = eq_value
 
     def validate(self, value):
         if (not isinstance(value, basestring)) or \
                 (not isinstance(self.eq_value, basestring)):
             if self.eq_value != value:
                 raise InvalidValueError(
-                    '%s is not equal to %s' % (value, self.eq_value))
+                    LazyMessage('%s is not equal to %s', value, self.eq_value))
         elif isinstance(value, unicode):
             try:
                 if isinstance(self.eq_value, unicode):
                     if self.eq_value != value:
                         raise InvalidValueError(
-                            '%s is not equal to %s' % (value, self.eq_value))
+                            LazyMessage('%s is not equal to %s', value, self.eq_value))
                 elif self.eq_value.decode('utf-8') != value:
                     raise InvalidValueError(
-                        '%s is not equal to %s' % (value, self.eq_value))
+                        LazyMessage('%s is not equal to %s', value, self.eq_value))
             except UnicodeDecodeError, e:
                 raise InvalidValueError(e)
         else:
@@ -363,17 +1459,163 @@ class Equal(Validator):
                 try:
                     if self.eq_value != value.decode('utf-8'):
                         raise InvalidValueError(
-                            '%s is not equal to %s' % (value, self.eq_value))
+                            LazyMessage('%s is not equal to %s', value, self.eq_value))
                 except UnicodeDecodeError, e:
                     raise InvalidValueError(e)
             elif self.eq_value != value:
                 raise InvalidValueError(
-                    '%s is not equal to %s' % (value, self.eq_value))
+                    LazyMessage('%s is not equal to %s', value, self.eq_value))
+
+    def is_valid(self, value):
+        if _overridden(self, Equal):
+            return super(Equal, self).is_valid(value)
+        eq_value = self.eq_value
+        if not (isinstance(value, basestring) and
+                isinstance(eq_value, basestring)):
+            return not (eq_value != value)
+        if isinstance(value, unicode):
+            if isinstance(eq_value, unicode):
+                return not (eq_value != value)
+            return self.unicode_value is not None and \
+                not (self.unicode_value != value)
+        if isinstance(eq_value, unicode):
+            try:
+                return not (eq_value != value.decode('utf-8'))
+            except UnicodeDecodeError:
+                return False
+        return not (eq_value != value)
+
+    def validate_many(self, values):
+        if _overridden(self, Equal):
+            return super(Equal, self).validate_many(values)
+        values = _sequence(values)
+        eq_value = self.eq_value
+        if not isinstance(eq_value, basestring):
+            indexes = [index for index, value in enumerate(values)
+                       if eq_value != value]
+            return _failures(self, values, indexes)
+        unicode_value = self.unicode_value
+        bytes_value = self.bytes_value
+        indexes = []
+        for index, value in enumerate(values):
+            if isinstance(value, str):
+                if value != bytes_value:
+                    indexes.append(index)
+            elif isinstance(value, unicode):
+                if unicode_value is None or value != unicode_value:
+                    indexes.append(index)
+            elif eq_value != value:
+                indexes.append(index)
+        return _failures(self, values, indexes)
+
+
+class OneOf(Validator):
+    """Membership validator.
+    
+    The value is valid if it is equal to one of the choices. 
+    It is the same as :class:`Any` of :class:`Equal`, 
+    but the value is looked up in the set of the choices 
+    that is computed in advance.
+    
+    usage::
+        
+        >>> color = OneOf(['red', 'green', 'blue'], ignore_case=True)
+        >>> color(u'Red')
+        >>> color('yellow')
+        validators.InvalidValueError: 'yellow' is not one of 'red', 'green', 'blue'
+    
+    :param choices: Iterable of acceptable values. 
+                    The values must be hashable.
+    :param ignore_case: If :obj:`True`, the case of the string 
+                        is ignored.
+    
+    .. note::
+        Same as :class:`Equal`, if the string is `str` 
+        and the choice is `unicode` (or vice versa), 
+        the string is treated as **UTF-8** string.
+    
+    :raises InvalidValueError: The value is not one of the choices.
+    """
+
+    __slots__ = ('choices', 'ignore_case', 'forms')
+
+    def __init__(self, choices, ignore_case=False):
+        choices = tuple(choices)
+        super(OneOf, self).__init__(choices, ignore_case=ignore_case)
+        self.choices = choices
+        self.ignore_case = ignore_case
+        # unicode and UTF-8 forms of the strings
+        forms = set()
+        for choice in choices:
+            if isinstance(choice, unicode):
+                if ignore_case:
+                    choice = choice.lower()
+                forms.add(choice)
+                forms.add(choice.encode('utf-8'))
+            elif isinstance(choice, str):
+                try:
+                    text = choice.decode('utf-8')
+                except UnicodeDecodeError:
+                    if ignore_case:
+                        choice = choice.lower()
+                else:
+                    if ignore_case:
+                        text = text.lower()
+                        choice = text.encode('utf-8')
+                    forms.add(text)
+                forms.add(choice)
+            else:
+                forms.add(choice)
+        self.forms = frozenset(forms)
+
+    def _normalize(self, value):
+        if isinstance(value, str):
+            try:
+                return value.decode('utf-8').lower()
+            except UnicodeDecodeError:
+                return value.lower()
+        elif isinstance(value, unicode):
+            return value.lower()
+        return value
+
+    def is_member(self, value):
+        """Is the value one of the choices?"""
+        if self.ignore_case:
+            value = self._normalize(value)
+        try:
+            return value in self.forms
+        except TypeError:
+            # unhashable
+            return False
+
+    def validate(self, value):
+        if not self.is_member(value):
+            # repr, str and unicode may be mixed
+            raise InvalidValueError(LazyMessage('%r is not one of %s',
+                value, _Joined(', ', self.choices, repr)))
+
+    def is_valid(self, value):
+        if _overridden(self, OneOf):
+            return super(OneOf, self).is_valid(value)
+        return self.is_member(value)
+
+    def validate_many(self, values):
+        if _overridden(self, OneOf):
+            return super(OneOf, self).validate_many(values)
+        values = _sequence(values)
+        is_member = self.is_member
+        indexes = [index for index, value in enumerate(values)
+                   if not is_member(value)]
+        return _failures(self, values, indexes)
 
 
 class Regex(Validator):
     """Value validation by regexp.
     
+    The regexp is compiled at initialization. 
+    The compiled pattern is shared with the other equal validators 
+    through :data:`validators.pattern_cache`.
+    
     :param regexp: Regular expression.
     :param is_match: If True, use :func:`re.match`.
                      Otherwise use :func:`re.search`.
@@ -393,10 +1635,13 @@ class Regex(Validator):
     :raises InvalidValueError: Regexp pattern is not found in the value.
     """
 
+    __slots__ = ('regexp', 'is_match', 'flags', 'pattern')
+
     def __init__(self, regexp, is_match=True, flags=None):
         """Constractor.
         
         :raises TypeError: `regexp` is not string.
+        :raises re.error: `regexp` is invalid regular expression.
         """
         super(Regex, self).__init__(regexp, is_match=is_match, flags=flags)
         if isinstance(regexp, basestring):
@@ -414,16 +1659,37 @@ class Regex(Validator):
             if 'x' in flags: self.flags |= re.VERBOSE
         else:
             self.flags = None
+        self.pattern = pattern_cache.get(self.regexp, self.flags or 0)
 
     def validate(self, value):
         if not isinstance(value, basestring):
             raise InvalidTypeError('value is invalid')
-        regex_method = re.match if self.is_match else re.search
-        regex_result = regex_method(self.regexp, value)\
-                if self.flags is None\
-                else regex_method(self.regexp, value, self.flags)
+        if self.is_match:
+            regex_result = self.pattern.match(value)
+        else:
+            regex_result = self.pattern.search(value)
         if regex_result is None:
-            raise InvalidValueError('pattern %s is not found' % self.regexp)
+            raise InvalidValueError(
+                LazyMessage('pattern %s is not found', self.regexp))
+
+    def is_valid(self, value):
+        if _overridden(self, Regex):
+            return super(Regex, self).is_valid(value)
+        if not isinstance(value, basestring):
+            return False
+        if self.is_match:
+            return self.pattern.match(value) is not None
+        return self.pattern.search(value) is not None
+
+    def validate_many(self, values):
+        if _overridden(self, Regex):
+            return super(Regex, self).validate_many(values)
+        values = _sequence(values)
+        method = self.pattern.match if self.is_match else self.pattern.search
+        indexes = [index for index, value in enumerate(values)
+                   if not isinstance(value, basestring) or
+                      method(value) is None]
+        return _failures(self, values, indexes)
 
 
 class AllowType(Validator):
@@ -444,6 +1710,8 @@ class AllowType(Validator):
                                and exception is occurred from `test_type`.
     """
 
+    __slots__ = ('test_type', 'on_exception')
+
     def __init__(self, test_type, on_exception=None):
         """Constractor.
         
@@ -466,6 +1734,22 @@ class AllowType(Validator):
             else:
                 raise InvalidValueError(e)
 
+    def is_valid(self, value):
+        if _overridden(self, AllowType):
+            return super(AllowType, self).is_valid(value)
+        try:
+            self.test_type(value)
+        except TypeError:
+            return False
+        except Exception, e:
+            if not callable(self.on_exception):
+                return False
+            try:
+                self.on_exception(e)
+            except ValidationError:
+                return False
+        return True
+
 
 class Prefix(Validator):
     """Prefix validator.
@@ -476,6 +1760,8 @@ class Prefix(Validator):
     :raises InvalidValueError: The value is not prefixed.
     """
 
+    __slots__ = ('prefix',)
+
     def __init__(self, prefix):
         if isinstance(prefix, basestring):
             self.prefix = prefix
@@ -488,7 +1774,24 @@ class Prefix(Validator):
             value = str(value)
         if not value.startswith(self.prefix):
             raise InvalidValueError(
-                    'prefix %s is not found' % self.prefix)
+                    LazyMessage('prefix %s is not found', self.prefix))
+
+    def is_valid(self, value):
+        if _overridden(self, Prefix):
+            return super(Prefix, self).is_valid(value)
+        if not isinstance(value, basestring):
+            value = str(value)
+        return value.startswith(self.prefix)
+
+    def validate_many(self, values):
+        if _overridden(self, Prefix):
+            return super(Prefix, self).validate_many(values)
+        values = _sequence(values)
+        prefix = self.prefix
+        indexes = [index for index, value in enumerate(values)
+                   if not (value if isinstance(value, basestring)
+                           else str(value)).startswith(prefix)]
+        return _failures(self, values, indexes)
 
 
 class Type(Validator):
@@ -500,6 +1803,8 @@ class Type(Validator):
                               not same as `value_type`.
     """
 
+    __slots__ = ('value_type',)
+
     def __init__(self, value_type):
         super(Type, self).__init__(value_type)
         self.value_type = value_type
@@ -507,8 +1812,22 @@ class Type(Validator):
     def validate(self, value):
         if not isinstance(value, self.value_type):
             raise InvalidTypeError(
-                    '%s and %s are not same type' % \
-                    (type(value), self.value_type))
+                    LazyMessage('%s and %s are not same type',
+                                type(value), self.value_type))
+
+    def is_valid(self, value):
+        if _overridden(self, Type):
+            return super(Type, self).is_valid(value)
+        return isinstance(value, self.value_type)
+
+    def validate_many(self, values):
+        if _overridden(self, Type):
+            return super(Type, self).validate_many(values)
+        values = _sequence(values)
+        value_type = self.value_type
+        indexes = [index for index, value in enumerate(values)
+                   if not isinstance(value, value_type)]
+        return _failures(self, values, indexes)
 
 
 class Length(Validator):
@@ -521,6 +1840,8 @@ class Length(Validator):
                                the limit of the length.
     """
 
+    __slots__ = ('min_length', 'max_length')
+
     def __init__(self, min=0, max=None):
         super(Length, self).__init__(min, max)
         self.max_length = max
@@ -534,6 +1855,25 @@ class Length(Validator):
             if not (len(value) >= int(self.min_length)):
                 raise InvalidValueError('less than min length')
 
+    def is_valid(self, value):
+        if _overridden(self, Length):
+            return super(Length, self).is_valid(value)
+        if self.max_length is not None and \
+                not (len(value) <= int(self.max_length)):
+            return False
+        return len(value) >= int(self.min_length)
+
+    def validate_many(self, values):
+        if _overridden(self, Length):
+            return super(Length, self).validate_many(values)
+        values = _sequence(values)
+        low = int(self.min_length)
+        high = None if self.max_length is None else int(self.max_length)
+        indexes = [index for index, length in enumerate(map(len, values))
+                   if not (length >= low and
+                           (high is None or length <= high))]
+        return _failures(self, values, indexes)
+
 
 class Split(Validator):
     """Split value validator.
@@ -565,6 +1905,8 @@ class Split(Validator):
                                or number of splitted values and 
                                number of validators does not match.
     """
+
+    __slots__ = ('separator', 'rmatch')
     
     def __init__(self, *validators, **options):
         sep = options.pop('sep', '-')
@@ -589,6 +1931,25 @@ class Split(Validator):
         for validator, token in itertools.izip(self.validators, splited):
             validator(token)
 
+    def is_valid(self, value):
+        if _overridden(self, Split):
+            return super(Split, self).is_valid(value)
+        if not isinstance(value, basestring):
+            try:
+                value = unicode(value)
+            except UnicodeDecodeError:
+                return False
+        if self.rmatch:
+            splited = value.rsplit(self.separator, len(self.validators) - 1)
+        else:
+            splited = value.split(self.separator, len(self.validators) - 1)
+        if len(splited) != len(self.validators):
+            return False
+        for validator, token in itertools.izip(self.validators, splited):
+            if not _is_valid(validator, token):
+                return False
+        return True
+
 
 # derivative
 
@@ -601,6 +1962,8 @@ class OnelinerText(FreeText):
     :raises InvalidValueError: Ban phrase is found in the value.
     """
 
+    __slots__ = ()
+
     def __init__(self, ban_phrases=None, ignore_chars=None):
         ban = [u'\n']
         if isinstance(ban_phrases, list):
@@ -615,6 +1978,8 @@ class String(Type):
     :raises InvalidTypeError: The type of value is not string.
     """
 
+    __slots__ = ()
+
     def __init__(self):
         super(String, self).__init__(basestring)
 
@@ -625,11 +1990,13 @@ class Int(Type):
     :raises InvalidTypeError: The type of value is not int.
     """
 
+    __slots__ = ()
+
     def __init__(self):
         super(Int, self).__init__(int)
 
 
-class SortOrder(Any):
+class SortOrder(OneOf):
     """Sort order validator.
     
     Acceptable value:
@@ -642,12 +2009,14 @@ class SortOrder(Any):
     :raises InvalidValueError: The value is not equal to 
                                ``asc`` or ``desc``.
     """
+
+    __slots__ = ()
     
     def __init__(self):
-        super(SortOrder, self).__init__(Equal('asc'), Equal('desc')) 
+        super(SortOrder, self).__init__(['asc', 'desc'])
 
 
-class Flag(Any):
+class Flag(OneOf):
     """Flag validator.
     
     "true" and "t" and "1" as :obj:`True`.
@@ -660,11 +2029,244 @@ class Flag(Any):
     :raises InvalidValueError: Not allowed value was given.
     """
 
+    __slots__ = ()
+
     def __init__(self):
-        super(Flag, self).__init__(Equal(u'true'), Equal(u't'), Equal(u'1'),
-                                   Equal(u'false'), Equal(u'f'), Equal(u'0'))
+        super(Flag, self).__init__(
+            [u'true', u't', u'1', u'false', u'f', u'0'], ignore_case=True)
 
-    def validate(self, value):
-        super(Flag, self).validate(value.lower())
 
 
+
+class OptimizationReport(object):
+    """Changes that :func:`optimize` made.
+    
+    Each change is a tuple of ``(path, kind, description)``. 
+    The kind is one of:
+    
+    flatten
+        Nested :class:`All` (or :class:`Any`) is merged into the parent.
+    
+    dedupe
+        Validator that has the same :attr:`~Validator.ident` 
+        as the previous one is removed.
+    
+    hoist
+        Cheap validators are moved before the expensive ones.
+    
+    unwrap
+        :class:`All` (or :class:`Any`) of one validator 
+        is replaced with the validator.
+    """
+
+    def __init__(self):
+        self.changes = []
+
+    def add(self, path, kind, description):
+        """Record a change.
+        
+        :param path: Rule path of the validator.
+        :param kind: Kind of the change.
+        :param description: Description of the change.
+        """
+        self.changes.append((path, kind, description))
+
+    def __len__(self):
+        return len(self.changes)
+
+    def __iter__(self):
+        return iter(self.changes)
+
+    def __str__(self):
+        return '\n'.join(['%s: %s: %s' % (path or '<root>', kind, description)
+                          for path, kind, description in self.changes])
+
+
+# cost of validators, for hoisting
+_TYPE_GUARD, _CHEAP, _EXPENSIVE = range(3)
+
+_COSTS = [
+    (Type, _TYPE_GUARD),
+    (Length, _CHEAP), (Equal, _CHEAP), (OneOf, _CHEAP),
+    (Prefix, _CHEAP), (Number, _CHEAP),
+    (Regex, _EXPENSIVE), (FreeText, _EXPENSIVE), (Split, _EXPENSIVE),
+]
+
+
+def _cost(validator):
+    """Cost of the validator, or :obj:`None` if unknown."""
+    for cls, cost in _COSTS:
+        if isinstance(validator, cls) and not _overridden(validator, cls):
+            return cost
+    return None
+
+
+# types of values that validators raise only ValidationError for, 
+# None is any value
+_SAFE_TYPES = [
+    (Equal, None), (OneOf, None), (Regex, None), (FreeText, None),
+    (Number, (basestring, int, long, float)),
+    (Prefix, (basestring, int, long, float)),
+    (Length, (basestring, list, tuple, dict, set, frozenset)),
+]
+
+
+def _is_safe(validator, guards):
+    """Whether the validator raises only :exc:`ValidationError` 
+    for the values that pass the type guards."""
+    for cls, types in _SAFE_TYPES:
+        if isinstance(validator, cls) and not _overridden(validator, cls):
+            break
+    else:
+        return False
+    if types is None:
+        return True
+    for guard in guards:
+        value_type = guard.value_type
+        if not isinstance(value_type, tuple):
+            value_type = (value_type,)
+        try:
+            if all([issubclass(t, types) for t in value_type]):
+                return True
+        except TypeError:
+            # not a type
+            continue
+    return False
+
+
+def _hoist(validators):
+    """Reorder validators of :class:`All`.
+    
+    The type guards are moved to the front, and then 
+    the validators after the guards are sorted by cost. 
+    Validators of unknown cost are not moved, 
+    and the others are not moved across them. 
+    The order is kept if a validator that would be moved forward 
+    may raise other than :exc:`ValidationError` for the values 
+    that pass the guards (e.g. :class:`Length` for :obj:`int`), 
+    because the validators before it may reject those values.
+    """
+    segments = [[]]
+    for validator in validators:
+        if _cost(validator) is None:
+            segments.append(validator)
+            segments.append([])
+        else:
+            segments[-1].append(validator)
+    result = []
+    for segment in segments:
+        if not isinstance(segment, list):
+            result.append(segment)
+            continue
+        guards = [v for v in segment if _cost(v) == _TYPE_GUARD]
+        others = [v for v in segment if _cost(v) != _TYPE_GUARD]
+        if guards and _is_reorderable(others, guards):
+            # the type of the value is known after the guards
+            others.sort(key=_cost)
+        result.extend(guards + others)
+    return result
+
+
+def _is_reorderable(validators, guards):
+    """Whether the validators can be sorted by cost after the guards."""
+    highest = None
+    for validator in validators:
+        cost = _cost(validator)
+        if highest is not None and cost < highest and \
+                not _is_safe(validator, guards):
+            # moved forward
+            return False
+        highest = max(highest, cost)
+    return True
+
+
+def _names(validators):
+    return ', '.join([v.__class__.__name__ for v in validators])
+
+
+def optimize(validator, report=None, path=''):
+    """Rewrite the validator into equivalent validator.
+    
+    Nested :class:`All` and :class:`Any` are flattened, 
+    duplicated validators (by :attr:`~Validator.ident`) are removed, 
+    and in :class:`All`, cheap validators (e.g. :class:`Length`) 
+    are moved before expensive ones (e.g. :class:`Regex`) 
+    if the type of the value is guarded (e.g. by :class:`String`). 
+    Callables other than validators are neither removed nor moved. 
+    The given validator is not modified.
+    
+    usage::
+        
+        >>> report = OptimizationReport()
+        >>> validator = optimize(All(All(Regex('^a'), String()),
+        ...                          Length(max=5)), report)
+        >>> print report
+        <root>: hoist: Regex, String -> String, Regex
+        <root>: flatten: All into All
+        <root>: hoist: String, Regex, Length -> String, Length, Regex
+    
+    .. note::
+        The optimized validator accepts the same values, 
+        but the error of invalid value may be raised 
+        by another validator, if two or more validators reject it.
+    
+    :param validator: Validator.
+    :param report: :class:`OptimizationReport` that the changes are added.
+    :param path: Rule path of the validator in the report.
+    :return: Optimized validator. 
+             If nothing is changed, the given validator.
+    """
+    if report is None:
+        report = OptimizationReport()
+    cls = type(validator)
+    if cls not in (All, Any):
+        return validator
+    children = [optimize(child, report, path)
+                for child in validator.validators]
+    changed = any([child is not original for child, original
+                   in zip(children, validator.validators)])
+    # flatten
+    flat = []
+    for child in children:
+        if type(child) is cls and child.adaptation is None and \
+                (cls is All or child.validators):
+            # empty Any accepts everything, it is not flattened
+            report.add(path, 'flatten',
+                       '%s into %s' % (cls.__name__, cls.__name__))
+            flat.extend(child.validators)
+            changed = True
+        else:
+            flat.append(child)
+    # dedupe
+    unique = []
+    idents = set()
+    for child in flat:
+        if not isinstance(child, ValidatorBaseInterface):
+            # other callable has no identifier, it is not merged
+            unique.append(child)
+            continue
+        ident = child.ident
+        if ident in idents:
+            report.add(path, 'dedupe', child.__class__.__name__)
+            changed = True
+            continue
+        idents.add(ident)
+        unique.append(child)
+    # hoist
+    if cls is All and validator.adaptation is None:
+        hoisted = _hoist(unique)
+        if any([a is not b for a, b in zip(hoisted, unique)]):
+            report.add(path, 'hoist', '%s -> %s' % (_names(unique),
+                                                     _names(hoisted)))
+            unique = hoisted
+            changed = True
+    # unwrap
+    if len(unique) == 1 and validator.adaptation is None:
+        report.add(path, 'unwrap', '%s of %s' % (cls.__name__,
+                                                 _names(unique)))
+        return unique[0]
+    if not changed:
+        return validator
+    if validator.adaptation is None:
+        return cls(*unique)
+    return cls(adaptive=validator.adaptation.interval, *unique)
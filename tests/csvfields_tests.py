@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+from unittest import TestCase
+from nose.tools import eq_, ok_
+
+import sys, os
+sys.path.insert(0, os.path.join('..', 'fivalid'))
+from StringIO import StringIO
+from fields import BaseField, RequiredError
+from validators import (
+    Number, String, Length, All, Failure, Type,
+    ValidationError, InvalidValueError, InvalidTypeError
+)
+from converters import int_converter
+from structures import Dict
+from csvfields import CSVFields, HeaderError, describe_error
+
+
+class IDField(BaseField):
+    validator = Number(min=0)
+    converter = int_converter
+
+
+def users_rule(**options):
+    return Dict(id=IDField(required=True, empty_value=''),
+                name=All(String(), Length(max=10)),
+                age=IDField(empty_value='', default='0'),
+                **options)
+
+
+class CSVFieldsTest(TestCase):
+
+    def test_bind(self):
+        csvfields = CSVFields(users_rule())
+        validate_row = csvfields.bind(['name', 'id'])
+        eq_(validate_row(['John', '1']), {'id': 1, 'name': None, 'age': 0})
+        # short row is padded by empty_value
+        self.assertRaises(RequiredError, validate_row, ['John'])
+        try:
+            validate_row(['John Doe Jr.', '1'])
+        except InvalidValueError, e:
+            eq_(e.column, 1)
+            eq_(e.path, ('name',))
+        else:
+            self.fail()
+        try:
+            validate_row(['John', '1', 'x'])
+        except InvalidValueError, e:
+            eq_(e.column, 3)
+        else:
+            self.fail()
+
+        self.assertRaises(HeaderError, csvfields.bind, ['name'])
+        self.assertRaises(HeaderError, csvfields.bind, ['id', 'id'])
+        self.assertRaises(HeaderError, csvfields.bind, ['id', 'email'])
+        validate_row = CSVFields(
+            users_rule(__is_ignore_extra=True)).bind(['id', 'email'])
+        eq_(validate_row(['1', 'x', 'y']),
+            {'id': 1, 'name': None, 'age': 0})
+        self.assertRaises(TypeError, CSVFields, Failure())
+
+    def test_custom_data_validator(self):
+        rule = users_rule()
+        rule.data_validator = Failure()
+        self.assertRaises(ValidationError,
+                          CSVFields(rule).bind(['id']), ['1'])
+
+    def test_encoding(self):
+        rule = Dict(name=All(Type(unicode), Length(max=3)))
+        validate_row = CSVFields(rule, encoding='utf-8').bind(['name'])
+        eq_(validate_row([u'寿限無'.encode('utf-8')]), {'name': None})
+        self.assertRaises(InvalidValueError, validate_row, ['\xff'])
+        self.assertRaises(InvalidTypeError,
+                          CSVFields(rule).bind(['name']), ['abc'])
+
+    def test_iter_validate(self):
+        csvfile = StringIO('id,name\r\n'
+                           '1,John\r\n'
+                           '\r\n'
+                           'x,"Jane\r\nDoe"\r\n'
+                           ',Bob\r\n')
+        results = list(CSVFields(users_rule()).iter_validate(csvfile))
+        eq_([(line, converted) for line, converted, error in results],
+            [(2, {'id': 1, 'name': None, 'age': 0}), (4, None), (6, None)])
+        ok_(isinstance(results[1][2], InvalidValueError))
+        eq_(results[1][2].column, 1)
+        ok_(isinstance(results[2][2], RequiredError))
+        eq_(results[2][2].column, 1)
+
+        self.assertRaises(HeaderError, list,
+                          CSVFields(users_rule()).iter_validate(StringIO('')))
+
+    def test_partition(self):
+        csvfile = StringIO('id,name\r\n'
+                           '1,John\r\n'
+                           '2,John Doe Jr.\r\n'
+                           '3,Jane\r\n')
+        valid = StringIO()
+        rejected = StringIO()
+        counts = CSVFields(users_rule()).partition(csvfile, valid, rejected)
+        eq_(counts, {'valid': 2, 'rejected': 1})
+        eq_(valid.getvalue(), 'id,name\r\n1,John\r\n3,Jane\r\n')
+        eq_(rejected.getvalue(),
+            'id,name,line,column,error\r\n'
+            '2,John Doe Jr.,3,name,InvalidValueError: over max length\r\n')
+        eq_(CSVFields(users_rule()).partition(StringIO('id\r\n1\r\n')),
+            {'valid': 1, 'rejected': 0})
+
+        # short and long rows are fitted to the header
+        csvfile = StringIO('id,name\r\n'
+                           'x\r\n'
+                           '1,John,extra\r\n')
+        rejected = StringIO()
+        counts = CSVFields(users_rule()).partition(csvfile, None, rejected)
+        eq_(counts, {'valid': 0, 'rejected': 2})
+        eq_(rejected.getvalue(),
+            'id,name,line,column,error\r\n'
+            'x,,2,id,InvalidValueError: '
+            'could not convert string to float: x\r\n'
+            '1,John,3,,InvalidValueError: Found extra cells: 1\r\n')
+
+    def test_describe_error(self):
+        eq_(describe_error(RequiredError()), 'RequiredError')
+        eq_(describe_error(InvalidValueError('over max')),
+            'InvalidValueError: over max')
+        eq_(describe_error(InvalidValueError(u'寿'.encode('utf-8'))),
+            u'InvalidValueError: 寿')
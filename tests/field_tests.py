@@ -75,4 +75,28 @@ if __name__ == '__main__':
     import nose
     nose.main()
 
-
+def instrument_test():
+    f = BaseField(validator=Number(max=10), required=True)
+    stats = f.instrument()
+    assert f('1') == u'1'
+    try:
+        f('100')
+    except ValidationError:
+        pass
+    try:
+        f(None)
+    except RequiredError:
+        pass
+    snapshot = stats.snapshot()
+    assert snapshot.keys() == ['BaseField']
+    assert snapshot['BaseField']['calls'] == 3
+    assert snapshot['BaseField']['failures'] == {'InvalidValueError': 1,
+                                                 'RequiredError': 1}
+    f.instrument(stats, path='price')
+    f('2')
+    assert stats.snapshot()['price']['calls'] == 1
+    f.uninstrument()
+    f('3')
+    assert stats.snapshot()['price']['calls'] == 1
+    # the class default is not changed
+    assert BaseField.stats is None
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+import sys, os
+import subprocess
+from nose.tools import eq_, ok_
+
+
+#: Modules that are not imported by ``import fivalid``.
+DEFERRED_MODULES = ['threading', 'collections', 'copy', 'pickle', 'cPickle',
+                    'hashlib', 'inspect', 'multiprocessing']
+
+
+def imported(code):
+    """Names of the modules that are imported by the code
+    in a new interpreter."""
+    top = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = ('import sys\n'
+              'before = set(sys.modules)\n'
+              '%s\n'
+              'print " ".join(sorted([name for name in sys.modules\n'
+              '                       if name not in before and\n'
+              '                       sys.modules[name] is not None]))\n'
+              % code)
+    process = subprocess.Popen([sys.executable, '-c', script], cwd=top,
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    out, err = process.communicate()
+    eq_(process.returncode, 0, err)
+    return set(out.split())
+
+
+def lazy_import_test():
+    modules = imported('import fivalid')
+    eq_([name for name in modules if name.startswith('fivalid.')], [])
+    for name in DEFERRED_MODULES:
+        ok_(name not in modules, name)
+
+    modules = imported('from fivalid import int_converter')
+    eq_([name for name in modules if name.startswith('fivalid.')],
+        ['fivalid.converters'])
+
+    modules = imported('import fivalid\n'
+                       'fivalid.StructuredFields(fivalid.Dict())({})')
+    ok_('fivalid.structures' in modules)
+    for name in ('threading', 'copy', 'pickle', 'hashlib', 'inspect'):
+        ok_(name not in modules, name)
+
+
+def namespace_test():
+    modules = imported('import fivalid\n'
+                       'assert fivalid.__version__\n'
+                       'assert fivalid.Number is fivalid.validators.Number\n'
+                       'from fivalid import *\n'
+                       'assert Dict is fivalid.structures.Dict\n'
+                       'import fivalid.schemacache\n'
+                       'assert "schemacache" in dir(fivalid)\n'
+                       'try:\n'
+                       '    fivalid.nothing\n'
+                       'except AttributeError:\n'
+                       '    pass\n'
+                       'else:\n'
+                       '    raise AssertionError()')
+    ok_('fivalid.schemacache' in modules)
+
+
+if __name__ == '__main__':
+    import nose
+    nose.main()
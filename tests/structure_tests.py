@@ -9,11 +9,11 @@ from fields import BaseField, RequiredError
 from validators import (
     ValidatorBaseInterface,
     Type, Equal, Number, String, Regex,
-    Any, All, Failure, ValueAdapter,
+    Any, All, Failure, ValueAdapter, AllowType, Blocking, Length,
     ValidationError, InvalidValueError, InvalidTypeError
 )
 from converters import int_converter
-from  structures import Seq, Dict, StructuredFields
+from  structures import Seq, Dict, StructuredFields, StructureError
 
 
 
@@ -202,6 +202,26 @@ class DictRuleTest(TestCase):
         self.assertRaises(
             InvalidValueError, rule, {'a': 'foo', 'b': 'bar'})
 
+    def test_key_index(self):
+        rule = Dict(a=BaseField(required=True), b=String(),
+                    c=BaseField(validator=String(), required=True,
+                                default='x'))
+        eq_(rule.rule_keys, frozenset(['a', 'b', 'c']))
+        eq_(rule.required_keys, frozenset(['a']))
+        eq_(rule.missing_keys({'b': 'x'}), ['a'])
+        eq_(rule.missing_keys({'a': 'x'}), [])
+
+        rule['d'] = BaseField(required=True)
+        eq_(rule.rule_keys, frozenset(['a', 'b', 'c', 'd']))
+        eq_(rule.required_keys, frozenset(['a', 'd']))
+        rule({'d': 'x'})
+        del rule['a']
+        eq_(rule.required_keys, frozenset(['d']))
+        self.assertRaises(InvalidValueError, rule, {'a': 'x'})
+        rule.insert(String(), 'd')
+        eq_(rule.required_keys, frozenset())
+        eq_(rule.missing_keys({}), [])
+
 
 class StructuredFieldsTest(TestCase):
 
@@ -379,6 +399,703 @@ class StructuredFieldsTest(TestCase):
                     )
                 }))
 
+    def test_validate_all(self):
+        rule = Dict({
+            'name': self.NameField(required=True),
+            'phones': Seq(self.PhoneNumberField()),
+            'address': Dict(zip=Regex('^[0-9]+$'), city=String())
+        })
+        data = {'name': 'John Doe',
+                'phones': ['123', '456'],
+                'address': {'zip': '100', 'city': 'Tokyo'}}
+        eq_(StructuredFields.validate_all(data, rule),
+            self.validate(data, rule))
+
+        data = {'phones': ['123', 'x', '456', 'y'],
+                'address': {'zip': 'abc', 'city': 1, 'country': 'JP'}}
+        try:
+            StructuredFields.validate_all(data, rule)
+        except StructureError, e:
+            eq_(set(e.errors.keys()),
+                set([('name',), ('phones', 1), ('phones', 3),
+                     ('address',)]))
+            ok_(isinstance(e.errors[('name',)], RequiredError))
+            ok_(isinstance(e.errors[('phones', 1)], InvalidValueError))
+            ok_(not e.truncated)
+            eq_(e.tree()['phones'].keys(), [1, 3])
+        else:
+            raise AssertionError('StructureError is not raised')
+
+        data['address'].pop('country')
+        try:
+            StructuredFields(rule, collect_errors=True, max_errors=3)(data)
+        except StructureError, e:
+            eq_(len(e.errors), 3)
+            ok_(e.truncated)
+        else:
+            raise AssertionError('StructureError is not raised')
+
+        try:
+            StructuredFields.validate_all(42, rule)
+        except StructureError, e:
+            eq_(e.errors.keys(), [()])
+            ok_(isinstance(e.tree()[None], InvalidTypeError))
+        else:
+            raise AssertionError('StructureError is not raised')
+
+    def test_iter_validate(self):
+        rule = Dict({
+            'name': self.NameField(required=True),
+            'phone': self.PhoneNumberField()
+        })
+        def records():
+            yield {'name': 'John Doe', 'phone': '123'}
+            yield {'phone': '456'}
+            yield {'name': 'Jane Doe', 'phone': 'x'}
+            yield {'name': 'Alan Smithy'}
+        stfields = StructuredFields(rule)
+        results = stfields.iter_validate(records())
+        ok_(hasattr(results, 'next'))
+        results = list(results)
+        eq_([index for index, converted, error in results], [0, 1, 2, 3])
+        eq_(results[0][1:], ({'name': 'John Doe', 'phone': '123'}, None))
+        ok_(results[1][1] is None)
+        ok_(isinstance(results[1][2], RequiredError))
+        ok_(isinstance(results[2][2], InvalidValueError))
+        eq_(results[3][1:], ({'name': 'Alan Smithy', 'phone': None}, None))
+
+        stfields = StructuredFields(rule, collect_errors=True)
+        results = list(stfields.iter_validate([{'phone': 'x'}]))
+        ok_(isinstance(results[0][2], StructureError))
+        eq_(len(results[0][2].errors), 2)
+
+        # passthrough
+        records = [{'phone': ['1']}, {'phone': ['x']}]
+        for collect_errors in (False, True):
+            stfields = StructuredFields(Dict(phone=Seq(Number())),
+                                        passthrough=True,
+                                        collect_errors=collect_errors)
+            results = list(stfields.iter_validate(records))
+            ok_(results[0][1] is records[0])
+            ok_(results[1][1] is None)
+
+    def test_bulk_validate(self):
+        rule = Dict({
+            'name': self.NameField(required=True),
+            'phone': Seq(self.PhoneNumberField())
+        })
+        records = [{'name': 'John Doe', 'phone': [str(i)]}
+                   for i in range(50)]
+        records[7] = {'phone': []}
+        records[31] = {'name': 'Jane Doe', 'phone': ['x']}
+        records[49] = 'foo'
+        stfields = StructuredFields(rule)
+        stfields.compile()
+        results = list(stfields.bulk_validate(iter(records),
+                                              processes=2, chunksize=3))
+        expected = list(stfields.iter_validate(records))
+        eq_(len(results), 50)
+        for result, expect in zip(results, expected):
+            eq_(result[:2], expect[:2])
+            eq_(type(result[2]), type(expect[2]))
+        ok_(isinstance(results[7][2], RequiredError))
+        ok_(isinstance(results[31][2], InvalidValueError))
+        ok_(isinstance(results[49][2], InvalidTypeError))
+
+        stfields = StructuredFields(Dict(phone=Seq(Number())),
+                                    passthrough=True)
+        results = list(stfields.bulk_validate(
+            [{'phone': [i]} for i in range(5)], processes=2, chunksize=2))
+        eq_([converted for index, converted, error in results],
+            [{'phone': [i]} for i in range(5)])
+
+    def test_pickle(self):
+        import pickle
+        rule = Dict(name=BaseField(validator=String()),
+                    phone=BaseField(validator=Number()))
+        stfields = StructuredFields(rule)
+        restored = pickle.loads(pickle.dumps(stfields, 2))
+        ok_(restored.compiled is None)
+        stfields.compile()
+        restored = pickle.loads(pickle.dumps(stfields, 2))
+        ok_(callable(restored.compiled))
+        eq_(restored({'name': 'a'}), {'name': 'a', 'phone': None})
+
+    def test_validate_concurrently(self):
+        import time
+        from threading import Lock
+        lock = Lock()
+        calls = []
+        def slow_check(value):
+            time.sleep(0.1)
+            with lock:
+                calls.append(value)
+            if value == 'taken':
+                raise ValueError(value)
+        class UniqueNameField(BaseField):
+            validator = All(String(), Blocking(AllowType(slow_check)))
+            converter = lambda field, value: value.upper()
+        rule = Seq(Dict(name=UniqueNameField(required=True),
+                        phone=self.PhoneNumberField()),
+                   type=tuple)
+        data = tuple([{'name': 'user%d' % i, 'phone': str(i)}
+                      for i in range(10)])
+
+        started = time.time()
+        ret = StructuredFields.validate_concurrently(data, rule,
+                                                     max_workers=10)
+        ok_(time.time() - started < 0.5)
+        eq_(len(calls), 10)
+        ok_(isinstance(ret, tuple))
+        eq_(ret, tuple([{'name': 'USER%d' % i, 'phone': str(i)}
+                        for i in range(10)]))
+
+        with StructuredFields(rule, max_workers=5) as stfields:
+            eq_(stfields(data), ret)
+            eq_(stfields(data[:1]), ret[:1])
+            pool = stfields.pool
+            ok_(pool is not None)
+        ok_(stfields.pool is None)
+        # the threads are stopped
+        ok_(not [worker for worker in pool._pool if worker.is_alive()])
+        stfields.close()
+
+        # the first error in order of the data
+        invalid = list(data)
+        invalid[3] = {'name': 'taken'}
+        invalid[6] = {'name': 'foo', 'phone': 'x'}
+        self.assertRaises(InvalidValueError, stfields, tuple(invalid))
+        invalid[3] = {'name': 'foo'}
+        invalid[1] = {'phone': '1'}
+        self.assertRaises(RequiredError, stfields, tuple(invalid))
+        invalid[1] = {'name': 'taken', 'phone': '1'}
+        invalid[2] = {'name': 'foo', 'phone': 'x', 'extra': 1}
+        try:
+            stfields(tuple(invalid))
+        except InvalidValueError, e:
+            ok_('taken' in str(e))
+        else:
+            raise AssertionError('InvalidValueError is not raised')
+        stfields.close()
+
+        # missing required keys first, same as validate()
+        rule = Dict(dict([(key, BaseField(validator=Number(max=1),
+                                          required=True))
+                          for key in 'abcdefgh']))
+        for missing in 'abcdefgh':
+            data = dict([(key, '5') for key in 'abcdefgh'
+                         if key != missing])
+            for validate in (StructuredFields.validate,
+                             StructuredFields.validate_concurrently):
+                self.assertRaises(RequiredError, validate, data, rule)
+
+
+    def test_seq_items(self):
+        rule = Seq(All(Number(max=10), Type(int)))
+        for validate in (StructuredFields(rule),
+                         StructuredFields(rule).compile()):
+            eq_(validate(range(5)), [None] * 5)
+            eq_(validate([]), [])
+            try:
+                validate([1, 2, 20, 'x'])
+            except InvalidValueError, e:
+                eq_(e.path, (2,))
+                eq_([info['classname'] for info in e.trace_info()],
+                    ['All', 'Number'])
+            else:
+                raise AssertionError('InvalidValueError is not raised')
+        # the first invalid item of long sequence is found by chunks
+        rule = Seq(Number(max=10))
+        for validate in (StructuredFields(rule),
+                         StructuredFields(rule).compile()):
+            for index in (0, 15, 16, 70, 9999):
+                data = [1] * 10000
+                data[index] = 20
+                data[-1] = 30
+                try:
+                    validate(data)
+                except InvalidValueError, e:
+                    eq_(e.path, (index,))
+                else:
+                    raise AssertionError('InvalidValueError is not raised')
+            eq_(validate([1] * 10000), [None] * 10000)
+        # plain function in the validators
+        def odd(value):
+            if value % 2 == 0:
+                raise InvalidValueError('even')
+        rule = Seq(All(Number(), odd))
+        for validate in (StructuredFields(rule),
+                         StructuredFields(rule).compile()):
+            eq_(validate([1, 3, 5]), [None] * 3)
+            try:
+                validate([1, 2, 'x'])
+            except InvalidValueError, e:
+                eq_(e.path, (1,))
+            else:
+                raise AssertionError('InvalidValueError is not raised')
+        rule = Seq(self.PhoneNumberField(), String(), type=tuple)
+        for validate in (StructuredFields(rule),
+                         StructuredFields(rule).compile()):
+            eq_(validate(('1', 'a', '2')), (u'1', None, u'2'))
+            try:
+                validate(('1', 'a', 'b'))
+            except InvalidValueError, e:
+                eq_(e.path, (2,))
+            else:
+                raise AssertionError('InvalidValueError is not raised')
+
+    def test_check(self):
+        rule = Dict(a=Seq(Number(max=3)), b=Seq(String(), Number()),
+                    c=self.PhoneNumberField(required=True))
+        data = {'a': [1, 2], 'b': ['x', 1, 'y'], 'c': '1'}
+        eq_(StructuredFields.check(data, rule), None)
+        for invalid, exc, path in [
+                (dict(data, a=[1, 5]), InvalidValueError, ('a', 1)),
+                (dict(data, b=['x', 'y']), InvalidValueError, ('b', 1)),
+                (dict(data, b='x'), InvalidTypeError, ('b',)),
+                (dict(data, d=1), InvalidValueError, ())]:
+            try:
+                StructuredFields.check(invalid, rule)
+            except exc, e:
+                eq_(e.path, path)
+            else:
+                raise AssertionError('%s is not raised' % exc.__name__)
+        self.assertRaises(RequiredError, StructuredFields.check,
+                          {'a': [], 'b': []}, rule)
+
+    def test_passthrough(self):
+        rule = Dict(a=Seq(Number(max=3)), b=String())
+        data = {'a': [1, 2], 'b': 'x'}
+        stfields = StructuredFields(rule, passthrough=True)
+        ok_(stfields(data) is data)
+        self.assertRaises(InvalidValueError, stfields, {'a': [5], 'b': 'x'})
+        stfields.compile()
+        ok_(stfields(data) is data)
+        stfields = StructuredFields(rule, passthrough=True,
+                                    collect_errors=True)
+        ok_(stfields(data) is data)
+        self.assertRaises(StructureError, stfields, {'a': [5], 'b': 1})
+
+        stfields.rule = Dict(a=Seq(Number(max=3)), b=self.NameField())
+        eq_(stfields(data), {'a': [None, None], 'b': 'x'})
+        ok_(stfields(data) is not data)
+        # the rule is modified in place
+        stfields = StructuredFields(rule, passthrough=True)
+        ok_(stfields(data) is data)
+        stfields.rule['b'] = self.NameField()
+        eq_(stfields(data), {'a': [None, None], 'b': 'x'})
+        del stfields.rule['b']
+        stfields.rule['b'] = String()
+        ok_(stfields(data) is data)
+
+        # cached
+        from structures import ResultCache
+        stfields = StructuredFields(rule, passthrough=True,
+                                    cache=ResultCache())
+        ok_(stfields(data) is data)
+        ok_(stfields(data) is data)
+        eq_(stfields.cache.hits, 1)
+        copied = dict(data)
+        ok_(stfields(copied) is copied)
+        self.assertRaises(InvalidValueError, stfields, {'a': [5], 'b': 'x'})
+        self.assertRaises(InvalidValueError, stfields, {'a': [5], 'b': 'x'})
+
+    def test_revalidate(self):
+        rule = Dict(
+            users=Seq(Dict(id=self.PhoneNumberField(required=True),
+                           name=self.NameField(),
+                           tags=Seq(String()))),
+            title=self.NameField(required=True))
+        stfields = StructuredFields(rule)
+        data = {'users': [{'id': str(i), 'name': 'u%d' % i, 'tags': ['a']}
+                          for i in range(5)],
+                'title': 'x'}
+        result = stfields(data)
+        data['users'] = list(data['users'])
+        data['users'][3] = dict(data['users'][3], name='Jane')
+        new = stfields.revalidate(data, result, [('users', 3, 'name')])
+        eq_(new, stfields(data))
+        eq_(new['users'][3]['name'], 'Jane')
+        ok_(new['users'][2] is result['users'][2])
+        ok_(new['users'][3]['tags'] is result['users'][3]['tags'])
+        ok_(result['users'][3]['name'] == 'u3')
+
+        for path, changed, exc in [
+                (('users', 1, 'id'), {'id': 'x', 'tags': []},
+                 InvalidValueError),
+                (('users', 1, 'id'), {'tags': []}, RequiredError),
+                (('users', 1, 'extra'), {'id': '1', 'extra': 1},
+                 InvalidValueError),
+                (('users', 1, 'tags', 0), {'id': '1', 'tags': [1]},
+                 InvalidTypeError)]:
+            invalid = dict(data, users=list(data['users']))
+            invalid['users'][1] = changed
+            self.assertRaises(exc, stfields.revalidate,
+                              invalid, result, [path])
+        try:
+            stfields.revalidate(dict(data, title=1), result, [('title',)])
+        except InvalidTypeError, e:
+            eq_(e.path, ('title',))
+        else:
+            raise AssertionError('InvalidTypeError is not raised')
+        eq_(stfields.revalidate(data, result, [()]), stfields(data))
+
+    def test_revalidate_passthrough(self):
+        rule = Seq(Dict(name=All(String(), Length(max=3))))
+        stfields = StructuredFields(rule, passthrough=True)
+        data = [{'name': 'a'}, {'name': 'b'}]
+        result = stfields(data)
+        ok_(result is data)
+        changed = [{'name': 'a'}, {'name': 'c'}]
+        ok_(stfields.revalidate(changed, result, [(1, 'name')]) is changed)
+        new_data, new = stfields.apply_patch(data, result, [
+            {'op': 'replace', 'path': '/0/name', 'value': 'd'}])
+        ok_(new is new_data)
+        eq_(new, [{'name': 'd'}, {'name': 'b'}])
+        self.assertRaises(InvalidValueError, stfields.revalidate,
+                          [{'name': 'a'}, {'name': 'long'}], result,
+                          [(1, 'name')])
+        # the rule that converts
+        stfields = StructuredFields(Seq(self.NameField()), passthrough=True)
+        eq_(stfields.revalidate(['a'], stfields(['b']), [(0,)]), [u'a'])
+
+    def test_apply_patch(self):
+        rule = Dict(users=Seq(Dict(id=self.PhoneNumberField(required=True),
+                                   name=self.NameField())),
+                    title=self.NameField())
+        stfields = StructuredFields(rule)
+        data = {'users': [{'id': '1', 'name': 'a'}, {'id': '2'}],
+                'title': 'x'}
+        result = stfields(data)
+        new_data, new = stfields.apply_patch(data, result, [
+            {'op': 'replace', 'path': '/users/1/id', 'value': '3'},
+            {'op': 'add', 'path': '/users/0/name', 'value': 'b'},
+            {'op': 'add', 'path': '/users/-', 'value': {'id': '4'}},
+            {'op': 'remove', 'path': '/title'}])
+        eq_(new_data, {'users': [{'id': '1', 'name': 'b'}, {'id': '3'},
+                                 {'id': '4'}]})
+        eq_(new, stfields(new_data))
+        eq_(data['users'][1], {'id': '2'})
+        eq_(data['title'], 'x')
+        self.assertRaises(InvalidValueError, stfields.apply_patch,
+                          data, result,
+                          [{'op': 'replace', 'path': '/users/0/id',
+                            'value': 'x'}])
+        self.assertRaises(RequiredError, stfields.apply_patch,
+                          data, result,
+                          [{'op': 'remove', 'path': '/users/1/id'}])
+        for operation in [{'op': 'move', 'path': '/title'},
+                          {'op': 'replace', 'path': '/users/2/id'},
+                          {'op': 'remove', 'path': '/nothing'},
+                          {'op': 'add', 'path': '/users/x'},
+                          {'op': 'add', 'path': 'title'},
+                          {'op': 'add', 'path': '/title/x'}]:
+            self.assertRaises(ValueError, stfields.apply_patch,
+                              data, result, [operation])
+
+    def test_error_path(self):
+        rule = Dict(a=Seq(Number(max=3)), b=Dict(c=Blocking(String())))
+        data = {'a': [1, 5], 'b': {'c': 0}}
+        try:
+            StructuredFields.validate_all(data, rule)
+        except StructureError, e:
+            for path, error in e.errors.iteritems():
+                eq_(error.path, path)
+            eq_(sorted(e.errors), [('a', 1), ('b', 'c')])
+        else:
+            raise AssertionError('StructureError is not raised')
+        data['a'] = [1]
+        try:
+            StructuredFields.validate_concurrently(data, rule, max_workers=2)
+        except InvalidTypeError, e:
+            eq_(e.path, ('b', 'c'))
+        else:
+            raise AssertionError('InvalidTypeError is not raised')
+
+    def test_optimize(self):
+        from structures import optimize_rule
+        name = BaseField(validator=All(All(Regex('^a'), String()),
+                                       String()),
+                         converter=lambda field, value: (field, value))
+        rule = Dict(name=name, tags=Seq(All(Length(max=3), String())),
+                    count=Number())
+        optimized = optimize_rule(rule)
+        ok_(optimized is not rule)
+        ok_(optimized['count'] is rule['count'])
+        eq_(len(name.validator.validators), 2)
+        eq_(optimized['name'].validator, All(String(), Regex('^a')))
+        eq_(optimized['tags'][0], All(String(), Length(max=3)))
+        eq_(optimized['name']('ab'), (optimized['name'], 'ab'))
+        self.assertRaises(InvalidValueError, optimized.data_validator,
+                          {'extra': 1})
+        optimized['extra'] = Number()
+        optimized.data_validator({'extra': 1, 'name': 'a'})
+        self.assertRaises(InvalidValueError, rule.data_validator,
+                          {'extra': 1})
+
+        stfields = StructuredFields(rule)
+        stfields.compile()
+        report = stfields.optimize()
+        eq_(sorted([(path, kind) for path, kind, description in report]),
+            [('name', 'dedupe'), ('name', 'flatten'), ('name', 'hoist'),
+             ('tags[]', 'hoist')])
+        data = {'name': 'abc', 'tags': ['x', 'yz'], 'count': 1}
+        eq_(stfields(data), {'name': (stfields.rule['name'], 'abc'),
+                             'tags': [None, None], 'count': None})
+        for invalid in ({'name': 'b'}, {'tags': ['xxxx']}, {'tags': [1]}):
+            self.assertRaises(ValidationError, stfields, invalid)
+        eq_(len(stfields.optimize()), 0)
+
+    def test_slots(self):
+        import pickle
+        from structures import NotEmptySequence, PackAdapter
+        dict_rule = Dict(a=String())
+        seq_rule = Seq(String(), __disallow_empty=True)
+        validators = [dict_rule, seq_rule, NotEmptySequence()]
+        validators.extend(dict_rule.data_validator.validators)
+        validators.extend(dict_rule.data_validator.validators[1].validators)
+        for validator in validators:
+            ok_(not hasattr(validator, '__dict__'), validator)
+        pack_adapter = pickle.loads(pickle.dumps(
+            dict_rule.data_validator.validators[1], 2))
+        ok_(isinstance(pack_adapter, PackAdapter))
+        eq_(pack_adapter.rules, frozenset(['a']))
+        restored = pickle.loads(pickle.dumps(dict_rule, 2))
+        self.assertRaises(InvalidValueError, restored, {'b': 1})
+        restored = pickle.loads(pickle.dumps(seq_rule, 0))
+        self.assertRaises(InvalidValueError, restored, [])
+
+    def test_intern_rule(self):
+        from structures import intern_rule
+        from validators import InternPool
+        pool = InternPool()
+        field = self.NameField(validator=Length(max=3))
+        rules = [intern_rule(Dict(a=Length(max=3), b=Seq(Length(max=3)),
+                                  c=field), pool)
+                 for i in range(3)]
+        shared = rules[0]['a']
+        for rule in rules:
+            ok_(rule['a'] is shared)
+            ok_(rule['b'][0] is shared)
+            ok_(rule['c'].validator is shared)
+            eq_(StructuredFields(rule)({'a': 'x', 'b': ['y'], 'c': 'z'}),
+                {'a': None, 'b': [None], 'c': 'z'})
+        ok_(field.validator is not shared)
+        eq_(pool.info()['size'], 1)
+        ok_(rules[0].get('x') is rules[1].get('y'))
+
+        # the given rule is not modified
+        validator = All(String(), Length(max=3))
+        rule = Dict(a=validator)
+        interned = intern_rule(rule, pool)
+        ok_(rule['a'] is validator)
+        ok_(validator.validators[1] is not shared)
+        ok_(interned['a'].validators[1] is shared)
+        validator.add(Length(min=1))
+        ok_(intern_rule(Dict(a=All(String(), Length(max=3))), pool)['a']
+            is interned['a'])
+        eq_(len(interned['a'].validators), 2)
+
+    def test_schema_cache(self):
+        import shutil, tempfile
+        from schemacache import SchemaCache
+        directory = tempfile.mkdtemp()
+        try:
+            built = []
+            def build():
+                built.append(1)
+                stfields = StructuredFields(Dict(
+                    id=BaseField(validator=Number(), required=True,
+                                 converter=int_converter),
+                    name=All(String(), Regex('^[a-z]+$'))))
+                stfields.compile()
+                return stfields
+            data = {'id': '1', 'name': 'abc'}
+            cache = SchemaCache(os.path.join(directory, 'schemas'))
+            eq_(cache.load('schema 1', build)(data), {'id': 1, 'name': None})
+            stfields = cache.load('schema 1', build)
+            eq_(len(built), 1)
+            eq_(cache.info(), {'hits': 1, 'misses': 1})
+            ok_(stfields.compiled is not None)
+            eq_(stfields(data), {'id': 1, 'name': None})
+            self.assertRaises(InvalidValueError, stfields,
+                              {'id': '1', 'name': 'ABC'})
+            eq_(stfields.rule.required_keys, frozenset(['id']))
+
+            cache.load(u'schema 2', build)
+            eq_(len(built), 2)
+            SchemaCache(cache.directory, version='2').load('schema 1', build)
+            eq_(len(built), 3)
+            broken = open(cache.path('schema 1'), 'wb')
+            broken.write('broken')
+            broken.close()
+            cache.load('schema 1', build)
+            eq_(len(built), 4)
+            cache.load('schema 1', build)
+            eq_(len(built), 4)
+            cache.clear()
+            eq_(os.listdir(cache.directory), [])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_cache(self):
+        from structures import ResultCache
+        ticks = [0]
+        cache = ResultCache(maxsize=2, ttl=10, timer=lambda: ticks[0])
+        rule = Dict(name=self.PhoneNumberField(), tags=Seq(String()))
+        stfields = StructuredFields(rule, cache=cache)
+        data = {'name': '1', 'tags': ['a', 'b']}
+        result = stfields(data)
+        eq_(result, {'name': '1', 'tags': [None, None]})
+        # defensive copy
+        result['tags'].append('c')
+        eq_(stfields(data), {'name': '1', 'tags': [None, None]})
+        ok_(stfields(data)['tags'] is not stfields(data)['tags'])
+        eq_(cache.info()['hits'], 3)
+        eq_(cache.info()['misses'], 1)
+
+        # error is cached
+        errors = []
+        for i in range(2):
+            try:
+                stfields({'tags': [1]})
+            except InvalidTypeError, e:
+                ok_(not hasattr(e, 'column'))
+                errors.append(e)
+                e.column = i
+        eq_(cache.info()['hits'], 4)
+        # new exception for each hit
+        ok_(errors[0] is not errors[1])
+        eq_(errors[1].path, ('tags', 0))
+        eq_(errors[1].args, errors[0].args)
+        eq_(errors[1].message, errors[0].message)
+        eq_(list(errors[1].trace_info()), [])
+        # types of values are distinguished
+        eq_(stfields({'name': 1, 'tags': []}), {'name': u'1', 'tags': []})
+        eq_(stfields({'name': 1.0, 'tags': []}),
+            {'name': u'1.0', 'tags': []})
+        eq_(cache.info()['evictions'], 2)
+        eq_(cache.info()['size'], 2)
+        # unhashable leaf
+        class Unhashable(object):
+            __hash__ = None
+        self.assertRaises(InvalidTypeError, stfields,
+                          {'name': 1, 'tags': [Unhashable()]})
+        eq_(cache.info()['uncacheable'], 1)
+
+        ticks[0] = 10
+        eq_(stfields({'name': 1, 'tags': []}), {'name': u'1', 'tags': []})
+        info = cache.info()
+        eq_(info['expirations'], 1)
+        eq_(info['hit_rate'], 4 / 9.0)
+
+        # the rule is modified
+        stfields.rule = Dict(name=String(), tags=Seq(String()))
+        self.assertRaises(InvalidTypeError, stfields,
+                          {'name': 1, 'tags': []})
+        # the rule is modified in place
+        stfields.rule['tags'] = Seq(Number(max=1))
+        eq_(stfields({'name': 'a', 'tags': ['1']}),
+            {'name': None, 'tags': [None]})
+        self.assertRaises(InvalidValueError, stfields,
+                          {'name': 'a', 'tags': ['2']})
+        stfields.rule['tags'] = Seq(Number(max=2))
+        eq_(stfields({'name': 'a', 'tags': ['2']}),
+            {'name': None, 'tags': [None]})
+        stfields.rule = Dict(name=String(), tags=Seq(String()))
+        rule_ident = stfields.rule.ident
+        eq_(rule_ident, Dict(name=String(), tags=Seq(String())).ident)
+        ok_(rule_ident != Dict(name=String(), tags=Seq(Number())).ident)
+        ok_(rule_ident != Dict(name=String(), tags=Seq(String()),
+                               __is_ignore_extra=True).ident)
+        eq_(self.PhoneNumberField(required=True).ident,
+            self.PhoneNumberField(required=True).ident)
+        ok_(self.PhoneNumberField().ident !=
+            self.PhoneNumberField(required=True).ident)
+
+        cache.clear()
+        eq_(cache.info()['size'], 0)
+        eq_(cache.info()['hits'], 0)
+
+        # errors of validate_all
+        stfields = StructuredFields(Dict(a=String(), b=String()),
+                                    collect_errors=True, cache=cache)
+        errors = []
+        for i in range(2):
+            try:
+                stfields({'a': 1, 'b': 2})
+            except StructureError, e:
+                errors.append(e)
+        ok_(errors[0] is not errors[1])
+        eq_(errors[1].errors.keys(), errors[0].errors.keys())
+        ok_(errors[1].errors[('a',)] is not errors[0].errors[('a',)])
+        eq_(errors[1].errors[('a',)].path, ('a',))
+        cache.clear()
+
+        # result that contains objects
+        marker = object()
+        stfields = StructuredFields(
+            Seq(BaseField(validator=String(),
+                          converter=lambda field, value: [marker])),
+            cache=cache)
+        eq_(stfields(['a']), [[marker]])
+        result = stfields(['a'])
+        eq_(result, [[marker]])
+        result[0].append(1)
+        eq_(stfields(['a']), [[marker]])
+
+    def test_instrument(self):
+        from instrumentation import RuleStats
+        rule = Dict(orders=Seq(Dict(items=Seq(Dict(sku=String(),
+                                                   qty=self.PhoneNumberField())))),
+                    name=String())
+        data = {'orders': [{'items': [{'sku': 'a', 'qty': '1'},
+                                      {'sku': 'b', 'qty': '2'}]},
+                           {'items': [{'sku': 'c', 'qty': '3'}]}],
+                'name': 'x'}
+        stfields = StructuredFields(rule)
+        stats = stfields.instrument()
+        ok_(isinstance(stats, RuleStats))
+        eq_(stfields(data), StructuredFields.validate(data, rule))
+        snapshot = stats.snapshot()
+        eq_(sorted(snapshot), ['', 'name', 'orders', 'orders[]',
+                               'orders[].items', 'orders[].items[]',
+                               'orders[].items[].qty',
+                               'orders[].items[].sku'])
+        eq_(snapshot[''], {'calls': 1, 'total': snapshot['']['total'],
+                           'max': snapshot['']['max'], 'failures': {}})
+        eq_(snapshot['orders[]']['calls'], 2)
+        eq_(snapshot['orders[].items[].sku']['calls'], 3)
+        ok_(snapshot['']['total'] >= snapshot['orders']['total'])
+        ok_(snapshot['']['max'] >= snapshot['orders']['max'])
+
+        data['orders'][1]['items'][0]['sku'] = 1
+        self.assertRaises(InvalidTypeError, stfields, data)
+        snapshot = stats.snapshot()
+        eq_(snapshot['orders[].items[].sku']['calls'], 6)
+        eq_(snapshot['orders[].items[].sku']['failures'],
+            {'InvalidTypeError': 1})
+        eq_(snapshot['']['failures'], {'InvalidTypeError': 1})
+
+        stats.reset()
+        eq_(stats.snapshot(), {})
+        stfields.uninstrument()
+        self.assertRaises(InvalidTypeError, stfields, data)
+        eq_(stats.snapshot(), {})
+
+    def test_instrument_timer(self):
+        from instrumentation import RuleStats
+        ticks = iter(range(100))
+        stats = RuleStats(timer=lambda: ticks.next())
+        stfields = StructuredFields(Seq(Number()))
+        eq_(stfields.instrument(stats), stats)
+        stfields(['1', '2'])
+        snapshot = stats.snapshot()
+        # root: 0 -> 5, items: 1 -> 2, 3 -> 4
+        eq_(snapshot['']['total'], 5)
+        eq_(snapshot['[]'], {'calls': 2, 'total': 2, 'max': 1,
+                             'failures': {}})
+
 
 class NestedStructuredFieldTests(TestCase):
     
@@ -482,3 +1199,92 @@ class NestedStructuredFieldTests(TestCase):
         eq_(len(config), 3)
 
 
+
+
+class CompiledStructuredFieldsTest(TestCase):
+
+    def setUp(self):
+        class IDField(BaseField):
+            validator = Number()
+            converter = int_converter
+        class NameField(BaseField):
+            validator = String()
+        self.IDField = IDField
+        self.NameField = NameField
+
+    def check_same(self, data, rule, empty_value=None):
+        expected = StructuredFields.validate(data, rule,
+                                            empty_value=empty_value)
+        stfields = StructuredFields(rule, empty_value=empty_value)
+        compiled = stfields.compile()
+        eq_(compiled(data), expected)
+        eq_(type(compiled(data)), type(expected))
+        eq_(stfields(data), expected)
+
+    def test_compile(self):
+        stfields = StructuredFields(Seq(Equal('C')))
+        assert stfields.compiled is None
+        compiled = stfields.compile()
+        ok_(callable(compiled))
+        assert stfields.compiled is compiled
+
+    def test_same_result(self):
+        rule = Seq(
+                Dict(
+                    id=self.IDField(required=True),
+                    name=self.NameField(required=True),
+                    followers=Seq(self.IDField())
+                ))
+        self.check_same([{'id': '1', 'name': 'a', 'followers': ['2', 3]},
+                         {'id': 2, 'name': 'b', 'followers': []}],
+                        rule)
+        self.check_same([], rule)
+        self.check_same({'a': ('1', 'x', 2, 'y'), 'b': 'foo'},
+                        Dict(a=Seq(self.IDField(), String(), type=tuple),
+                             b=self.NameField()))
+        self.check_same({'a': 'foo'},
+                        Dict(a=self.NameField(), b=self.NameField()))
+
+    def test_errors(self):
+        rule = Dict(
+            name=self.NameField(required=True),
+            ids=Seq(self.IDField(required=True)),
+            flags=Seq(Number(), String(), __disallow_empty=True))
+        validate = StructuredFields(rule).compile()
+        data = {'name': 'a', 'ids': ['1'], 'flags': [1, 'x']}
+        eq_(validate(data), {'name': 'a', 'ids': [1], 'flags': [None, None]})
+        self.assertRaises(RequiredError, validate,
+                          {'ids': ['1'], 'flags': [1]})
+        self.assertRaises(RequiredError, validate,
+                          {'name': 'a', 'ids': [], 'flags': [1]})
+        self.assertRaises(InvalidValueError, validate,
+                          {'name': 'a', 'ids': ['1'], 'flags': []})
+        self.assertRaises(InvalidTypeError, validate,
+                          {'name': 'a', 'ids': ['1'], 'flags': [1, 2]})
+        self.assertRaises(InvalidValueError, validate,
+                          dict(data, extra=1))
+        self.assertRaises(InvalidTypeError, validate, [data])
+        self.assertRaises(InvalidTypeError, validate, 42)
+
+    def test_missing_keys_first(self):
+        rule = Dict(name=self.NameField(required=True), **dict(
+            [('key%d' % i, Number()) for i in range(10)]))
+        data = dict([('key%d' % i, 'x') for i in range(10)])
+        self.assertRaises(RequiredError, StructuredFields.validate,
+                          data, rule)
+        self.assertRaises(RequiredError, StructuredFields(rule).compile(),
+                          data)
+        data['name'] = 'a'
+        self.assertRaises(InvalidValueError, StructuredFields(rule).compile(),
+                          data)
+
+        class SubDict(dict):
+            pass
+        rule = Dict(a=Number(), __is_ignore_extra=True)
+        validate = StructuredFields(rule).compile()
+        eq_(validate({'a': 1, 'b': 2}), {'a': None})
+        eq_(validate(SubDict(a=1)), SubDict(a=None))
+        self.assertRaises(InvalidTypeError, validate, [])
+        rule.data_validator = All(rule.data_validator, Failure())
+        self.assertRaises(ValidationError,
+                          StructuredFields(rule).compile(), {'a': 1})
@@ -1,18 +1,22 @@
 # -*- coding: utf-8 -*-
 
 import sys, os
+import re
 import unittest
+from nose.tools import eq_, ok_
 sys.path.insert(0, os.path.join('..', 'fivalid'))
 from validators import (
     ValidationError, InvalidTypeError, InvalidValueError,
     All, Any,
     ValueAdapter,
-    Not,
+    Not, Blocking,
     Failure, Pass,
     Number, FreeText, Equal, Regex,
     AllowType, Prefix, Type, Length,
     OnelinerText, String, Int,
-    SortOrder, Flag, Split
+    SortOrder, Flag, Split, OneOf,
+    OptimizationReport, optimize,
+    PatternCache, pattern_cache, PhraseMatcher, InternPool
 )
 
 
@@ -118,6 +122,230 @@ class ValidatorTraceBackInfoTest(unittest.TestCase):
         else:
             raise AssertionError('ValidationError is not raised')
 
+    def compiled_structure_info_from_exc_test(self):
+        from structures import StructuredFields, Dict, Seq
+        rule = Dict(foo=Seq(All(String(), Length(min=3))))
+        data = {'foo': ['abc', 'de']}
+        for validator in (StructuredFields(rule),
+                          StructuredFields(rule).compile()):
+            try:
+                validator(data)
+            except ValidationError, e:
+                eq_(e.path, ('foo', 1))
+                infos = list(e.trace_info())
+                eq_([info['classname'] for info in infos],
+                    ['All', 'Length'])
+                eq_([info['value'] for info in infos], ['de', 'de'])
+                ok_(infos[0]['validator'] is rule['foo'][0])
+                eq_(infos[1]['args'], "(self=%r, value='de')" %
+                    (infos[1]['validator'],))
+            else:
+                raise AssertionError('ValidationError is not raised')
+            try:
+                validator({'foo': 'x'})
+            except ValidationError, e:
+                eq_(e.path, ('foo',))
+                eq_([info['validator'] for info in e.trace_info()],
+                    [rule['foo'], rule['foo'].data_validator])
+            else:
+                raise AssertionError('ValidationError is not raised')
+
+    def pickled_info_test(self):
+        import pickle
+        try:
+            Number(max=1)(2)
+        except ValidationError, e:
+            e.path = ('a', 0)
+            restored = pickle.loads(pickle.dumps(e, 2))
+            eq_(restored.path, ('a', 0))
+            eq_(restored.args, e.args)
+            eq_(list(restored.trace_info()), [])
+        else:
+            raise AssertionError('ValidationError is not raised')
+
+
+def adaptive_Any_test():
+    v = Any(Equal('a'), Length(max=1), Equal('ccc'), adaptive=4)
+    plain = Any(Equal('a'), Length(max=1), Equal('ccc'))
+    eq_(v, plain)
+    for i in range(4):
+        suc(v, 'ccc')
+    eq_(v.adaptation.order[0], 2)
+    suc(v, 'a')
+    suc(v, 'b')
+    try:
+        v('dd')
+    except InvalidValueError, e:
+        try:
+            plain('dd')
+        except InvalidValueError, expected:
+            eq_(e.args, expected.args)
+    else:
+        raise AssertionError('InvalidValueError is not raised')
+    # validators are modified
+    v.add(Equal('dd'))
+    suc(v, 'dd')
+    eq_(v.adaptation.order, [0, 1, 2, 3])
+
+
+def adaptive_All_test():
+    ticks = iter(range(10000))
+    v = All(Regex('^a'), Length(max=3), adaptive=True)
+    v.adaptation.timer = lambda: ticks.next()
+    v.adaptation.interval = 3
+    for value in ('abcd', 'abcde', 'abcdef'):
+        err(v, value)
+    eq_(v.adaptation.order, [1, 0])
+    eq_(v.adaptation.stats, [[1, 0, 1.5], [1, 1, 1.5]])
+    suc(v, 'ab')
+    err(v, 'b')
+    err(v, 'bbbb')
+    try:
+        All(adaptive=True, unknown=True)
+    except TypeError:
+        pass
+    else:
+        raise AssertionError('TypeError is not raised')
+
+
+def optimize_test():
+    report = OptimizationReport()
+    original = All(All(Regex('^a'), String()), Length(max=5), String(),
+                   Any(Any(Equal('abc')), Equal('ab')))
+    v = optimize(original, report)
+    eq_([type(child) for child in v.validators],
+        [String, Length, Regex, Any])
+    eq_(v.validators[3].validators, [Equal('abc'), Equal('ab')])
+    eq_([kind for path, kind, description in report],
+        ['hoist', 'unwrap', 'flatten', 'dedupe', 'hoist'])
+    eq_(str(report).splitlines()[0],
+        '<root>: hoist: Regex, String -> String, Regex')
+    # the original is not modified
+    eq_(len(original.validators), 4)
+    for value in ('abc', 'ab', 'abcdef', 'b', 'x', 1, ''):
+        try:
+            original(value)
+        except ValidationError:
+            err(v, value)
+        else:
+            suc(v, value)
+
+    # nothing changed
+    report = OptimizationReport()
+    for validator in (String(), All(String(), Length(max=1)),
+                      Any(Equal('a'), Equal('b')), Flag()):
+        assert optimize(validator, report) is validator
+    eq_(len(report), 0)
+    # not moved across unknown validator, nor without type guard
+    v = All(Regex('^a'), Length(max=5))
+    assert optimize(v) is v
+    v = All(String(), Regex('^a'), Not(Equal('ab')), Length(max=5))
+    assert optimize(v) is v
+    v = optimize(All(All(String(), Length(max=5), adaptive=True),
+                     Regex('^a'), adaptive=10))
+    eq_(len(v.validators), 2)
+    eq_(v.adaptation.interval, 10)
+    # not moved forward if the guard does not protect it
+    v = All(Type((basestring, int)), Regex('^1'), Length(max=2))
+    assert optimize(v) is v
+    try:
+        optimize(v)(5)
+    except InvalidTypeError:
+        pass
+    else:
+        raise AssertionError('InvalidTypeError is not raised')
+    v = optimize(All(Type(int), Prefix('1'), Regex('^1'), Number(max=20)))
+    eq_([type(child) for child in v.validators],
+        [Type, Prefix, Number, Regex])
+    # empty Any accepts everything
+    v = optimize(Any(Any(), Equal('x')))
+    suc(v, 'y')
+    eq_(len(v.validators), 2)
+    # plain function is neither merged nor moved
+    def short(value):
+        if len(value) > 2:
+            raise InvalidValueError('too long')
+    v = All(Number(), short)
+    assert optimize(v) is v
+    v = optimize(All(All(String(), short), Regex('^a'), short,
+                     Length(max=5)))
+    eq_(v.validators[:4], [String(), short, Regex('^a'), short])
+    eq_([type(child) for child in v.validators],
+        [String, type(short), Regex, type(short), Length])
+    suc(v, 'ab')
+    err(v, 'abc')
+
+
+def lazy_message_test():
+    from validators import LazyMessage
+    import pickle
+    calls = []
+    class Value(object):
+        def __str__(self):
+            calls.append(1)
+            return 'value'
+    value = Value()
+    assert not Equal('x').is_valid(value)
+    eq_(calls, [])
+    try:
+        Equal('x')(value)
+    except InvalidValueError, e:
+        # the object is formatted at once, and is not kept
+        eq_(calls, [1])
+        ok_(value not in BaseException.__dict__['args'].__get__(e)[0].params)
+        eq_(str(e), 'value is not equal to x')
+        eq_(str(e), 'value is not equal to x')
+        eq_(calls, [1])
+        ok_(isinstance(e.args[0], basestring))
+        eq_(e.args[0], 'value is not equal to x')
+        eq_(e.message, 'value is not equal to x')
+        eq_(repr(e), "InvalidValueError('value is not equal to x',)")
+        restored = pickle.loads(pickle.dumps(e, 2))
+        eq_(restored.args, ('value is not equal to x',))
+        ok_(isinstance(restored.args[0], str))
+    # scalars are kept until formatting
+    try:
+        Equal('x')('y')
+    except InvalidValueError, e:
+        ok_(isinstance(BaseException.__dict__['args'].__get__(e)[0],
+                       LazyMessage))
+        ok_(isinstance(e.message, str))
+        eq_(e.args, ('y is not equal to x',))
+        ok_(isinstance(BaseException.__dict__['args'].__get__(e)[0], str))
+    message = LazyMessage('%r, %s', [1], {'a': 1})
+    eq_(str(message), "[1], {'a': 1}")
+    eq_(LazyMessage('%*d', 3, 1).text(), '  1')
+    message = LazyMessage(u'%s: %s', u'寿限無', 1)
+    eq_(unicode(message), u'寿限無: 1')
+    eq_(message, LazyMessage(u'%s: %s', u'寿限無', 1))
+    try:
+        OneOf(['a', u'b'])(1)
+    except InvalidValueError, e:
+        eq_(str(e), "1 is not one of 'a', u'b'")
+
+
+def Any_reuses_error_test():
+    calls = []
+    def check(value):
+        calls.append(value)
+        raise ValueError(value)
+    v = Any(AllowType(check), Equal('y'))
+    try:
+        v('x')
+    except InvalidValueError, e:
+        eq_(calls, ['x'])
+        eq_([info['classname'] for info in e.trace_info()],
+            ['Any', 'AllowType'])
+    else:
+        raise AssertionError('InvalidValueError is not raised')
+    v = Any(AllowType(check), Equal('y'), adaptive=True)
+    for i in range(3):
+        try:
+            v('x')
+        except InvalidValueError, e:
+            ok_('x' in str(e))
+    eq_(calls, ['x'] * 4)
+
 
 def no_nest_Any_test():
     v = Any(Int(), String())
@@ -229,6 +457,52 @@ def freetext_test():
     err(vbi, 'の擦り切れ', InvalidValueError)
     err(vbi, '五●の擦り切れ', InvalidValueError)
 
+    vre = FreeText(ban_phrases=['f.o', 'ba[rz]', '(x)\\1'])
+    suc(vre, 'fxyo bax x')
+    err(vre, 'fxo', InvalidValueError)
+    err(vre, u'xbaz', InvalidValueError)
+    err(vre, 'xx', InvalidValueError)
+    assert vre.find_ban_phrase('a baz') == 'ba[rz]'
+    assert vre.find_ban_phrase('bax') is None
+    try:
+        vre('..bar..')
+    except InvalidValueError, e:
+        assert e.phrase == 'ba[rz]'
+    else:
+        raise AssertionError
+
+
+def phrase_matcher_test():
+    words = ['w%04d' % i for i in range(1000)]
+    for phrases in (words, words[:3]):
+        matcher = PhraseMatcher(phrases + ['寿限無', u'五劫', 'ho+ge'])
+        assert matcher.find('hello w0002 world') == 'w0002'
+        assert matcher.find(u'hello w0001') == 'w0001'
+        assert matcher.find('w099') is None
+        assert matcher.find('..寿限無..') == '寿限無'
+        assert matcher.find(u'..寿限無..') is None
+        assert matcher.find(u'..五劫..') == u'五劫'
+        assert matcher.find('..五劫..') is None
+        assert matcher.find('hoooge') == 'ho+ge'
+        assert matcher.find('') is None
+    # overlapped phrases
+    matcher = PhraseMatcher(['abcd', 'bcx', 'c'] * 10)
+    assert matcher.find('abcx') == 'c'
+    matcher = PhraseMatcher(['abcd', 'bcx'] * 10)
+    assert matcher.find('abcx') == 'bcx'
+    assert matcher.find('abcbcd') is None
+    assert PhraseMatcher([''] * 20).find('x') == ''
+    assert PhraseMatcher(['(a)' * 60, 'x(b)']).find('b') is None
+    # same named group, and conditional reference to group
+    matcher = PhraseMatcher(['(?P<x>a)b', '(?P<x>c)d', '(e)?(?(1)f|g)'])
+    assert matcher.find('xcdx') == '(?P<x>c)d'
+    assert matcher.find('xg') == '(e)?(?(1)f|g)'
+    assert matcher.find('xef') == '(e)?(?(1)f|g)'
+    assert matcher.find('xcbx') is None
+    v = FreeText(ban_phrases=['(?P<x>a)b', '(?P<x>c)d'])
+    suc(v, 'ac')
+    err(v, 'xabx', InvalidValueError)
+
 
 def equal_test():
     v = Equal('1')
@@ -275,6 +549,31 @@ def regex_test():
     assert Regex('foo', flags='i') == Regex('foo', flags='i')
     assert Regex('foo', flags='iu') != Regex('foo', flags='i')
 
+    # compiled pattern is shared
+    assert Regex('foo', flags='i').pattern is \
+            Regex('foo', is_match=False, flags='i').pattern
+    assert Regex('foo').pattern is not Regex('foo', flags='i').pattern
+    err(Regex, '(foo', re.error)
+
+
+def pattern_cache_test():
+    cache = PatternCache(maxsize=2)
+    a = cache.get('a')
+    assert cache.get('a') is a
+    assert cache.get('a', re.I) is not a
+    assert cache.get(u'a') is not a
+    info = cache.info()
+    assert info == {'hits': 1, 'misses': 3, 'size': 2, 'maxsize': 2}, info
+    assert cache.get(u'a') is not None
+    assert cache.info()['hits'] == 2
+    cache.clear()
+    assert cache.info() == {'hits': 0, 'misses': 0, 'size': 0, 'maxsize': 2}
+
+    hits = pattern_cache.info()['hits']
+    Regex('^pattern_cache_test$')
+    Regex('^pattern_cache_test$')
+    assert pattern_cache.info()['hits'] == hits + 1
+
 
 def allowtype_test():
     err(AllowType, [], ValueError)
@@ -363,6 +662,43 @@ def int_test():
     err(v, 'abcdef', InvalidTypeError)
 
 
+def oneof_test():
+    v = OneOf([u'寿限無', 'abc', 1])
+    suc(v, u'寿限無')
+    suc(v, u'寿限無'.encode('utf-8'))
+    suc(v, 'abc')
+    suc(v, u'abc')
+    suc(v, 1)
+    suc(v, 1.0)
+    err(v, 'ABC', InvalidValueError)
+    err(v, u'寿限無'.encode('euc-jp'), InvalidValueError)
+    err(v, '1', InvalidValueError)
+    err(v, [1], InvalidValueError)
+    err(v, {}, InvalidValueError)
+    v = OneOf([u'Ä', 'Abc', '\xff'], ignore_case=True)
+    suc(v, u'ä')
+    suc(v, u'ä'.encode('utf-8'))
+    suc(v, u'Ä'.encode('utf-8'))
+    suc(v, 'aBC')
+    suc(v, '\xff')
+    err(v, 'ab', InvalidValueError)
+    assert OneOf(['a', 'b']) == OneOf(('a', 'b'))
+    assert OneOf(['a', 'b']) != OneOf(['a', 'b'], ignore_case=True)
+    try:
+        OneOf(['a', 'b'])('c')
+    except InvalidValueError, e:
+        eq_(str(e), "'c' is not one of 'a', 'b'")
+    # same as Any of Equal
+    values = [u'寿限無', '寿限無', u'寿限無'.encode('euc-jp'), 'x', u'x',
+              1, 1.0, True, None, 'abc']
+    choices = ['x', u'寿限無', 1, None]
+    equals = Any(*[Equal(choice) for choice in choices])
+    for value in values:
+        eq_(OneOf(choices).is_member(value),
+            not equals.validate_many([value]))
+    check_many(OneOf(choices), values)
+
+
 def sortorder_test():
     v = SortOrder()
     suc(v, 'asc')
@@ -381,6 +717,9 @@ def flag_test():
     suc(v, '0')
     suc(v, 'TRUE')
     suc(v, 'F')
+    suc(v, u'True')
+    err(v, 'yes', InvalidValueError)
+    err(v, 1, InvalidValueError)
 
 
 def split_test():
@@ -427,6 +766,164 @@ def split_test():
     err(v, Moge(), InvalidValueError)
 
 
+def ident_test():
+    assert Length(max=10) == Length(max=10)
+    assert Length(max=10) != Length(min=10)
+    assert Number(1) != Number(1.0)
+    assert Equal([1, 2]) == Equal([1, 2])
+    assert Equal({'a': [1]}) == Equal({'a': [1]})
+    assert Equal({'a': [1]}) != Equal({'a': [2]})
+    assert All(Length(min=3), String()) == All(Length(min=3), String())
+    assert All(Length(min=3), String()) != All(Length(min=1), String())
+
+    # arguments are copied, modification by the caller is not shared
+    phrases = ['bad']
+    v = FreeText(phrases)
+    phrases.append('worse')
+    assert v != FreeText(phrases)
+    assert v == FreeText(['bad'])
+    options = {'a': [1]}
+    v = Equal(options)
+    options['a'].append(2)
+    assert v != Equal(options)
+
+    # unpicklable arguments
+    is_even = lambda value: int(value) % 2 == 0 or int('x')
+    v = AllowType(is_even)
+    assert v == AllowType(is_even)
+    assert v != AllowType(lambda value: value)
+    suc(v, 2)
+    err(v, 3, InvalidValueError)
+
+    # identifier follows modification of the validators
+    v = All(String())
+    ident = v.ident
+    v.add(Length(max=3))
+    assert v.ident != ident
+    assert v == All(String(), Length(max=3))
+    v.remove(Length(max=3))
+    assert v.ident == ident
+
+
+def check_many(validator, values):
+    failures = validator.validate_many(values)
+    expected = []
+    for index, value in enumerate(values):
+        try:
+            validator(value)
+        except ValidationError, e:
+            expected.append((index, e.__class__))
+    assert [(index, e.__class__) for index, e in failures] == expected, \
+            (failures, expected)
+    # is_valid
+    invalid = set([index for index, e in expected])
+    assert [validator.is_valid(value) for value in values] == \
+            [index not in invalid for index in range(len(values))], validator
+    return failures
+
+
+def validate_many_test():
+    values = [0, 1, 20, -3, '5', '100', 'x', u'寿限無', '寿限無',
+              u'寿限無'.encode('euc-jp'), 'abc', u'abc', 'ab', None, {},
+              [1, 2], 'asc', 'TRUE', 'f', 'HMX-1']
+    for validator in (Number(), Number(min=0, max=10), Number(max=5),
+                      Equal(1), Equal('abc'), Equal(u'寿限無'), Equal('寿限無'),
+                      Equal(u'寿限無'.encode('euc-jp')),
+                      Prefix('a'), Prefix(1), Type(int), String(),
+                      Regex('^a'), Regex('b', is_match=False),
+                      Split(Equal('HMX'), Number()),
+                      SortOrder(), FreeText(ban_phrases=['b']),
+                      All(String(), Regex('^a'), Length(max=2)),
+                      All(Number(min=0), Number(max=10), Int()),
+                      Any(Int(), Equal('abc'), Equal(u'寿限無')),
+                      Any(), All()):
+        check_many(validator, values)
+    for validator in (Length(max=2), Length(min=3), Length(min=1, max=3),
+                      Any(Length(max=0), Equal('asc')),
+                      Flag(), OnelinerText()):
+        check_many(validator, [v for v in values
+                               if isinstance(v, basestring)])
+
+    for validator in (Not(Equal('abc')), Blocking(String()), Failure(),
+                      Pass(), AllowType(int),
+                      AllowType(int, on_exception=lambda e: None),
+                      OneOf(['x', 1]), All(), Any(Not(String()), Prefix('a'))):
+        check_many(validator, values)
+    class AnyOfOne(Any):
+        def validate(self, value):
+            self.validators[0](value)
+    # overridden validate is used
+    check_many(AnyOfOne(Equal('x'), Pass()), values)
+
+    # plain function in the validators
+    def short(value):
+        if len(value) > 2:
+            raise InvalidValueError('too long')
+    check_many(All(String(), short), ['a', 'abc', u'ab', 1])
+    check_many(Any(Number(), short), ['a', 'abc', 1, '1'])
+    check_many(Any(short, Number()), ['a', 'abc', '1', '123'])
+
+    assert Number(max=10).validate_many(iter([1, 2, 3])) == []
+    failures = check_many(Any(Number(max=1), Equal('x')), [2, 'x', 'y'])
+    assert [index for index, e in failures] == [0, 2]
+    assert str(failures[0][1]) == 'over max'
+
+
+def slots_test():
+    import pickle, copy
+    for validator in (Length(max=255), All(String(), Regex('^a')),
+                      Split(Equal('a'), sep=':'), Flag(), Not(Equal('x'))):
+        ok_(not hasattr(validator, '__dict__'))
+        for protocol in (0, 2):
+            eq_(pickle.loads(pickle.dumps(validator, protocol)), validator)
+        eq_(copy.copy(validator), validator)
+    # subclass without __slots__
+    class Custom(Length):
+        def __init__(self):
+            super(Custom, self).__init__(max=3)
+            self.note = 'x'
+    restored = copy.copy(Custom())
+    eq_((restored.note, restored.max_length), ('x', 3))
+
+
+def intern_pool_test():
+    pool = InternPool()
+    length = pool.intern(Length(max=255))
+    ok_(pool.intern(Length(max=255)) is length)
+    ok_(pool.intern(Length(max=10)) is not length)
+    validator = pool.intern(All(String(), Length(max=255)))
+    ok_(validator.validators[1] is length)
+    ok_(pool.intern(All(String(), Length(max=255))) is validator)
+    eq_(pool.info(), {'hits': 3, 'misses': 4, 'size': 4})
+    adaptive = All(String(), adaptive=True)
+    ok_(pool.intern(adaptive) is adaptive)
+    # wrapped validators
+    ok_(pool.intern(Not(Length(max=255))).validator is length)
+    ok_(pool.intern(Blocking(Length(max=255))).validator is length)
+    ok_(pool.intern(Not(Length(max=255))) is not
+        pool.intern(Blocking(Length(max=255))))
+    pool.clear()
+    eq_(pool.info(), {'hits': 0, 'misses': 0, 'size': 0})
+    ok_(pool.intern(Length(max=255)) is not length)
+
+    # the given validators are not modified
+    pool = InternPool()
+    length = pool.intern(Length(max=255))
+    string = String()
+    given = All(string, Length(max=255))
+    validator = pool.intern(given)
+    ok_(validator is not given)
+    ok_(validator.validators[1] is length)
+    ok_(given.validators[0] is string)
+    ok_(given.validators[1] is not length)
+    given.add(Length(min=1))
+    eq_(validator, All(String(), Length(max=255)))
+    ok_(pool.intern(All(String(), Length(max=255))) is validator)
+    given = Not(Length(max=255))
+    ok_(pool.intern(given) is not given)
+    ok_(given.validator is not length)
+
+
 if __name__ == '__main__':
     import nose
     nose.main()